@@ -0,0 +1,178 @@
+"""
+Batch processing CLI for IntelliCode-SL.
+
+Streams {prompt, input_code} records from a JSONL file through the workflow
+with a bounded number of concurrent runs, and appends one result line per
+record ({id, task_type, final_answer, modified_code, usage} or {id, error})
+to an output JSONL as soon as it is available, where usage holds the run's
+wall time, tokens and estimated cost.
+
+Results are written in input order through a bounded reorder window, so
+memory stays constant however large the input is, and a crashed run resumes
+by skipping as many input records as the output already holds:
+
+    python batch_runner.py prompts.jsonl results.jsonl --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from server import invalid_fields
+
+
+def count_completed(output_path: str) -> int:
+    """Count the complete result lines, dropping a partially written last line left by a crash."""
+    if not os.path.exists(output_path):
+        return 0
+
+    completed = 0
+    last_newline = 0
+    with open(output_path, 'rb') as f:
+        position = 0
+        for line in f:
+            position += len(line)
+            if not line.endswith(b'\n'):
+                break
+            completed += 1
+            last_newline = position
+
+    if last_newline != os.path.getsize(output_path):
+        with open(output_path, 'r+b') as f:
+            f.truncate(last_newline)
+    return completed
+
+
+def read_records(input_path: str, skip: int):
+    """Yield (index, record or parse error) for every input record after the first `skip`; blank lines are not records."""
+    with open(input_path, 'r', encoding='utf-8') as f:
+        index = 0
+        for line in f:
+            if not line.strip():
+                continue
+            if index >= skip:
+                try:
+                    yield index, json.loads(line)
+                except json.JSONDecodeError as error:
+                    yield index, error
+            index += 1
+
+
+def select_workflow(mode: str):
+    """Compile the workflow variant requested on the command line."""
+    from workflow import build_workflow, coalesce
+    return coalesce(build_workflow(fused=mode == 'fused', speculative=mode == 'speculative'), mode)
+
+
+async def run_record(workflow, index: int, record, use_cache: bool) -> dict:
+    """Run one record through the workflow and shape its result line."""
+    if isinstance(record, Exception):
+        return {'id': index, 'error': f'invalid JSON: {record}'}
+
+    if problem := invalid_fields(record):
+        return {'id': record.get('id', index) if isinstance(record, dict) else index, 'error': problem}
+    record_id = record.get('id', index)
+
+    initial_state = {
+        'prompt': record['prompt'],
+        'input_code': record.get('input_code') or None,
+        'use_cache': use_cache,
+        # admitted after interactive calls by the LLM call scheduler
+        'priority': 'batch',
+    }
+    try:
+        final_state = await workflow.ainvoke(initial_state)
+    except Exception as error:
+        return {'id': record_id, 'error': f'{type(error).__name__}: {error}'}
+
+    return {
+        'id': record_id,
+        'task_type': final_state.get('task_type'),
+        'final_answer': final_state.get('final_answer'),
+        'modified_code': final_state.get('modified_code'),
+        'usage': final_state.get('metadata', {}).get('totals'),
+    }
+
+
+async def run_batch(input_path: str, output_path: str, concurrency: int, mode: str, use_cache: bool, window: int, metrics_path: str = None):
+    """Process the input file, appending ordered results and resuming after the ones already written."""
+    completed = count_completed(output_path)
+    if completed:
+        print(f'Resuming after {completed} completed records', file=sys.stderr)
+
+    workflow = select_workflow(mode)
+    from workflow import aprewarm_transport
+    await aprewarm_transport()
+    running = asyncio.Semaphore(concurrency)
+    # records read but not yet written; bounds memory and how far results may run ahead of the oldest one
+    in_window = asyncio.Semaphore(window)
+    finished = {}
+    next_index = completed
+    written = 0
+    errors = 0
+    started = time.monotonic()
+    tasks = set()
+
+    with open(output_path, 'a', encoding='utf-8') as out:
+
+        def flush():
+            nonlocal next_index, written, errors
+            while next_index in finished:
+                result = finished.pop(next_index)
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                out.flush()
+                next_index += 1
+                written += 1
+                errors += 'error' in result
+                in_window.release()
+                if written % 100 == 0:
+                    rate = written / (time.monotonic() - started)
+                    print(f'{completed + written} records done ({errors} errors, {rate:.1f}/s)', file=sys.stderr)
+
+        async def process(index, record):
+            # every index gets a result line, or flush() would stop there and the window would never move on
+            try:
+                async with running:
+                    result = await run_record(workflow, index, record, use_cache)
+            except Exception as error:
+                result = {'id': index, 'error': f'{type(error).__name__}: {error}'}
+            finished[index] = result
+            flush()
+
+        for index, record in read_records(input_path, completed):
+            await in_window.acquire()
+            task = asyncio.create_task(process(index, record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    print(f'Finished: {written} new results ({errors} errors) in {time.monotonic() - started:.1f}s', file=sys.stderr)
+
+    if metrics_path:
+        from metrics import render_prometheus
+        with open(metrics_path, 'w', encoding='utf-8') as f:
+            f.write(render_prometheus())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run JSONL {prompt, input_code} records through the IntelliCode-SL workflow.')
+    parser.add_argument('input', help='input JSONL, one {"prompt", "input_code", optional "id"} object per line')
+    parser.add_argument('output', help='output JSONL; results are appended and an existing file is resumed')
+    parser.add_argument('--concurrency', type=int, default=8, help='workflow runs in flight at once')
+    parser.add_argument('--window', type=int, default=None, help='records buffered ahead of the oldest unfinished one (default 4x concurrency)')
+    parser.add_argument('--mode', choices=['default', 'fused', 'speculative'], default='default', help='graph variant to compile')
+    parser.add_argument('--no-cache', action='store_true', help='bypass the LLM response cache')
+    parser.add_argument('--metrics', help='write the Prometheus text metrics of the batch to this file when done')
+    args = parser.parse_args()
+
+    window = args.window or args.concurrency * 4
+    asyncio.run(run_batch(args.input, args.output, args.concurrency, args.mode, not args.no_cache, max(window, args.concurrency), args.metrics))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Local change summaries for debug_code.
+
+Describes what debugging changed by diffing the input code against the
+corrected code, instead of sending both to the model again. A difflib line diff
+finds the edits. For Python, the AST names the function or class of each edit
+and lists the imports and definitions that were added or removed; other
+languages fall back to their declaration lines. The result is the same
+point-wise text the debug_summary call writes, so the collator sees no
+difference.
+
+`is_small_change` decides when the local summary is enough: small diffs, and
+mechanical ones that only touch formatting or imports.
+"""
+
+import ast
+import difflib
+
+from chunking import BOUNDARY, NESTED_BOUNDARY
+from code_utils import strip_code_fences
+
+
+# edits quoted in a summary at most; the others are counted
+MAX_QUOTED_EDITS = 8
+MAX_QUOTE_CHARS = 80
+
+
+def code_lines(code: str) -> list:
+    return strip_code_fences(code or '').split('\n')
+
+
+def quote(line: str) -> str:
+    text = line.strip()
+    if len(text) > MAX_QUOTE_CHARS:
+        text = text[:MAX_QUOTE_CHARS - 3] + '...'
+    return f'`{text}`'
+
+
+def is_import(line: str) -> bool:
+    return line.strip().startswith(('import ', 'from ', '#include', 'using ', 'require('))
+
+
+def python_units(code: str):
+    """(first line, last line, qualified name) of every function and class, or None when the code does not parse."""
+    try:
+        tree = ast.parse(strip_code_fences(code or ''))
+    except (SyntaxError, ValueError):
+        return None
+
+    units = []
+
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                name = f'{prefix}{child.name}'
+                # a unit starts at its decorators, so adding a decorated function is one change of it
+                start = min([decorator.lineno for decorator in child.decorator_list] + [child.lineno])
+                units.append((start, child.end_lineno, name))
+                visit(child, name + '.')
+            else:
+                visit(child, prefix)
+
+    visit(tree, '')
+    return units
+
+
+def pattern_units(lines: list) -> list:
+    """Units of code which does not parse as Python: from each declaration line to the next one."""
+    starts = [index for index, line in enumerate(lines) if BOUNDARY.match(line) or NESTED_BOUNDARY.match(line)]
+    return [(start + 1, end, lines[start].strip().rstrip('{:').strip()) for start, end in zip(starts, starts[1:] + [len(lines)])]
+
+
+def enclosing(units: list, line: int):
+    """Name of the innermost unit containing a (1-based) line."""
+    containing = [unit for unit in units if unit[0] <= line <= unit[1]]
+    return max(containing)[2] if containing else None
+
+
+def python_imports(code: str) -> set:
+    try:
+        tree = ast.parse(strip_code_fences(code or ''))
+    except (SyntaxError, ValueError):
+        return set()
+    return {ast.unparse(node) for node in ast.walk(tree) if isinstance(node, (ast.Import, ast.ImportFrom))}
+
+
+def plural(count: int, word: str) -> str:
+    return f'{count} {word}' if count == 1 else f'{count} {word}s'
+
+
+def split_opcodes(opcodes: list) -> list:
+    """Split replacements of unequal length into the replaced lines and the lines inserted or deleted after them."""
+    edits = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        paired = min(i2 - i1, j2 - j1)
+        if tag != 'replace' or i2 - i1 == j2 - j1:
+            edits.append((tag, i1, i2, j1, j2))
+            continue
+        edits.append(('replace', i1, i1 + paired, j1, j1 + paired))
+        if j2 - j1 > paired:
+            edits.append(('insert', i1 + paired, i1 + paired, j1 + paired, j2))
+        else:
+            edits.append(('delete', i1 + paired, i2, j1 + paired, j1 + paired))
+    return edits
+
+
+def describe_edit(tag: str, old: list, new: list) -> str:
+    old = [line for line in old if line.strip()]
+    new = [line for line in new if line.strip()]
+    if tag == 'insert':
+        more = f' (+{plural(len(new) - 1, "more line")})' if len(new) > 1 else ''
+        return f'added {quote(new[0])}{more}'
+    if tag == 'delete':
+        more = f' (+{plural(len(old) - 1, "more line")})' if len(old) > 1 else ''
+        return f'removed {quote(old[0])}{more}'
+    if len(old) == len(new) <= 3:
+        return '; '.join(f'{quote(before)} → {quote(after)}' for before, after in zip(old, new))
+    return f'replaced {plural(len(old), "line")}, starting {quote(old[0])}, with {len(new)}'
+
+
+def diff_facts(original: str, modified: str) -> dict:
+    """Structured difference between the input code and the debugged code."""
+    old, new = code_lines(original), code_lines(modified)
+    opcodes = [opcode for opcode in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes() if opcode[0] != 'equal']
+
+    old_units, new_units = python_units(original), python_units(modified)
+    parsed = old_units is not None and new_units is not None
+    if not parsed:
+        old_units, new_units = pattern_units(old), pattern_units(new)
+    old_names = {unit[2] for unit in old_units}
+    new_names = {unit[2] for unit in new_units}
+    old_imports = python_imports(original) if parsed else set()
+    new_imports = python_imports(modified) if parsed else set()
+
+    added_definitions = sorted(new_names - old_names)
+    removed_definitions = sorted(old_names - new_names)
+    edits = []
+    changed_units = []
+    for tag, i1, i2, j1, j2 in split_opcodes(opcodes):
+        before, after = old[i1:i2], new[j1:j2]
+        changed = [line for line in before + after if line.strip()]
+        if not changed:
+            continue
+        # a replacement of blank lines only adds (or removes) lines
+        if not any(line.strip() for line in before):
+            tag = 'insert'
+        elif not any(line.strip() for line in after):
+            tag = 'delete'
+        # an edit belongs to the unit of its first non-blank line
+        lines = before if tag == 'delete' else after
+        first = (i1 if tag == 'delete' else j1) + next((index for index, line in enumerate(lines) if line.strip()), 0) + 1
+        where = enclosing(old_units if tag == 'delete' else new_units, first)
+        if parsed and all(is_import(line) for line in changed):
+            continue
+        if (tag == 'insert' and where in added_definitions) or (tag == 'delete' and where in removed_definitions):
+            continue
+        if where and where not in changed_units:
+            changed_units.append(where)
+        edits.append({'line': first, 'unit': where, 'text': describe_edit(tag, before, after)})
+
+    changed_lines = [line for tag, i1, i2, j1, j2 in opcodes for line in old[i1:i2] + new[j1:j2] if line.strip()]
+    return {
+        'places': len(opcodes),
+        'added_lines': sum(j2 - j1 for _, _, _, j1, j2 in opcodes),
+        'removed_lines': sum(i2 - i1 for _, i1, i2, _, _ in opcodes),
+        'whitespace_only': [line.strip() for line in old if line.strip()] == [line.strip() for line in new if line.strip()],
+        'imports_only': bool(changed_lines) and all(is_import(line) for line in changed_lines),
+        'added_imports': sorted(new_imports - old_imports),
+        'removed_imports': sorted(old_imports - new_imports),
+        'added_definitions': added_definitions,
+        'removed_definitions': removed_definitions,
+        'changed_units': changed_units,
+        'edits': edits,
+    }
+
+
+def is_small_change(facts: dict, max_lines: int) -> bool:
+    """Whether the local summary describes the change well enough: few changed lines, or a mechanical change."""
+    return facts['whitespace_only'] or facts['imports_only'] or facts['added_lines'] + facts['removed_lines'] <= max_lines
+
+
+def format_summary(facts: dict) -> str:
+    """Point-wise summary of the changes, in the format of the debug_summary call."""
+    if not facts['places']:
+        return '- No bugs needed fixing; the code was returned unchanged.'
+    if facts['whitespace_only']:
+        return '- Only formatting and indentation were changed; the logic of the code is the same.'
+
+    points = [f'- Added import {quote(line)}' for line in facts['added_imports']]
+    points += [f'- Removed import {quote(line)}' for line in facts['removed_imports']]
+    points += [f'- Added `{name}`' for name in facts['added_definitions']]
+    points += [f'- Removed `{name}`' for name in facts['removed_definitions']]
+    for edit in facts['edits'][:MAX_QUOTED_EDITS]:
+        where = f"In `{edit['unit']}` (line {edit['line']})" if edit['unit'] else f"Line {edit['line']}"
+        points.append(f"- {where}: {edit['text']}")
+    rest = facts['edits'][MAX_QUOTED_EDITS:]
+    if rest:
+        units = list(dict.fromkeys(edit['unit'] for edit in rest if edit['unit']))
+        names = ', '.join(f'`{unit}`' for unit in units[:MAX_QUOTED_EDITS]) + (f' and {len(units) - MAX_QUOTED_EDITS} more' if len(units) > MAX_QUOTED_EDITS else '')
+        points.append(f"- {plural(len(rest), 'further edit')} in {names or 'the code'}")
+    points.append(f"- In total {plural(facts['added_lines'], 'line')} added and {facts['removed_lines']} removed in {plural(facts['places'], 'place')}")
+    return '\n'.join(points)
@@ -0,0 +1,137 @@
+"""
+Splitting large input code for the chunked (map-reduce) worker path.
+
+A pre-flight token estimate decides whether a node embeds the whole input
+code in one prompt or processes it chunk by chunk. Chunks are cut at
+top-level function/class boundaries (the Python AST when the code parses,
+declaration-looking lines otherwise), oversized definitions are cut at their
+nested definitions and, as a last resort, at line boundaries. The chunks are
+exact line slices, so joining them gives back the original code.
+"""
+
+import ast
+import re
+
+from code_utils import strip_code_fences
+
+
+# top-level declarations of Python and the common C-like/JS languages
+BOUNDARY = re.compile(r'^(?:@|(?:async\s+)?def\s|class\s|function\s|export\s|func\s|fn\s|pub\s|public\s|private\s|interface\s)')
+# definitions nested in a class or block
+NESTED_BOUNDARY = re.compile(r'^\s+(?:@|(?:async\s+)?def\s|class\s|function\s|(?:public|private|protected|static)\s)')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text (about four characters per token)."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def python_boundaries(code: str, lines: list) -> list:
+    """Line indexes where the top-level statements of Python code start, with their leading comments."""
+    tree = ast.parse(code)
+    starts = []
+    for statement in tree.body:
+        start = min([statement.lineno] + [decorator.lineno for decorator in getattr(statement, 'decorator_list', [])]) - 1
+        floor = starts[-1] + 1 if starts else 0
+        while start > floor and lines[start - 1].lstrip().startswith('#'):
+            start -= 1
+        starts.append(start)
+    return starts
+
+
+def pattern_boundaries(lines: list, pattern) -> list:
+    """Line indexes of declarations matched by a pattern, keeping decorators with the definition below them."""
+    starts = []
+    for index, line in enumerate(lines):
+        if pattern.match(line) and not (index and pattern.match(lines[index - 1]) and lines[index - 1].lstrip().startswith('@')):
+            starts.append(index)
+    return starts
+
+
+def slice_lines(lines: list, starts: list) -> list:
+    """Cut the lines into units at the given start indexes; the first unit always starts at line 0."""
+    cuts = sorted(set([0] + [start for start in starts if 0 < start < len(lines)]))
+    return [lines[begin:end] for begin, end in zip(cuts, cuts[1:] + [len(lines)])]
+
+
+def split_oversized(unit: list, max_tokens: int) -> list:
+    """Cut a unit above the budget at its nested definitions, then at line boundaries."""
+    if estimate_tokens(''.join(unit)) <= max_tokens:
+        return [unit]
+    pieces = slice_lines(unit, pattern_boundaries(unit, NESTED_BOUNDARY))
+    if len(pieces) > 1:
+        return [part for piece in pieces for part in split_oversized(piece, max_tokens)]
+
+    parts, current, size = [], [], 0
+    for line in unit:
+        tokens = estimate_tokens(line)
+        if current and size + tokens > max_tokens:
+            parts.append(current)
+            current, size = [], 0
+        current.append(line)
+        size += tokens
+    return parts + [current] if current else parts
+
+
+def split_code(code: str, max_tokens: int) -> list:
+    """Split code into chunks of at most about max_tokens, at function/class boundaries where possible."""
+    lines = code.splitlines(keepends=True)
+    if not lines:
+        return []
+    try:
+        starts = python_boundaries(code, lines)
+    except (SyntaxError, ValueError):
+        starts = pattern_boundaries(lines, BOUNDARY)
+
+    units = [part for unit in slice_lines(lines, starts) for part in split_oversized(unit, max_tokens)]
+
+    chunks, current, size = [], [], 0
+    for unit in units:
+        tokens = estimate_tokens(''.join(unit))
+        if current and size + tokens > max_tokens:
+            chunks.append(''.join(current))
+            current, size = [], 0
+        current += unit
+        size += tokens
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+def outline(code: str, limit: int = 80) -> str:
+    """The top-level declaration lines of the code, given to every chunk as context for the rest of the file."""
+    lines = code.splitlines()
+    declarations = [line.rstrip() for line in lines if BOUNDARY.match(line) and not line.startswith('@')]
+    if len(declarations) > limit:
+        declarations = declarations[:limit] + [f'... ({len(declarations) - limit} more)']
+    return '\n'.join(declarations)
+
+
+def code_preview(code: str, max_tokens: int) -> str:
+    """The start of the code up to the budget, marked as truncated, for prompts which only need a glimpse of it."""
+    if not code or estimate_tokens(code) <= max_tokens:
+        return code
+    head = code[:max_tokens * 4]
+    head = head[:head.rfind('\n') + 1] or head
+    return f'{head}\n... ({estimate_tokens(code) - estimate_tokens(head)} more tokens of code not shown)'
+
+
+def assemble_code(parts: list, chunks: list, regenerated=()) -> str:
+    """Put the processed chunks back together in file order.
+
+    Patched parts are exact slices of the input already. A regenerated part
+    loses the code fences and blank lines the model put around it, and gets
+    the leading indentation and trailing blank lines of its input chunk, so the
+    chunk boundaries read as in the input.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    pieces = []
+    for index, (part, chunk) in enumerate(zip(parts, chunks)):
+        if index in regenerated:
+            text = strip_code_fences(part or '').strip()
+            lead = len(chunk) - len(chunk.lstrip())
+            # a blank-only chunk is all lead; do not count it as trail too
+            part = chunk[:lead] + text + chunk[max(lead, len(chunk.rstrip())):]
+        pieces.append(part)
+    return ''.join(pieces)
@@ -0,0 +1,21 @@
+"""
+Helpers for post-processing the code returned by the workflow.
+
+Kept free of the LLM/Streamlit stack so the UI, the test scripts and the
+benchmarks can use them without importing the whole workflow.
+"""
+
+
+def strip_code_fences(code: str) -> str:
+    """Strip the markdown code block (```python ... ```) an LLM may wrap code in."""
+    cleaned_code = code.strip()
+    if cleaned_code.startswith('```'):
+        lines = cleaned_code.split('\n')
+        # Remove first line if it's ```python or similar
+        if lines[0].startswith('```'):
+            lines = lines[1:]
+        # Remove last line if it's ```
+        if lines and lines[-1].strip() == '```':
+            lines = lines[:-1]
+        cleaned_code = '\n'.join(lines)
+    return cleaned_code
@@ -0,0 +1,117 @@
+"""
+Bounded conversation memory of the workflow.
+
+The `messeges` field of the state carries the previous turns of a
+conversation: HumanMessage/AIMessage pairs, led by a SystemMessage holding
+the rolling summary of the older turns. Before a run the history is kept
+under a hard token budget: once it is exceeded, the newest turns are kept
+verbatim and everything older is folded into the summary (by a summarizer
+call or by local truncation), so the context sent per turn stays about the
+same size however long the conversation runs.
+
+The summary message remembers how many tokens the folded turns had, so
+`history_tokens` still knows the size of the whole conversation, i.e. what a
+user re-pasting the earlier context would have sent.
+"""
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from chunking import estimate_tokens
+
+
+SUMMARY_PREFIX = 'Summary of the earlier conversation:\n'
+
+# chat message roles of the LangChain message types
+CHAT_ROLES = {'system': 'system', 'human': 'user', 'ai': 'assistant'}
+
+# a folded turn keeps at most this many tokens in a locally truncated summary
+LOCAL_TURN_TOKENS = 60
+
+
+def message_tokens(message) -> int:
+    """Estimated tokens of one message, with a few for its role."""
+    return estimate_tokens(str(message.content)) + 4
+
+
+def context_tokens(messages: list) -> int:
+    """Estimated tokens the messages add to a request."""
+    return sum(message_tokens(message) for message in messages)
+
+
+def is_summary(message) -> bool:
+    return isinstance(message, SystemMessage) and 'summarized_tokens' in message.additional_kwargs
+
+
+def split_summary(messages: list) -> tuple:
+    """(summary message or None, the turns after it)."""
+    if messages and is_summary(messages[0]):
+        return messages[0], list(messages[1:])
+    return None, list(messages)
+
+
+def summary_text(summary) -> str:
+    return str(summary.content)[len(SUMMARY_PREFIX):] if summary is not None else ''
+
+
+def history_tokens(messages: list) -> int:
+    """Tokens of the whole conversation as the user would re-paste it; folded turns count with their original size."""
+    summary, turns = split_summary(messages)
+    folded = summary.additional_kwargs['summarized_tokens'] if summary is not None else 0
+    return folded + context_tokens(turns)
+
+
+def chat_messages(messages: list) -> list:
+    """The conversation as chat API messages, to be sent ahead of the current prompt."""
+    return [{'role': CHAT_ROLES.get(message.type, 'user'), 'content': str(message.content)} for message in messages]
+
+
+def format_turns(turns: list) -> str:
+    """The turns as 'User: ...' / 'Assistant: ...' lines."""
+    return '\n'.join(f"{'User' if isinstance(message, HumanMessage) else 'Assistant'}: {message.content}" for message in turns)
+
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """The start of a text within a token budget."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max(max_tokens * 4 - 3, 0)].rstrip() + '...'
+
+
+def select_turns(messages: list, budget: int, recent_tokens: int):
+    """Plan a compaction: None while the history fits the budget, else (summary, folded turns, kept turns).
+
+    The kept turns are the newest ones within recent_tokens, starting at a user message,
+    so the space left in the budget takes the next turns before the next compaction.
+    """
+    if context_tokens(messages) <= budget:
+        return None
+    summary, turns = split_summary(messages)
+    kept = []
+    used = 0
+    for message in reversed(turns):
+        used += message_tokens(message)
+        if used > recent_tokens:
+            break
+        kept.insert(0, message)
+    while kept and not isinstance(kept[0], HumanMessage):
+        kept.pop(0)
+    if len(kept) == len(turns):
+        return None
+    return summary, turns[:len(turns) - len(kept)], kept
+
+
+def local_summary(previous: str, folded: list, max_tokens: int) -> str:
+    """Summary without a model call: the start of every folded turn, dropping the oldest lines beyond the budget."""
+    lines = previous.split('\n') if previous else []
+    for message in folded:
+        role = 'User' if isinstance(message, HumanMessage) else 'Assistant'
+        lines.append(f"- {role}: {clip_tokens(' '.join(str(message.content).split()), LOCAL_TURN_TOKENS)}")
+    while len(lines) > 1 and estimate_tokens('\n'.join(lines)) > max_tokens:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+
+def summary_message(text: str, summary, folded: list, max_tokens: int) -> SystemMessage:
+    """The new rolling summary (cut to its budget) of the previous summary and the folded turns."""
+    summarized = (summary.additional_kwargs['summarized_tokens'] if summary is not None else 0) + context_tokens(folded)
+    return SystemMessage(content=SUMMARY_PREFIX + clip_tokens(text.strip(), max_tokens), additional_kwargs={'summarized_tokens': summarized})
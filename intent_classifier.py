@@ -0,0 +1,173 @@
+"""
+Local intent classifier for IntelliCode-SL.
+
+Picks one of the task_type labels ('explain','debug','write','docs','other')
+in-process, so the workflow only pays for the LLM classifier on ambiguous
+prompts. Combines a keyword/regex rule set with a small multinomial naive
+Bayes bag-of-words model trained from labelled (or logged) JSONL traffic.
+A prompt is only answered locally when one rule matches it and the model
+agrees; anything else goes to the LLM classifier.
+"""
+
+import json
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+
+
+LABELS = ('explain', 'debug', 'write', 'docs', 'other')
+
+# keyword/regex rules, one pattern per label
+RULES = {
+    'explain': re.compile(
+        r"\b(explain|explanation|what does|what is this|what's this|how does|how do(es)? (this|it) work|"
+        r"walk me through|help me understand|break (it|this) down|meaning of|describe what)\b"
+    ),
+    'debug': re.compile(
+        r"\b(fix|fixes|bug|bugs|debug|error|errors|exception|traceback|crash(es|ing)?|broken|"
+        r"not working|doesn'?t work|fails?|failing|wrong (output|result|answer)|"
+        r"\w+error|segfault|infinite loop|off by one)\b"
+    ),
+    'write': re.compile(
+        r"\b((write|create|generate|implement|build|make|code)( me)?( a| an| the| some)? "
+        r"([\w-]+ )?(function|program|script|class|method|code|api|app|module|algorithm|cli)|from scratch)\b"
+    ),
+    'docs': re.compile(
+        r"\b(docstrings?|documentation|document (this|the|my)|comments?|readme|api docs|annotate|"
+        r"jsdoc|javadoc|usage guide)\b"
+    ),
+    'other': re.compile(
+        r"^\s*(hi|hello|hey|thanks|thank you)\b|\b(best practices?|difference between|"
+        r"which (language|library|framework)|recommend|what is the weather|who are you)\b"
+    ),
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z_]+|\d+")
+
+
+def tokenize(text: str) -> list:
+    """Split text into lowercase word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def rule_matches(prompt: str) -> list:
+    """Return the labels whose rules match the prompt."""
+    text = prompt.lower()
+    return [label for label, pattern in RULES.items() if pattern.search(text)]
+
+
+def extract_features(prompt: str, has_code: bool) -> list:
+    """Build the bag-of-words features (unigrams, bigrams, rule and code tags)."""
+    tokens = tokenize(prompt)
+    features = list(tokens)
+    features += [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+    features += [f'rule:{label}' for label in rule_matches(prompt)]
+    features.append('code:yes' if has_code else 'code:no')
+    return features
+
+
+def has_input_code(input_code) -> bool:
+    """Whether the editor buffer carries any code."""
+    return bool(input_code and str(input_code).strip())
+
+
+class intent_classifier:
+    """Rule set plus an optional naive Bayes model over extract_features."""
+
+    def __init__(self, samples=None):
+        self.label_counts = Counter()
+        self.feature_counts = defaultdict(Counter)
+        self.feature_totals = Counter()
+        self.vocabulary = set()
+        if samples:
+            self.train(samples)
+
+    @property
+    def trained(self) -> bool:
+        return sum(self.label_counts.values()) > 0
+
+    def train(self, samples):
+        """Train from an iterable of {'prompt', 'task_type', 'has_code' or 'input_code'} records."""
+        for sample in samples:
+            label = sample.get('task_type')
+            if label not in LABELS or not sample.get('prompt'):
+                continue
+            has_code = sample['has_code'] if 'has_code' in sample else has_input_code(sample.get('input_code'))
+            features = extract_features(sample['prompt'], has_code)
+            self.label_counts[label] += 1
+            self.feature_counts[label].update(features)
+            self.feature_totals[label] += len(features)
+            self.vocabulary.update(features)
+
+    def rule_predict(self, prompt: str, has_code: bool) -> tuple:
+        """Predict from the rules alone; confident only when exactly one label matches."""
+        matches = rule_matches(prompt)
+        if len(matches) != 1:
+            return ('other', 0.0) if not matches else (matches[0], 0.3)
+
+        label = matches[0]
+        # explain/debug/docs are about existing code, writing from scratch usually is not
+        if label in ('explain', 'debug', 'docs') and not has_code:
+            return label, 0.6
+        if label == 'write' and has_code:
+            return label, 0.75
+        return label, 0.9
+
+    def model_predict(self, prompt: str, has_code: bool) -> tuple:
+        """Predict with the naive Bayes model; returns the label and its posterior probability."""
+        features = extract_features(prompt, has_code)
+        total = sum(self.label_counts.values())
+        vocabulary_size = len(self.vocabulary) + 1
+
+        scores = {}
+        for label in LABELS:
+            count = self.label_counts[label]
+            if count == 0:
+                continue
+            counts = self.feature_counts[label]
+            denominator = self.feature_totals[label] + vocabulary_size
+            score = math.log(count / total)
+            for feature in features:
+                score += math.log((counts[feature] + 1) / denominator)
+            scores[label] = score
+
+        best = max(scores, key=scores.get)
+        normalizer = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / normalizer
+
+    def predict(self, prompt: str, input_code=None) -> tuple:
+        """Return (task_type, confidence) for a prompt and its editor buffer."""
+        has_code = has_input_code(input_code)
+        rule_label, rule_confidence = self.rule_predict(prompt, has_code)
+        if not self.trained:
+            return rule_label, rule_confidence
+
+        label, confidence = self.model_predict(prompt, has_code)
+        # the model is overconfident on prompts unlike its training data ("add logging to this function" comes out
+        # as docs), so it is only trusted where a single rule matches and agrees with it; otherwise the prompt is
+        # left to the LLM classifier
+        if rule_confidence < 0.6 or rule_label != label:
+            return label, min(confidence, 0.5)
+        return label, max(confidence, rule_confidence)
+
+
+def load_samples(path) -> list:
+    """Read labelled records from a JSONL file; a missing file yields no samples."""
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_log_lock = threading.Lock()
+
+
+def log_intent(path, prompt: str, input_code, task_type: str):
+    """Append a classified request to the traffic log used to retrain the model."""
+    record = {'prompt': prompt, 'has_code': has_input_code(input_code), 'task_type': task_type}
+    with _log_lock:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
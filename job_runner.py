@@ -0,0 +1,158 @@
+"""
+Background execution of workflow runs for the Streamlit app.
+
+Runs are submitted to one bounded thread pool shared by every session of the
+process, so the pool size is a global cap on concurrent runs and later
+requests queue instead of starving the server. Each session keeps the
+returned `workflow_job` in st.session_state: the job records which nodes have
+finished and the streamed tokens while the run continues, so the UI can poll
+it without blocking, and it can be cancelled.
+
+When the workflow is checkpointed (workflow.durable_workflow), each job runs
+under its own run id, and a run which fails is resumed from its last
+completed node (see run_checkpoints.py) up to `run_retries` times before the
+job fails.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import workflow_config as config
+from metrics import register_collector
+
+
+job_pool = ThreadPoolExecutor(max_workers=config.max_concurrent_runs, thread_name_prefix='workflow-job')
+
+job_stats = {'submitted': 0, 'queued': 0, 'running': 0, 'done': 0, 'failed': 0, 'cancelled': 0, 'retried': 0}
+job_stats_lock = threading.Lock()
+
+register_collector('intellicode_ui_jobs', 'Workflow runs of the app by state (queued/running are current, the rest totals).', 'gauge', lambda: dict(job_stats))
+
+
+class job_cancelled(Exception):
+    """Raised inside a run to stop it after the user cancelled."""
+
+
+class workflow_job:
+    """Handle of one workflow run executing on the shared job pool."""
+
+    def __init__(self, initial_state: dict):
+        self.initial_state = initial_state
+        self.run_id = uuid.uuid4().hex
+        self.attempts = 0
+        self.status = 'queued'
+        self.completed_nodes = []
+        self.streamed_node = None
+        self.streamed_text = ''
+        self.final_state = {}
+        self.error = None
+        self.submitted = time.monotonic()
+        self.finished = None
+        self.future = None
+        self.cancel_requested = threading.Event()
+        self.lock = threading.Lock()
+
+    def set_status(self, status: str):
+        with job_stats_lock:
+            if self.status in ('queued', 'running'):
+                job_stats[self.status] -= 1
+            job_stats[status] += 1
+        self.status = status
+        if status not in ('queued', 'running'):
+            self.finished = time.monotonic()
+
+    def run(self, load_workflow):
+        """Stream the run, recording per-node progress and tokens; load_workflow returns the compiled workflow."""
+        if self.cancel_requested.is_set():
+            return
+        with self.lock:
+            self.set_status('running')
+        try:
+            workflow = load_workflow()
+            # imported with the workflow, not with the app (run_checkpoints pulls in LangGraph)
+            from run_checkpoints import run_config
+            checkpointer = getattr(workflow, 'checkpointer', None)
+            state = self.initial_state
+            while True:
+                try:
+                    self.stream(workflow, state, run_config(self.run_id) if checkpointer else None)
+                    break
+                except job_cancelled:
+                    raise
+                except Exception:
+                    # a checkpointed run continues at the node which failed, keeping what the others produced
+                    if not checkpointer or self.attempts >= config.run_retries or not checkpointer.has_run(self.run_id):
+                        raise
+                    time.sleep(config.run_retry_backoff * 2 ** self.attempts)
+                    if self.cancel_requested.is_set():
+                        raise job_cancelled()
+                    self.attempts += 1
+                    with job_stats_lock:
+                        job_stats['retried'] += 1
+                    state = None
+            if checkpointer:
+                checkpointer.delete_thread(self.run_id)
+        except job_cancelled:
+            with self.lock:
+                self.set_status('cancelled')
+        except Exception as error:
+            with self.lock:
+                self.error = f'{type(error).__name__}: {error}'
+                self.set_status('failed')
+        else:
+            with self.lock:
+                self.set_status('done')
+
+    def stream(self, workflow, state, run):
+        """One attempt of the run (state None resumes it), recording its progress."""
+        with self.lock:
+            self.streamed_node = None
+            self.streamed_text = ''
+        for mode, chunk in workflow.stream(state, run, stream_mode=['updates', 'custom', 'values']):
+            if self.cancel_requested.is_set():
+                raise job_cancelled()
+            with self.lock:
+                if mode == 'updates':
+                    self.completed_nodes += list(chunk)
+                elif mode == 'custom':
+                    if chunk['node'] != self.streamed_node:
+                        self.streamed_node = chunk['node']
+                        self.streamed_text = ''
+                    self.streamed_text += chunk['token']
+                else:
+                    self.final_state = chunk
+
+    def cancel(self):
+        """Stop the run: a queued job never starts, a running one stops at the next node or token."""
+        self.cancel_requested.set()
+        with self.lock:
+            if self.future is not None and self.future.cancel() and self.status == 'queued':
+                self.set_status('cancelled')
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def progress(self) -> dict:
+        """Consistent snapshot of the run for rendering."""
+        with self.lock:
+            return {
+                'status': self.status,
+                'completed_nodes': list(self.completed_nodes),
+                'streamed_node': self.streamed_node,
+                'streamed_text': self.streamed_text,
+                'attempts': self.attempts,
+                'elapsed': (self.finished or time.monotonic()) - self.submitted,
+            }
+
+
+def submit_job(load_workflow, initial_state: dict) -> workflow_job:
+    """Queue a run on the shared pool and return its handle."""
+    job = workflow_job(initial_state)
+    with job_stats_lock:
+        job_stats['submitted'] += 1
+        job_stats['queued'] += 1
+    job.future = job_pool.submit(job.run, load_workflow)
+    return job
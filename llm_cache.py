@@ -0,0 +1,170 @@
+"""
+Two-tier response cache for the LLM calls made by the workflow nodes.
+
+An in-memory LRU tier sits in front of an on-disk SQLite tier, so repeated
+requests (the same "explain" on the same buffer, replayed regression prompts)
+are answered without another OpenRouter round-trip, also across restarts.
+Both tiers evict by entry count and by TTL, and hit/miss counters are kept.
+Reads never commit: the access times of disk hits are written with the next
+store. The async workflow goes through aget/aset, which keep the SQLite tier
+off the event loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+def cache_key(node: str, model_id: str, prompt_version: str, messages) -> str:
+    """Build the cache key from the node, model, template version and a hash of the rendered messages."""
+    payload = json.dumps(messages, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    digest = hashlib.sha256(payload).hexdigest()
+    return f'{node}:{model_id}:{prompt_version}:{digest}'
+
+
+class llm_cache:
+    """Thread-safe LRU memory tier backed by a SQLite tier, both with TTL eviction."""
+
+    def __init__(self, path=None, max_memory_entries: int = 512, max_disk_entries: int = 20000, ttl_seconds: float = 7 * 24 * 3600):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self.writes_since_prune = 0
+        # disk hits whose last_access is not written yet: key -> access time
+        self.touched = {}
+
+        self.db = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(path), check_same_thread=False)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)'
+            )
+            self.db.commit()
+
+    def get(self, key: str):
+        """Return the cached value for key, or None on a miss."""
+        value = self.memory_get(key)
+        return value if value is not None else self.disk_get(key)
+
+    async def aget(self, key: str):
+        """get for the event loop: the memory tier inline, the SQLite tier on a worker thread."""
+        value = self.memory_get(key)
+        if value is None:
+            value = await asyncio.to_thread(self.disk_get, key) if self.db is not None else self.disk_get(key)
+        return value
+
+    def memory_get(self, key: str):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self.memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return value
+                del self.memory[key]
+            return None
+
+    def disk_get(self, key: str):
+        """Look a key up in the SQLite tier (counting the miss of both tiers); reads never commit."""
+        now = time.time()
+        with self.lock:
+            if self.db is not None:
+                row = self.db.execute('SELECT value, expires_at FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    # the access time is written with the next store (or prune), not by the read
+                    self.touched[key] = now
+                    self.remember(key, row[0], row[1])
+                    self.stats['disk_hits'] += 1
+                    return row[0]
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        """Store a value in both tiers."""
+        expires_at = self.memory_set(key, value)
+        self.disk_set(key, value, expires_at)
+
+    async def aset(self, key: str, value: str):
+        """set for the event loop: the SQLite write (and its commit) runs on a worker thread."""
+        expires_at = self.memory_set(key, value)
+        if self.db is not None:
+            await asyncio.to_thread(self.disk_set, key, value, expires_at)
+
+    def memory_set(self, key: str, value: str) -> float:
+        expires_at = time.time() + self.ttl_seconds
+        with self.lock:
+            self.remember(key, value, expires_at)
+            self.stats['stores'] += 1
+        return expires_at
+
+    def disk_set(self, key: str, value: str, expires_at: float):
+        with self.lock:
+            if self.db is None:
+                return
+            self.flush_touched()
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)',
+                (key, value, expires_at, time.time()),
+            )
+            self.db.commit()
+            self.writes_since_prune += 1
+            if self.writes_since_prune >= 100:
+                self.prune()
+
+    def flush_touched(self):
+        """Write the access times of the disk hits since the last write, in the current transaction (lock held)."""
+        if self.touched:
+            self.db.executemany('UPDATE responses SET last_access = ? WHERE key = ?', [(now, key) for key, now in self.touched.items()])
+            self.touched.clear()
+
+    def remember(self, key: str, value: str, expires_at: float):
+        """Insert into the memory tier, evicting the least recently used entries (lock held)."""
+        self.memory[key] = (value, expires_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def prune(self):
+        """Drop expired disk entries and the least recently used ones beyond the size limit (lock held)."""
+        self.writes_since_prune = 0
+        self.flush_touched()
+        cursor = self.db.execute('DELETE FROM responses WHERE expires_at <= ?', (time.time(),))
+        evicted = cursor.rowcount
+        cursor = self.db.execute(
+            'DELETE FROM responses WHERE key IN ('
+            'SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+            (self.max_disk_entries,),
+        )
+        evicted += cursor.rowcount
+        self.db.commit()
+        self.stats['evictions'] += max(evicted, 0)
+
+    def clear(self):
+        """Empty both tiers."""
+        with self.lock:
+            self.memory.clear()
+            self.touched.clear()
+            if self.db is not None:
+                self.db.execute('DELETE FROM responses')
+                self.db.commit()
+
+    def hit_rate(self) -> float:
+        """Fraction of lookups answered from either tier."""
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        lookups = hits + self.stats['misses']
+        return hits / lookups if lookups else 0.0
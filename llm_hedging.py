@@ -0,0 +1,197 @@
+"""
+Hedged LLM requests for the node calls of the workflow.
+
+Most calls of a node take about the same time, but a few hang far longer, and
+with several sequential calls per request that tail adds up. With hedging
+enabled, a call which has not returned by its node's deadline (a percentile of
+the node's recent latencies) is sent a second time, to the same route or to
+an alternate model (`hedge_models`); the first answer wins and the other call
+is cancelled (async) or discarded when it returns (sync, where a running
+request cannot be interrupted). The losing call is still recorded: its usage
+when it returns, or the call without tokens when it was cancelled.
+
+Hedges are extra traffic, so they are capped: every call earns a fraction of
+a hedge (`hedge_budget`), and a hedge is only sent while a whole one is
+saved up. A call still waiting in the scheduler queue is never hedged; it is
+slow because the provider is loaded, and a duplicate would only add to that.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextvars import copy_context
+
+from metrics import register_collector
+from model_registry import parse_model
+
+import workflow_config as config
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class hedging_policy:
+    """Per-node latency windows, the hedge deadlines learned from them and the hedge budget."""
+
+    def __init__(self, models, nodes: tuple, fraction: float, min_samples: int, window: int, min_delay: float, budget: float, burst: float, alternates: dict, workers: int):
+        self.models = models
+        self.nodes = nodes
+        self.fraction = fraction
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self.budget = budget
+        self.burst = burst
+        self.alternates = alternates
+        self.latencies = {}
+        self.credit = burst
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hedge')
+        self.stats = {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'primary_wins': 0, 'over_budget': 0}
+        for node, value in alternates.items():
+            endpoint, _ = parse_model(value)
+            if endpoint not in models.endpoints:
+                raise ValueError(f'hedge model of {node} uses the unknown endpoint {endpoint!r}')
+
+    def deadline(self, node: str):
+        """Seconds after which a call of the node is hedged, or None while it has too few samples or is not hedged."""
+        if node not in self.nodes:
+            return None
+        with self.lock:
+            samples = list(self.latencies.get(node, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return max(percentile(samples, self.fraction), self.min_delay)
+
+    def observe(self, node: str, seconds: float = None):
+        """Record the latency of a finished call (None when it is unknown) and earn its share of a hedge."""
+        with self.lock:
+            if seconds is not None:
+                self.latencies.setdefault(node, deque(maxlen=self.window)).append(seconds)
+            self.credit = min(self.credit + self.budget, self.burst)
+            self.stats['calls'] += 1
+
+    def take_budget(self) -> bool:
+        with self.lock:
+            if self.credit >= 1:
+                self.credit -= 1
+                self.stats['hedged'] += 1
+                return True
+            self.stats['over_budget'] += 1
+            return False
+
+    def alternate(self, node: str, route: dict) -> dict:
+        """Route of the hedge: the node's hedge model, else the route of the call itself."""
+        if node not in self.alternates:
+            return route
+        endpoint, model = parse_model(self.alternates[node])
+        return {'endpoint': endpoint, 'model': model, 'params': route['params']}
+
+    def count_winner(self, hedge_won: bool):
+        with self.lock:
+            self.stats['hedge_wins' if hedge_won else 'primary_wins'] += 1
+
+    def call(self, node: str, route: dict, request):
+        """(result, route) of request(route, sent), hedged past the node's deadline; request sets `sent` once admitted."""
+        started = time.monotonic()
+        delay = self.deadline(node)
+        if delay is None:
+            result = request(route, threading.Event())
+            self.observe(node, time.monotonic() - started)
+            return result, route
+
+        sent = threading.Event()
+        primary = self.pool.submit(copy_context().run, request, route, sent)
+        done, _ = wait([primary], timeout=delay)
+        if done or not sent.is_set() or not self.take_budget():
+            result = primary.result()
+            self.observe(node, time.monotonic() - started)
+            return result, route
+
+        def primary_done(future):
+            # the primary's real latency, also when the hedge won and cut the wait for it short
+            self.observe(node, time.monotonic() - started if future.exception() is None else None)
+
+        primary.add_done_callback(primary_done)
+        alternate = self.alternate(node, route)
+        hedge = self.pool.submit(copy_context().run, request, alternate, threading.Event())
+        routes = {primary: route, hedge: alternate}
+        errors = []
+        while routes:
+            done, _ = wait(list(routes), return_when=FIRST_COMPLETED)
+            for future in done:
+                winner = routes.pop(future)
+                if future.exception() is not None:
+                    errors.append(future.exception())
+                    continue
+                # the other call keeps its thread until it returns; its result is dropped (its usage is recorded by request)
+                for other in routes:
+                    other.cancel()
+                self.count_winner(future is hedge)
+                return future.result(), winner
+        raise errors[0]
+
+    async def acall(self, node: str, route: dict, request):
+        """Async counterpart of call; request(route, sent) is a coroutine function and the losing call is cancelled."""
+        started = time.monotonic()
+        delay = self.deadline(node)
+        if delay is None:
+            result = await request(route, asyncio.Event())
+            self.observe(node, time.monotonic() - started)
+            return result, route
+
+        sent = asyncio.Event()
+        tasks = {asyncio.ensure_future(request(route, sent)): route}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not sent.is_set() or not self.take_budget():
+                result = await next(iter(tasks))
+                self.observe(node, time.monotonic() - started)
+                return result, route
+
+            alternate = self.alternate(node, route)
+            hedge = asyncio.ensure_future(request(alternate, asyncio.Event()))
+            tasks[hedge] = alternate
+            errors = []
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    winner = tasks.pop(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        continue
+                    self.count_winner(task is hedge)
+                    # a primary cancelled by a winning hedge has no latency of its own; the truncated wait is no sample
+                    self.observe(node, None if task is hedge else time.monotonic() - started)
+                    return task.result(), winner
+            raise errors[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def deadlines(self) -> dict:
+        """Current hedge deadline per node with enough samples, for the gauge."""
+        return {node: deadline for node in self.nodes if (deadline := self.deadline(node)) is not None}
+
+
+def hedging_from_config(models) -> hedging_policy:
+    policy = hedging_policy(
+        models,
+        nodes=config.hedge_nodes,
+        fraction=config.hedge_percentile,
+        min_samples=config.hedge_min_samples,
+        window=config.hedge_window,
+        min_delay=config.hedge_min_delay,
+        budget=config.hedge_budget,
+        burst=config.hedge_budget_burst,
+        alternates=config.hedge_models,
+        workers=config.hedge_workers,
+    )
+    register_collector('intellicode_hedge_total', 'Node calls seen by the hedging policy, hedges sent, won by the hedge or the first call, and refused by the budget.', 'counter', lambda: dict(policy.stats))
+    register_collector('intellicode_hedge_deadline_seconds', 'Current hedge deadline per node (label kind is the node).', 'gauge', policy.deadlines)
+    return policy
@@ -0,0 +1,295 @@
+"""
+Process-wide admission control for the LLM calls of the workflow.
+
+Every API call of a node (llm_call, allm_call, llm_stream, allm_stream) is
+admitted by one scheduler shared by all requests of the process, before it
+is sent. Each model has a lane with:
+
+- requests-per-minute and tokens-per-minute token buckets (the tokens of a
+  call are estimated from its messages and settled with the real usage once
+  it returns),
+- a cap on the calls in flight,
+- a priority queue: interactive calls (the app) are admitted before batch
+  calls (batch_runner.py), in arrival order within a priority.
+
+A call which waits in the queue longer than the deadline of its priority, or
+finds the queue full, is shed with `llm_overloaded` instead of piling onto an
+overloaded provider. A 429 which survives the client's retries pauses the
+whole lane for the Retry-After time, so the other queued calls do not run
+into the same limit.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+
+from openai import RateLimitError
+
+from chunking import estimate_tokens
+from metrics import metric_family, families, LATENCY_BUCKETS, register_collector
+
+import workflow_config as config
+
+
+# priorities of the requests, lowest first; a request sets its own with the 'priority' field of the state
+PRIORITIES = {'interactive': 0, 'batch': 1}
+
+queue_wait = metric_family('intellicode_llm_queue_wait_seconds', 'Time LLM calls waited for admission by the scheduler.', 'histogram', LATENCY_BUCKETS)
+families.append(queue_wait)
+
+
+class llm_overloaded(RuntimeError):
+    """Raised when a call is shed: the scheduler queue of its model is full or it waited past its deadline."""
+
+
+class token_bucket:
+    """Refills `per_minute` units a minute, holding at most a minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken; a call larger than the bucket waits for a full one."""
+        self.refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+
+class model_lane:
+    """Buckets, in-flight calls and queue of one model."""
+
+    def __init__(self, rpm: float, tpm: float, concurrency: int):
+        self.requests = token_bucket(rpm) if rpm else None
+        self.tokens = token_bucket(tpm) if tpm else None
+        self.concurrency = concurrency
+        self.running = 0
+        self.queue = []
+        self.paused_until = 0.0
+
+    def wait_time(self, ticket, now: float) -> float:
+        """Seconds until the call can be admitted; inf while the lane is full (a finishing call wakes it)."""
+        if self.concurrency and self.running >= self.concurrency:
+            return math.inf
+        wait = max(self.paused_until - now, 0.0)
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(ticket.tokens, now))
+        return wait
+
+
+class ticket:
+    """One call waiting for or holding admission."""
+
+    def __init__(self, lane: model_lane, model: str, priority: str, tokens: int, deadline: float):
+        self.lane = lane
+        self.model = model
+        self.priority = priority
+        self.tokens = tokens
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.admitted = False
+        self.left = False
+        self.wake = None
+
+
+class admission:
+    """Context manager (sync and async) holding the admission of one call; set `usage` to settle its tokens."""
+
+    def __init__(self, scheduler, ticket: ticket):
+        self.scheduler = scheduler
+        self.ticket = ticket
+        self.usage = None
+
+    def __enter__(self):
+        self.scheduler.acquire(self.ticket)
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        self.scheduler.release(self.ticket, self.usage, error)
+        return False
+
+    async def __aenter__(self):
+        await self.scheduler.aacquire(self.ticket)
+        return self
+
+    async def __aexit__(self, kind, error, traceback):
+        self.scheduler.release(self.ticket, self.usage, error)
+        return False
+
+
+class llm_scheduler:
+    """Lanes of the models, with their buckets, queues and the shared statistics."""
+
+    def __init__(self, limits: dict, default_limits: tuple, concurrency: int, max_wait: dict, max_queue: int, completion_tokens: int, cooldown: float):
+        self.limits = limits
+        self.default_limits = default_limits
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.completion_tokens = completion_tokens
+        self.cooldown = cooldown
+        self.lanes = {}
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.stats = {'admitted': 0, 'shed_deadline': 0, 'shed_queue_full': 0, 'throttled': 0}
+
+    def lane(self, route: dict) -> model_lane:
+        key = (route['endpoint'], route['model'])
+        if key not in self.lanes:
+            rpm, tpm = self.limits.get(route['model'], self.default_limits)
+            self.lanes[key] = model_lane(rpm, tpm, self.concurrency)
+        return self.lanes[key]
+
+    def admit(self, route: dict, messages: list, priority: str = None) -> admission:
+        """Admission of one call of a route: `with scheduler.admit(...)` or `async with scheduler.admit(...)`."""
+        priority = priority or 'interactive'
+        if priority not in PRIORITIES:
+            raise ValueError(f'unknown request priority {priority!r}, expected one of {sorted(PRIORITIES)}')
+        tokens = sum(estimate_tokens(str(message['content'])) for message in messages) + route['params'].get('max_tokens', self.completion_tokens)
+        with self.lock:
+            lane = self.lane(route)
+        return admission(self, ticket(lane, route['model'], priority, tokens, time.monotonic() + self.max_wait[priority]))
+
+    def enqueue(self, ticket: ticket):
+        waiting = sum(not queued.left for _, _, queued in ticket.lane.queue)
+        if self.max_queue and waiting >= self.max_queue:
+            self.stats['shed_queue_full'] += 1
+            raise llm_overloaded(f'the scheduler queue of {ticket.model} is full ({waiting} calls waiting)')
+        heapq.heappush(ticket.lane.queue, (PRIORITIES[ticket.priority], next(self.sequence), ticket))
+
+    def dispatch(self, lane: model_lane) -> float:
+        """Admit the calls at the head of a lane while it has room; seconds until the next head may be admitted."""
+        now = time.monotonic()
+        while lane.queue:
+            head = lane.queue[0][2]
+            if head.left:
+                heapq.heappop(lane.queue)
+                continue
+            wait = lane.wait_time(head, now)
+            if wait > 0:
+                return wait
+            heapq.heappop(lane.queue)
+            lane.running += 1
+            if lane.requests is not None:
+                lane.requests.take(1)
+            if lane.tokens is not None:
+                lane.tokens.take(head.tokens)
+            head.admitted = True
+            self.stats['admitted'] += 1
+            head.wake()
+        return math.inf
+
+    def shed(self, ticket: ticket):
+        ticket.left = True
+        self.stats['shed_deadline'] += 1
+        return llm_overloaded(f'{ticket.priority} call to {ticket.model} waited {time.monotonic() - ticket.enqueued:.1f}s for admission and was shed')
+
+    def acquire(self, ticket: ticket):
+        event = threading.Event()
+        ticket.wake = event.set
+        with self.lock:
+            self.enqueue(ticket)
+            retry = self.dispatch(ticket.lane)
+        while True:
+            with self.lock:
+                if ticket.admitted:
+                    break
+                remaining = ticket.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self.shed(ticket)
+            event.wait(min(retry, remaining))
+            event.clear()
+            with self.lock:
+                retry = self.dispatch(ticket.lane)
+        queue_wait.observe(time.monotonic() - ticket.enqueued, model=ticket.model, priority=ticket.priority)
+
+    async def aacquire(self, ticket: ticket):
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        ticket.wake = lambda: loop.call_soon_threadsafe(event.set)
+        with self.lock:
+            self.enqueue(ticket)
+            retry = self.dispatch(ticket.lane)
+        try:
+            while True:
+                with self.lock:
+                    if ticket.admitted:
+                        break
+                    remaining = ticket.deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self.shed(ticket)
+                try:
+                    await asyncio.wait_for(event.wait(), min(retry, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+                with self.lock:
+                    retry = self.dispatch(ticket.lane)
+        except asyncio.CancelledError:
+            # a cancelled caller gives its place (or its admission) to the next call
+            with self.lock:
+                ticket.left = True
+            if ticket.admitted:
+                self.release(ticket, None, None)
+            raise
+        queue_wait.observe(time.monotonic() - ticket.enqueued, model=ticket.model, priority=ticket.priority)
+
+    def release(self, ticket: ticket, usage, error):
+        """End an admitted call: settle its tokens with the real usage, pause the lane on a 429, admit the next calls."""
+        lane = ticket.lane
+        with self.lock:
+            lane.running -= 1
+            if usage is not None and lane.tokens is not None:
+                lane.tokens.take((getattr(usage, 'prompt_tokens', 0) or 0) + (getattr(usage, 'completion_tokens', 0) or 0) - ticket.tokens)
+            if isinstance(error, RateLimitError):
+                self.stats['throttled'] += 1
+                lane.paused_until = max(lane.paused_until, time.monotonic() + retry_after(error, self.cooldown))
+            self.dispatch(lane)
+
+    def snapshot(self) -> dict:
+        """Calls waiting per priority and in flight, over all lanes."""
+        with self.lock:
+            lanes = list(self.lanes.values())
+            depth = {f'queued_{priority}': 0 for priority in PRIORITIES}
+            for lane in lanes:
+                for _, _, queued in lane.queue:
+                    if not queued.left:
+                        depth[f'queued_{queued.priority}'] += 1
+            return {**depth, 'running': sum(lane.running for lane in lanes)}
+
+
+def retry_after(error: RateLimitError, default: float) -> float:
+    """Seconds to pause after a 429: its Retry-After header, else the configured cooldown."""
+    try:
+        return float(error.response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return default
+
+
+def scheduler_from_config() -> llm_scheduler:
+    scheduler = llm_scheduler(
+        limits=config.model_rate_limits,
+        default_limits=(config.default_rpm, config.default_tpm),
+        concurrency=config.model_max_concurrency,
+        max_wait=config.scheduler_max_wait,
+        max_queue=config.scheduler_max_queue,
+        completion_tokens=config.scheduler_completion_tokens,
+        cooldown=config.rate_limit_cooldown,
+    )
+    register_collector('intellicode_llm_scheduler_total', 'LLM calls admitted, shed past their deadline or on a full queue, and 429s which paused a model.', 'counter', lambda: dict(scheduler.stats))
+    register_collector('intellicode_llm_scheduler_queue', 'LLM calls waiting for admission per priority, and in flight.', 'gauge', scheduler.snapshot)
+    return scheduler
@@ -0,0 +1,99 @@
+"""
+HTTP transport for the OpenRouter clients used by the workflow.
+
+Builds the sync and async OpenAI clients on explicitly sized, keep-alive
+connection pools (HTTP/2 when the optional `h2` package is installed), with
+connect/read timeouts per node, bounded retries on 429/5xx and an optional
+connection pre-warm of both pools, so requests do not pay for cold TLS
+handshakes or hang without a timeout. The pools are httpx clients owned here
+and handed to the SDK, so the pre-warm goes through them directly.
+"""
+
+import importlib.util
+import threading
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+import workflow_config as config
+
+
+def http2_enabled() -> bool:
+    """HTTP/2 is used when requested and the `h2` package is installed."""
+    return config.http2 and importlib.util.find_spec('h2') is not None
+
+
+def transport_limits() -> httpx.Limits:
+    """Connection pool sizing shared by the sync and async clients."""
+    return httpx.Limits(
+        max_connections=config.http_max_connections,
+        max_keepalive_connections=config.http_max_keepalive_connections,
+        keepalive_expiry=config.http_keepalive_expiry,
+    )
+
+
+def node_timeout(node: str) -> httpx.Timeout:
+    """Connect/read timeouts for the calls of one node."""
+    read = config.node_read_timeouts.get(node, config.http_read_timeout)
+    connect = config.node_connect_timeouts.get(node, config.http_connect_timeout)
+    return httpx.Timeout(read, connect=connect, pool=config.http_pool_timeout)
+
+
+def resolve_resources(client):
+    """Import the lazily loaded API resources now, so concurrent first calls from several threads do not race on the imports."""
+    client.chat.completions
+    client.beta.chat.completions
+    return client
+
+
+def build_http_client() -> httpx.Client:
+    """The tuned, pooled sync transport of one endpoint."""
+    return DefaultHttpxClient(
+        limits=transport_limits(),
+        http2=http2_enabled(),
+        timeout=node_timeout('default'),
+    )
+
+
+def build_async_http_client() -> httpx.AsyncClient:
+    """The tuned, pooled async transport of one endpoint."""
+    return DefaultAsyncHttpxClient(
+        limits=transport_limits(),
+        http2=http2_enabled(),
+        timeout=node_timeout('default'),
+    )
+
+
+def build_client(base_url: str, api_key: str, http_client: httpx.Client = None) -> OpenAI:
+    """Sync OpenAI client on the tuned, pooled transport (safe to share across threads)."""
+    client = OpenAI(base_url=base_url, api_key=api_key, http_client=http_client or build_http_client(), max_retries=config.llm_max_retries)
+    return resolve_resources(client)
+
+
+def build_async_client(base_url: str, api_key: str, http_client: httpx.AsyncClient = None) -> AsyncOpenAI:
+    """Async OpenAI client on the tuned, pooled transport."""
+    client = AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=http_client or build_async_http_client(), max_retries=config.llm_max_retries)
+    return resolve_resources(client)
+
+
+def prewarm(base_url: str, http_client: httpx.Client, background: bool = True):
+    """Open a pooled connection (DNS, TCP and TLS) to the API host before the first request."""
+    def connect():
+        try:
+            http_client.head(base_url, timeout=node_timeout('prewarm'))
+        except httpx.HTTPError:
+            # pre-warming is best effort; the first request will connect on its own
+            pass
+
+    if background:
+        threading.Thread(target=connect, name='llm-prewarm', daemon=True).start()
+    else:
+        connect()
+
+
+async def aprewarm(base_url: str, http_client: httpx.AsyncClient):
+    """Open a connection of the async pool; run it on the event loop which makes the calls, as its connections belong to that loop."""
+    try:
+        await http_client.head(base_url, timeout=node_timeout('prewarm'))
+    except httpx.HTTPError:
+        pass
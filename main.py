@@ -3,21 +3,103 @@ Streamlit application for IntelliCode-SL with VS Code-like interface.
 
 Features:
 - Code editor with syntax highlighting
-- Chat interface
+- Chat interface with streamed responses
 """
 
-from workflow import workflow
+from code_utils import strip_code_fences
+from concurrent.futures import ThreadPoolExecutor
+from job_runner import submit_job
+from workflow_config import job_poll_seconds, workflow_server_url
 import streamlit as st
 from streamlit_ace import st_ace
 from styles.components import (
     load_css,
     render_chat_history,
+    render_chat_messages,
+    render_streaming_message,
+    format_job_progress,
     render_send_button,
     render_page_title,
     render_code_editor_wrapper_start,
-    render_code_stats
+    render_code_stats,
+    CHAT_WINDOW_SIZE
 )
 
+
+@st.cache_resource(show_spinner=False)
+def workflow_loader():
+    """Import and compile the workflow once per process, in the background.
+
+    Importing the LLM stack (LangGraph, langchain_core, OpenAI client) takes
+    seconds, so the first page paint does not wait for it; every session and
+    rerun shares the same compiled workflow. The checkpointed variant is used
+    when checkpoints are enabled, so a failed run is retried from its last
+    completed node instead of from scratch. With workflow_server_url set, the
+    app is a thin client of a workflow server (server.py) instead.
+    """
+    def load():
+        if workflow_server_url:
+            from workflow_client import remote_workflow
+            return remote_workflow(workflow_server_url)
+        from workflow import workflow, durable_workflow
+        return durable_workflow or workflow
+
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='workflow-loader').submit(load)
+
+
+def finish_job(job):
+    """Move the result of a finished run into the chat history and the editor."""
+    if job.status == 'done':
+        # Extract final_answer for chat
+        response_content = job.final_state.get('final_answer', 'No response generated.')
+
+        # Extract modified_code for IDE
+        modified_code = job.final_state.get('modified_code', None)
+
+        # Keep the compacted conversation, including this turn, for the next request
+        st.session_state.conversation = job.final_state.get('messeges', st.session_state.conversation)
+
+        # If workflow returned modified code, update the editor
+        if modified_code is not None and modified_code.strip():
+            # Strip markdown code blocks if LLM wrapped code in ```
+            st.session_state.code_content = strip_code_fences(modified_code)
+            # Increment counter to force editor refresh
+            st.session_state.editor_counter += 1
+    elif job.status == 'cancelled':
+        response_content = '⏹️ Request cancelled.'
+    else:
+        response_content = f'⚠️ The request failed: {job.error}'
+        # A failed workflow import is retried on the next request
+        loader = workflow_loader()
+        if loader.done() and loader.exception() is not None:
+            workflow_loader.clear()
+
+    # Replace "thinking..." with actual response
+    st.session_state.chat_history[-1] = {
+        'role': 'assistant',
+        'content': response_content
+    }
+    st.session_state.job = None
+
+
+@st.fragment(run_every=job_poll_seconds)
+def render_running_job():
+    """Chat pane with the progress of the running request, refreshed on its own while the rest of the page stays interactive."""
+    job = st.session_state.job
+    if job is None:
+        return
+
+    if job.done:
+        finish_job(job)
+        st.rerun(scope="app")
+
+    history = render_chat_messages(st.session_state.chat_history[:-1], st.session_state.chat_window)
+    render_streaming_message(None, history, format_job_progress(job.progress()))
+
+    if st.button("Cancel", key="cancel_job"):
+        job.cancel()
+
+
 # Page configuration
 st.set_page_config(
     page_title="IntelliCode-SL IDE",
@@ -48,6 +130,17 @@ if 'input_counter' not in st.session_state:
 if 'editor_counter' not in st.session_state:
     st.session_state.editor_counter = 0
 
+if 'chat_window' not in st.session_state:
+    st.session_state.chat_window = CHAT_WINDOW_SIZE
+
+# Previous turns sent with each request (the workflow keeps them under its token budget)
+if 'conversation' not in st.session_state:
+    st.session_state.conversation = []
+
+# Handle of the request running in the background (job_runner.workflow_job)
+if 'job' not in st.session_state:
+    st.session_state.job = None
+
 # Create two-column layout
 col_left, col_right = st.columns([1.5, 1])
 
@@ -97,8 +190,16 @@ with col_left:
 with col_right:
     st.markdown("### 💬 Chat Assistant")
     
-    # Render chat history from components module
-    render_chat_history(st.session_state.chat_history)
+    # Older messages outside the rendered window are loaded on demand
+    if len(st.session_state.chat_history) > st.session_state.chat_window:
+        if st.button("Load older messages", key="load_older"):
+            st.session_state.chat_window += CHAT_WINDOW_SIZE
+
+    # Render chat history from components module, or the progress of the running request
+    if st.session_state.job is None:
+        render_chat_history(st.session_state.chat_history, window=st.session_state.chat_window)
+    else:
+        render_running_job()
     
     st.markdown("<br>", unsafe_allow_html=True)
     
@@ -120,8 +221,11 @@ with col_right:
     if user_input and user_input.strip():
         send_button = True
     
-    # Process chat input
-    if send_button and user_input and user_input.strip():
+    # Process chat input (one request at a time per session)
+    if send_button and user_input and user_input.strip() and st.session_state.job is not None:
+        st.toast("A request is still running. Wait for it or cancel it.")
+
+    elif send_button and user_input and user_input.strip():
         # Add user message to history immediately
         st.session_state.chat_history.append({
             'role': 'user',
@@ -134,56 +238,18 @@ with col_right:
             'content': '🤔 Thinking...'
         })
         
-        # Increment counter to reset input field and show messages
-        st.session_state.input_counter += 1
-        st.rerun()
-    
-    # Check if we need to process workflow (last message is "thinking...")
-    if (len(st.session_state.chat_history) >= 2 and 
-        st.session_state.chat_history[-1]['role'] == 'assistant' and 
-        st.session_state.chat_history[-1]['content'] == '🤔 Thinking...'):
-        
-        # Get the user's message (second to last)
-        user_message = st.session_state.chat_history[-2]['content']
-        
-        # Create initial_state for workflow
+        # Run the workflow in the background on the shared job pool
         initial_state = {
-            'prompt': user_message,
-            'input_code': st.session_state.code_content if st.session_state.code_content.strip() else None
+            'prompt': user_input,
+            'input_code': st.session_state.code_content if st.session_state.code_content.strip() else None,
+            'messeges': st.session_state.conversation,
+            'priority': 'interactive'
         }
+        st.session_state.job = submit_job(workflow_loader().result, initial_state)
 
-        # Invoke workflow
-        final_state = workflow.invoke(initial_state)
-
-        # Extract final_answer for chat
-        response_content = final_state.get('final_answer', 'No response generated.')
-
-        # Extract modified_code for IDE
-        modified_code = final_state.get('modified_code', None)
-
-        # If workflow returned modified code, update the editor
-        if modified_code is not None and modified_code.strip():
-            # Strip markdown code blocks if LLM wrapped code in ```
-            cleaned_code = modified_code.strip()
-            if cleaned_code.startswith('```'):
-                lines = cleaned_code.split('\n')
-                # Remove first line if it's ```python or similar
-                if lines[0].startswith('```'):
-                    lines = lines[1:]
-                # Remove last line if it's ```
-                if lines and lines[-1].strip() == '```':
-                    lines = lines[:-1]
-                cleaned_code = '\n'.join(lines)
-        
-            # Update the code in editor
-            st.session_state.code_content = cleaned_code
-            # Increment counter to force editor refresh
-            st.session_state.editor_counter += 1
-
-        # Replace "thinking..." with actual response
-        st.session_state.chat_history[-1] = {
-            'role': 'assistant',
-            'content': response_content
-        }
-        
+        # Increment counter to reset input field and show messages
+        st.session_state.input_counter += 1
         st.rerun()
+
+# Start loading the workflow once the page is painted, so it is ready by the first request
+workflow_loader()
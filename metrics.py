@@ -0,0 +1,181 @@
+"""
+Timing, token usage and cost accounting for the workflow.
+
+Every LLM call of a node produces a call record; the records travel in the
+`metadata` field of the workflow state (merged by `merge_metadata`), so the
+final state carries a per-request breakdown by node. The same records feed
+process-wide Prometheus-style counters and histograms, rendered in the text
+exposition format by `render_prometheus`.
+"""
+
+import bisect
+import threading
+import time
+
+import workflow_config as config
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """Estimated USD cost of a call from the per-million-token prices in the config.
+
+    Prompt tokens served from the provider's prompt cache are billed at the cached input price
+    when the model has one.
+    """
+    input_price, output_price, *cached = config.model_prices.get(model, (0.0, 0.0))
+    cached_price = cached[0] if cached else input_price
+    return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+def call_record(node: str, model: str, started: float, usage=None, cached: bool = False) -> dict:
+    """Describe one LLM call: wall time since `started` (perf_counter), tokens, model and cost."""
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = getattr(details, 'cached_tokens', 0) or 0
+    return {
+        'node': node,
+        'model': model,
+        'wall_time': time.perf_counter() - started,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'cached_tokens': cached_tokens,
+        'cached_response': cached,
+        'cost': 0.0 if cached else estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+    }
+
+
+def summarize_metadata(calls: list, node_times: dict) -> dict:
+    """Build the per-node and per-request breakdown from the call records and node wall times."""
+    nodes = {}
+    for name, wall_time in node_times.items():
+        nodes[name] = {'wall_time': wall_time, 'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0, 'cost': 0.0}
+    for call in calls:
+        entry = nodes.setdefault(call['node'], {'wall_time': 0.0, 'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0, 'cost': 0.0})
+        entry['calls'] += 1
+        entry['prompt_tokens'] += call['prompt_tokens']
+        entry['cached_tokens'] += call['cached_tokens']
+        entry['completion_tokens'] += call['completion_tokens']
+        entry['cost'] += call['cost']
+
+    totals = {
+        'wall_time': sum(node_times.values()),
+        'calls': len(calls),
+        'prompt_tokens': sum(call['prompt_tokens'] for call in calls),
+        # prompt tokens served from the provider's prompt cache
+        'cached_tokens': sum(call['cached_tokens'] for call in calls),
+        'completion_tokens': sum(call['completion_tokens'] for call in calls),
+        'cost': sum(call['cost'] for call in calls),
+    }
+    return {'calls': calls, 'node_times': node_times, 'nodes': nodes, 'totals': totals}
+
+
+def merge_metadata(left, right) -> dict:
+    """State reducer: combine the metadata written by the nodes of one run."""
+    left = left or {}
+    right = right or {}
+    calls = left.get('calls', []) + right.get('calls', [])
+    node_times = {**left.get('node_times', {}), **right.get('node_times', {})}
+    merged = summarize_metadata(calls, node_times)
+    # conversation memory usage of the run (written by the memory node)
+    memory = right.get('memory') or left.get('memory')
+    if memory:
+        merged['memory'] = memory
+    return merged
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+class metric_family:
+    """A Prometheus counter or histogram with labelled children."""
+
+    def __init__(self, name: str, help_text: str, kind: str, buckets=None):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.buckets = tuple(buckets or ())
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            labels = dict(key)
+            if self.kind == 'counter':
+                lines.append(f'{self.name}{format_labels(labels)} {value}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{format_labels({**labels, "le": bound})} {cumulative}')
+            lines.append(f'{self.name}_bucket{format_labels({**labels, "le": "+Inf"})} {count}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {count}')
+        return lines
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+llm_calls = metric_family('intellicode_llm_calls_total', 'LLM calls made by the workflow nodes.', 'counter')
+llm_tokens = metric_family('intellicode_llm_tokens_total', 'Tokens sent and received by the workflow nodes.', 'counter')
+llm_cost = metric_family('intellicode_llm_cost_usd_total', 'Estimated LLM spend of the workflow nodes in USD.', 'counter')
+llm_call_duration = metric_family('intellicode_llm_call_duration_seconds', 'Wall time of single LLM calls.', 'histogram', LATENCY_BUCKETS)
+node_duration = metric_family('intellicode_node_duration_seconds', 'Wall time of the workflow nodes.', 'histogram', LATENCY_BUCKETS)
+
+families = [llm_calls, llm_tokens, llm_cost, llm_call_duration, node_duration]
+
+# name -> (help, type, collect) for values read at render time from other components (cache and speculation stats)
+collectors = {}
+
+
+def register_collector(name: str, help_text: str, kind: str, collect):
+    """Expose values owned elsewhere; `collect()` returns {label value: number} for the label 'kind'."""
+    collectors[name] = (help_text, kind, collect)
+
+
+def observe_call(record: dict):
+    """Feed one call record into the process-wide metrics."""
+    labels = {'node': record['node'], 'model': record['model']}
+    llm_calls.inc(cached=str(record['cached_response']).lower(), **labels)
+    llm_tokens.inc(record['prompt_tokens'], kind='prompt', **labels)
+    llm_tokens.inc(record['cached_tokens'], kind='cached_prompt', **labels)
+    llm_tokens.inc(record['completion_tokens'], kind='completion', **labels)
+    llm_cost.inc(record['cost'], **labels)
+    if not record['cached_response']:
+        llm_call_duration.observe(record['wall_time'], **labels)
+
+
+def observe_node(node: str, wall_time: float):
+    node_duration.observe(wall_time, node=node)
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for family in families:
+        lines += family.render()
+    for name, (help_text, kind, collect) in sorted(collectors.items()):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for kind, value in sorted(collect().items()):
+            lines.append(f'{name}{format_labels({"kind": kind})} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,137 @@
+"""
+Per-node model registry of the workflow.
+
+Maps every node (by the name its LLM calls are made under) to an
+OpenAI-compatible endpoint, a model and generation parameters, so the
+classifier, summary and collator calls can run on small, fast models, on
+OpenRouter or on a local server such as llama.cpp or Ollama, while the
+code-generating nodes keep the large model. Each endpoint gets one pooled
+sync and one async client (see llm_transport.py), shared by all the nodes
+routed to it.
+"""
+
+import asyncio
+import json
+import os
+import threading
+
+from llm_transport import build_http_client, build_async_http_client, build_client, build_async_client, prewarm, aprewarm
+
+import workflow_config as config
+
+
+class model_endpoint:
+    """An OpenAI-compatible server and its clients, built on first use."""
+
+    def __init__(self, name: str, base_url: str, api_key: str):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.sync_client = None
+        self.async_client = None
+        # the pooled transports under the clients, kept for pre-warming them
+        self.http_client = None
+        self.async_http_client = None
+        self.lock = threading.Lock()
+
+    def client(self):
+        with self.lock:
+            if self.sync_client is None:
+                self.http_client = build_http_client()
+                self.sync_client = build_client(self.base_url, self.api_key, self.http_client)
+            return self.sync_client
+
+    def aclient(self):
+        with self.lock:
+            if self.async_client is None:
+                self.async_http_client = build_async_http_client()
+                self.async_client = build_async_client(self.base_url, self.api_key, self.async_http_client)
+            return self.async_client
+
+    def prewarm(self):
+        self.client()
+        # a client set from outside (a test double) has no transport of ours to warm
+        if self.http_client is not None:
+            prewarm(self.base_url, self.http_client)
+
+    async def aprewarm(self):
+        self.aclient()
+        if self.async_http_client is not None:
+            await aprewarm(self.base_url, self.async_http_client)
+
+
+class model_registry:
+    """Routes of the nodes: {'endpoint', 'model', 'params'}, with a default route for unlisted nodes."""
+
+    def __init__(self, endpoints: dict, default: dict, routes: dict = None):
+        self.endpoints = endpoints
+        self.default = default
+        self.routes = routes or {}
+        for name, route in [('default', default)] + list(self.routes.items()):
+            if route['endpoint'] not in endpoints:
+                raise ValueError(f"model route of {name} uses the unknown endpoint {route['endpoint']!r}")
+
+    def route(self, node: str) -> dict:
+        return self.routes.get(node, self.default)
+
+    def client(self, route: dict):
+        return self.endpoints[route['endpoint']].client()
+
+    def aclient(self, route: dict):
+        return self.endpoints[route['endpoint']].aclient()
+
+    def used_endpoints(self) -> list:
+        names = {self.default['endpoint']} | {route['endpoint'] for route in self.routes.values()}
+        return [self.endpoints[name] for name in sorted(names)]
+
+    def prewarm(self):
+        """Open a connection to every endpoint in use before the first request."""
+        for endpoint in self.used_endpoints():
+            endpoint.prewarm()
+
+    async def aprewarm(self):
+        """Open a connection of every async client in use, on the running event loop."""
+        await asyncio.gather(*(endpoint.aprewarm() for endpoint in self.used_endpoints()))
+
+
+# endpoint of the models given without '@endpoint'; it uses the open_router_api key
+DEFAULT_ENDPOINT = 'openrouter'
+
+
+def parse_model(value: str) -> tuple:
+    """'model@endpoint' (or just 'model', on OpenRouter) as (endpoint, model)."""
+    model, separator, endpoint = value.strip().rpartition('@')
+    if not separator:
+        return DEFAULT_ENDPOINT, value.strip()
+    return endpoint.strip(), model.strip()
+
+
+def endpoint_api_key(name: str, open_router_api: str) -> str:
+    """API key of an endpoint: open_router_api for OpenRouter, else <name>_api_key (local servers accept any key)."""
+    if name == DEFAULT_ENDPOINT:
+        return open_router_api
+    return os.getenv(f'{name}_api_key') or 'not-needed'
+
+
+def model_key(route: dict) -> str:
+    """Identity of a route for the response cache: the model on its endpoint (model@endpoint) plus any generation parameters."""
+    model = f"{route['model']}@{route['endpoint']}"
+    if not route['params']:
+        return model
+    return f"{model}:{json.dumps(route['params'], sort_keys=True)}"
+
+
+def registry_from_config(open_router_api: str) -> model_registry:
+    """Build the registry from workflow_config: the endpoints, the default model and the per-node overrides."""
+    endpoints = {
+        name: model_endpoint(name, base_url, endpoint_api_key(name, open_router_api))
+        for name, base_url in config.model_endpoints.items()
+    }
+    endpoint, model = parse_model(config.default_model)
+    default = {'endpoint': endpoint, 'model': model, 'params': {}}
+
+    routes = {}
+    for node in set(config.node_models) | set(config.node_params):
+        endpoint, model = parse_model(config.node_models[node]) if node in config.node_models else (default['endpoint'], default['model'])
+        routes[node] = {'endpoint': endpoint, 'model': model, 'params': config.node_params.get(node, {})}
+    return model_registry(endpoints, default, routes)
@@ -0,0 +1,113 @@
+"""
+Applying the edits of the patch output mode of debug_code.
+
+Instead of regenerating the whole input code, the model answers with
+search/replace blocks:
+
+    <<<<<<< SEARCH
+    lines copied from the input code
+    =======
+    corrected lines
+    >>>>>>> REPLACE
+
+(a unified diff is accepted as well) and `apply_patch` rebuilds the corrected
+code locally. A hunk which does not match the source exactly once raises
+`patch_error`, so the caller can fall back to a full regeneration.
+"""
+
+import re
+
+from code_utils import strip_code_fences
+
+
+NO_CHANGES = 'NO CHANGES'
+
+SEARCH_BLOCK = re.compile(r'^<{5,9} ?SEARCH[^\n]*\n(.*?)^={5,9}[^\n]*\n(.*?)^>{5,9} ?REPLACE[^\n]*$', re.MULTILINE | re.DOTALL)
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@')
+
+
+class patch_error(ValueError):
+    """A patch which cannot be applied to the source."""
+
+
+def block_lines(text: str) -> list:
+    """Lines of one side of a search/replace block (the block ends with the newline before the marker)."""
+    return text.split('\n')[:-1] if text else []
+
+
+def find_lines(lines: list, target: list, hint: int = None) -> int:
+    """Index where target occurs in lines, exactly or ignoring trailing whitespace.
+
+    Without a hint the match has to be unique; with a hint (the line number of a diff hunk) the
+    closest match wins.
+    """
+    if not target:
+        raise patch_error('empty search text')
+    for normalize in (lambda line: line, str.rstrip):
+        wanted = [normalize(line) for line in target]
+        matches = [index for index in range(len(lines) - len(target) + 1)
+                   if [normalize(line) for line in lines[index:index + len(target)]] == wanted]
+        if len(matches) == 1 or (matches and hint is not None):
+            return min(matches, key=lambda index: abs(index - hint)) if hint is not None else matches[0]
+        if len(matches) > 1:
+            raise patch_error(f'search text matches {len(matches)} places: {target[0].strip()!r}')
+    raise patch_error(f'search text not found: {target[0].strip()!r}')
+
+
+def apply_search_replace(lines: list, blocks: list) -> list:
+    for search, replace in blocks:
+        target = block_lines(search)
+        start = find_lines(lines, target)
+        lines = lines[:start] + block_lines(replace) + lines[start + len(target):]
+    return lines
+
+
+def parse_unified_diff(patch: str) -> list:
+    """Hunks of a unified diff as (old start index, old lines, new lines)."""
+    hunks = []
+    for line in patch.split('\n'):
+        header = HUNK_HEADER.match(line)
+        if header:
+            hunks.append((int(header.group(1)) - 1, [], []))
+        elif hunks and not line.startswith(('---', '+++', '\\')):
+            tag, text = line[:1], line[1:]
+            if tag in (' ', '-'):
+                hunks[-1][1].append(text)
+            if tag in (' ', '+'):
+                hunks[-1][2].append(text)
+            if line == '':
+                hunks[-1][1].append('')
+                hunks[-1][2].append('')
+    return hunks
+
+
+def apply_unified_diff(lines: list, hunks: list) -> list:
+    offset = 0
+    for start, old, new in hunks:
+        # trailing blank context from the split of the patch text is not part of the hunk
+        while old and new and old[-1] == '' and new[-1] == '':
+            old, new = old[:-1], new[:-1]
+        if not old:
+            # a pure insertion (@@ -N,0 ...) goes after old line N, which start already counts from 0
+            index = min(max(start + 1 + offset, 0), len(lines))
+        else:
+            index = find_lines(lines, old, hint=start + offset)
+        lines = lines[:index] + new + lines[index + len(old):]
+        offset += len(new) - len(old)
+    return lines
+
+
+def apply_patch(source: str, patch: str) -> str:
+    """Apply search/replace blocks or a unified diff to the source; raises patch_error when it does not apply."""
+    text = strip_code_fences(patch or '')
+    if text.strip() == NO_CHANGES:
+        return source
+
+    lines = source.split('\n')
+    blocks = SEARCH_BLOCK.findall(text)
+    if blocks:
+        return '\n'.join(apply_search_replace(lines, blocks))
+    hunks = parse_unified_diff(text)
+    if hunks:
+        return '\n'.join(apply_unified_diff(lines, hunks))
+    raise patch_error('no search/replace blocks or diff hunks in the answer')
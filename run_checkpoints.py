@@ -0,0 +1,223 @@
+"""
+Durable checkpoints of workflow runs, so a failed run resumes where it stopped.
+
+`sqlite_checkpointer` is a LangGraph checkpoint saver on a local SQLite file.
+A graph compiled with it (`durable_workflow`) saves its state after every
+node, keyed by the run id passed as the thread id of the run config. When a
+node fails, say collator timing out after debug_code and debug_summary
+succeeded, the run is resumed with `workflow.stream(None, run_config(run_id))`
+and continues at the failed node, without paying for the classifier and the
+workers again.
+
+Checkpoints only matter until their run has finished: the caller deletes the
+run once it succeeded, and runs which are never resumed are removed after
+`ttl_seconds`, and beyond `max_runs` from the oldest, when checkpoints are
+written.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+
+def run_config(run_id: str) -> dict:
+    """Config of a checkpointed run (new or resumed)."""
+    return {'configurable': {'thread_id': run_id}}
+
+
+class sqlite_checkpointer(BaseCheckpointSaver):
+    """Thread-safe checkpoint saver on one SQLite file, with expiry of old runs."""
+
+    def __init__(self, path, ttl_seconds: float = 24 * 3600, max_runs: int = 1000):
+        super().__init__()
+        self.ttl_seconds = ttl_seconds
+        self.max_runs = max_runs
+        self.lock = threading.Lock()
+        self.stats = {'checkpoints': 0, 'deleted_runs': 0, 'expired_runs': 0}
+        self.writes_since_prune = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS checkpoints ('
+            'thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, parent_id TEXT, '
+            'checkpoint_type TEXT NOT NULL, checkpoint BLOB NOT NULL, metadata_type TEXT NOT NULL, metadata BLOB NOT NULL, '
+            'created REAL NOT NULL, PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS writes ('
+            'thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, task_id TEXT NOT NULL, '
+            'idx INTEGER NOT NULL, channel TEXT NOT NULL, value_type TEXT NOT NULL, value BLOB NOT NULL, task_path TEXT NOT NULL, '
+            'PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))'
+        )
+        self.db.commit()
+        with self.lock:
+            self.prune()
+
+    def tuple_of(self, thread_id: str, checkpoint_ns: str, row) -> CheckpointTuple:
+        """Checkpoint tuple of a checkpoints row (checkpoint_id, parent_id, checkpoint, metadata) with its pending writes."""
+        checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        writes = self.db.execute(
+            'SELECT task_id, channel, value_type, value FROM writes '
+            'WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx',
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={'configurable': {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': checkpoint_id}},
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((value_type, value))) for task_id, channel, value_type, value in writes],
+            parent_config=(
+                {'configurable': {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': parent_id}}
+                if parent_id else None
+            ),
+        )
+
+    def get_tuple(self, config):
+        """The checkpoint named by the config, else the latest one of its run."""
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        columns = 'checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata'
+        with self.lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.db.execute(
+                    f'SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?',
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.db.execute(
+                    f'SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1',
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            checkpoint_tuple = self.tuple_of(thread_id, checkpoint_ns, row)
+        return checkpoint_tuple._replace(config=config) if checkpoint_id else checkpoint_tuple
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        """Checkpoints, newest first, of one run (or of all runs without a config)."""
+        query = 'SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata FROM checkpoints'
+        conditions, parameters = [], []
+        if config:
+            conditions.append('thread_id = ?')
+            parameters.append(config['configurable']['thread_id'])
+            if config['configurable'].get('checkpoint_ns') is not None:
+                conditions.append('checkpoint_ns = ?')
+                parameters.append(config['configurable']['checkpoint_ns'])
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append('checkpoint_id = ?')
+                parameters.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            conditions.append('checkpoint_id < ?')
+            parameters.append(before_id)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY checkpoint_id DESC'
+        with self.lock:
+            rows = self.db.execute(query, parameters).fetchall()
+            found = []
+            for thread_id, checkpoint_ns, *row in rows:
+                checkpoint_tuple = self.tuple_of(thread_id, checkpoint_ns, row)
+                if filter and not all(checkpoint_tuple.metadata.get(key) == value for key, value in filter.items()):
+                    continue
+                found.append(checkpoint_tuple)
+                if limit is not None and len(found) >= limit:
+                    break
+        yield from found
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        checkpoint_type, checkpoint_data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (thread_id, checkpoint_ns, checkpoint['id'], config['configurable'].get('checkpoint_id'),
+                 checkpoint_type, checkpoint_data, metadata_type, metadata_data, time.time()),
+            )
+            self.db.commit()
+            self.stats['checkpoints'] += 1
+            self.writes_since_prune += 1
+            if self.writes_since_prune >= 100:
+                self.prune()
+        return {'configurable': {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': checkpoint['id']}}
+
+    def put_writes(self, config, writes, task_id: str, task_path: str = ''):
+        """Save the writes of a finished node, so a resumed run does not run it again."""
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        checkpoint_id = config['configurable']['checkpoint_id']
+        rows = []
+        for index, (channel, value) in enumerate(writes):
+            value_type, value_data = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, index), channel, value_type, value_data, task_path))
+        with self.lock:
+            # special writes (errors, interrupts) are replaced, regular ones are kept once written
+            self.db.executemany(
+                'INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [row for row in rows if row[4] < 0],
+            )
+            self.db.executemany(
+                'INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [row for row in rows if row[4] >= 0],
+            )
+            self.db.commit()
+
+    def delete_thread(self, thread_id: str):
+        """Drop the checkpoints of a run, once it finished."""
+        with self.lock:
+            deleted = self.db.execute('DELETE FROM checkpoints WHERE thread_id = ?', (thread_id,)).rowcount
+            self.db.execute('DELETE FROM writes WHERE thread_id = ?', (thread_id,))
+            self.db.commit()
+            self.stats['deleted_runs'] += deleted > 0
+
+    def prune(self):
+        """Drop the runs without a checkpoint in ttl_seconds, and the oldest ones beyond max_runs (lock held)."""
+        self.writes_since_prune = 0
+        expired = [
+            thread_id for (thread_id,) in self.db.execute(
+                'SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created) <= ? '
+                'UNION SELECT thread_id FROM (SELECT thread_id, MAX(created) AS latest FROM checkpoints GROUP BY thread_id '
+                'ORDER BY latest DESC LIMIT -1 OFFSET ?)',
+                (time.time() - self.ttl_seconds, self.max_runs),
+            )
+        ]
+        for thread_id in expired:
+            self.db.execute('DELETE FROM checkpoints WHERE thread_id = ?', (thread_id,))
+            self.db.execute('DELETE FROM writes WHERE thread_id = ?', (thread_id,))
+        self.db.commit()
+        self.stats['expired_runs'] += len(expired)
+
+    def has_run(self, run_id: str) -> bool:
+        """Whether a run has a checkpoint to resume from."""
+        with self.lock:
+            return self.db.execute('SELECT 1 FROM checkpoints WHERE thread_id = ? LIMIT 1', (run_id,)).fetchone() is not None
+
+    # the async graph methods use the same store; the SQLite calls are short and local
+
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for checkpoint_tuple in self.list(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id: str, task_path: str = ''):
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str):
+        return self.delete_thread(thread_id)
@@ -0,0 +1,178 @@
+"""
+Semantic near-duplicate cache of workflow answers.
+
+The exact response cache (llm_cache.py) only helps when the rendered prompt is
+byte-identical. This cache sits after the classifier, in front of the worker
+nodes: it embeds the prompt and the input code locally as hashed character
+n-gram vectors (NumPy, no model) and answers a request with the stored
+final_answer / modified_code of an earlier one when, for the same task type,
+both are close enough:
+
+- the prompts: the words that say *what* to do beyond the task itself
+  ("explain this" and "what does this code do" both reduce to nothing and
+  match, "explain the retry loop" does not match "explain the parser"),
+- the code: near-identical buffers; answers which carry modified code are
+  only reused for the identical code, so a hit never reverts an edit.
+
+The index is bounded (least recently used entries are evicted). Every hit is
+appended to an audit log, and a sample of would-be hits is recomputed instead
+of served and compared with the stored answer, so false hits show up in the
+log and the thresholds can be tuned.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+import numpy as np
+
+
+PROMPT_DIMENSIONS = 512
+CODE_DIMENSIONS = 2048
+
+# words which only name the task or fill the sentence; what remains of a prompt is what distinguishes it
+GENERIC_WORDS = frozenset('''
+a an the this that these those it its my our your me us you i we please can could would will should kindly
+what whats how why does do did is are was be to of in on for with and or about from into by at as
+tell show give help explain explanation describe description walk through understand understanding mean means meaning
+code snippet program script function file here above below following given work works working doing happen happens
+fix fixes debug bug bugs error errors issue issues problem problems correct wrong broken find solve resolve
+document documentation docs docstring docstrings comment comments write generate create add make readme
+'''.split())
+
+WORD = re.compile(r'[a-z0-9_]+')
+
+
+def hashed_ngrams(text: str, dimensions: int, sizes=(3, 4, 5)) -> np.ndarray:
+    """Unit vector of the signed hashed character n-gram counts of a text (rolling hashes, vectorized)."""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8).astype(np.uint64)
+    for size in sizes:
+        count = len(data) - size + 1
+        if count <= 0:
+            continue
+        hashes = np.zeros(count, dtype=np.uint64)
+        for offset in range(size):
+            hashes = hashes * np.uint64(1000003) + data[offset:offset + count]
+        signs = np.where((hashes >> np.uint64(40)) & np.uint64(1), 1.0, -1.0)
+        vector += np.bincount((hashes % np.uint64(dimensions)).astype(np.int64), weights=signs, minlength=dimensions).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def prompt_terms(prompt: str) -> str:
+    """The distinguishing words of a prompt, without the task and filler words."""
+    return ' '.join(word for word in WORD.findall(prompt.lower()) if word not in GENERIC_WORDS)
+
+
+def normalize_code(code) -> str:
+    """Code with its whitespace collapsed, so formatting alone does not change it."""
+    return ' '.join(str(code or '').split())
+
+
+def code_digest(code) -> str:
+    return hashlib.sha256(normalize_code(code).encode('utf-8')).hexdigest()
+
+
+def answer_similarity(left: str, right: str) -> float:
+    """Similarity of two answers, for auditing a hit against a recomputed answer."""
+    return float(hashed_ngrams(' '.join((left or '').lower().split()), PROMPT_DIMENSIONS) @ hashed_ngrams(' '.join((right or '').lower().split()), PROMPT_DIMENSIONS))
+
+
+class semantic_cache:
+    """Bounded in-memory nearest-neighbour index of answers, keyed by task type, prompt terms and code."""
+
+    def __init__(self, max_entries: int = 2000, prompt_threshold: float = 0.85, code_threshold: float = 0.97, audit_log: str = None):
+        self.max_entries = max_entries
+        self.prompt_threshold = prompt_threshold
+        self.code_threshold = code_threshold
+        self.audit_log = audit_log
+        self.prompt_vectors = np.zeros((max_entries, PROMPT_DIMENSIONS), dtype=np.float32)
+        self.code_vectors = np.zeros((max_entries, CODE_DIMENSIONS), dtype=np.float32)
+        self.tasks = np.full(max_entries, '', dtype=object)
+        self.last_used = np.full(max_entries, -np.inf)
+        self.entries = [None] * max_entries
+        self.size = 0
+        self.lock = threading.Lock()
+        self.audit_lock = threading.Lock()
+        # hits are the matches served; audit_samples the matches run as misses to be audited
+        self.stats = {'hits': 0, 'misses': 0, 'audit_samples': 0, 'stores': 0, 'evictions': 0, 'audits': 0, 'false_hits': 0}
+
+    def vectors(self, prompt: str, code) -> tuple:
+        terms = prompt_terms(prompt)
+        return terms, hashed_ngrams(terms, PROMPT_DIMENSIONS), hashed_ngrams(normalize_code(code), CODE_DIMENSIONS)
+
+    def lookup(self, task: str, prompt: str, code, audit_rate: float = 0.0):
+        """The closest stored answer for the same task above both thresholds, as a match dict, or None.
+
+        A share audit_rate of the matches is sampled for an audit instead of served: the match comes
+        back with audit=True and counts as an audit sample, not as a hit.
+        """
+        terms, prompt_vector, code_vector = self.vectors(prompt, code)
+        digest = code_digest(code)
+        with self.lock:
+            candidates = np.flatnonzero(self.tasks[:self.size] == task)
+            best = None
+            if len(candidates):
+                code_similarity = self.code_vectors[candidates] @ code_vector
+                prompt_similarity = self.prompt_vectors[candidates] @ prompt_vector
+                for position in np.argsort(-prompt_similarity):
+                    index = candidates[position]
+                    entry = self.entries[index]
+                    # prompts reduced to the task alone only match each other
+                    similarity = 1.0 if not terms and not entry['terms'] else float(prompt_similarity[position])
+                    if similarity < self.prompt_threshold:
+                        continue
+                    same_code = entry['code_digest'] == digest
+                    if not same_code and (entry['value'].get('modified_code') is not None or code_similarity[position] < self.code_threshold):
+                        continue
+                    similarity_code = 1.0 if same_code else float(code_similarity[position])
+                    if best is None or (similarity, similarity_code) > (best['prompt_similarity'], best['code_similarity']):
+                        best = {'index': int(index), 'prompt': entry['prompt'], 'value': entry['value'],
+                                'prompt_similarity': similarity, 'code_similarity': similarity_code}
+            if best is None:
+                self.stats['misses'] += 1
+                return None
+            self.last_used[best['index']] = time.monotonic()
+            best['audit'] = random.random() < audit_rate
+            self.stats['audit_samples' if best['audit'] else 'hits'] += 1
+            return best
+
+    def store(self, task: str, prompt: str, code, value: dict):
+        """Add an answer, evicting the least recently used entry when the index is full."""
+        terms, prompt_vector, code_vector = self.vectors(prompt, code)
+        with self.lock:
+            if self.size < self.max_entries:
+                index = self.size
+                self.size += 1
+            else:
+                index = int(np.argmin(self.last_used))
+                self.stats['evictions'] += 1
+            self.prompt_vectors[index] = prompt_vector
+            self.code_vectors[index] = code_vector
+            self.tasks[index] = task
+            self.last_used[index] = time.monotonic()
+            self.entries[index] = {'prompt': prompt, 'terms': terms, 'code_digest': code_digest(code), 'value': value}
+            self.stats['stores'] += 1
+
+    def audit(self, record: dict):
+        """Append a hit or an audited hit to the audit log (JSONL), when one is configured."""
+        if record.get('verdict') is not None:
+            with self.lock:
+                self.stats['audits'] += 1
+                self.stats['false_hits'] += record['verdict'] == 'false_hit'
+        if not self.audit_log:
+            return
+        with self.audit_lock:
+            with open(self.audit_log, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'time': time.time(), **record}, ensure_ascii=False) + '\n')
+
+    def clear(self):
+        with self.lock:
+            self.size = 0
+            self.tasks[:] = ''
+            self.last_used[:] = -np.inf
+            self.entries = [None] * self.max_entries
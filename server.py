@@ -0,0 +1,391 @@
+"""
+HTTP serving API of the IntelliCode-SL workflow.
+
+A plain ASGI application, so the workflow can be served, scaled and
+load-tested apart from the Streamlit app:
+
+- POST /v1/run     one request, answered with the final state of its run as JSON
+- POST /v1/stream  one request as Server-Sent Events: a `node` event per finished node, `token` events with the
+                   streamed answer, then `result` (the final state) or `error`
+- POST /v1/batch   {records: [{id, prompt, input_code}, ...], use_cache}, answered with one result per record, in
+                   order, as written by batch_runner.py; the records run at batch priority
+- GET  /health     liveness of the worker, its LLM call queues and the shared executions in flight
+- GET  /metrics    Prometheus metrics of the worker process
+
+A request is {prompt, input_code, messeges, use_cache, priority}, where messeges is the conversation of the
+previous response (or chat {role, content} messages). A client which disconnects cancels its run. Each worker
+process has its own workflow, caches and LLM call scheduler:
+
+    python server.py --workers 4 --port 8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from langchain_core.messages import convert_to_messages, messages_from_dict, messages_to_dict
+
+import workflow_config as config
+
+
+# graph served by this worker process, loaded at startup (see load_workflow)
+served = None
+
+# modes of the /v1/stream runs: finished nodes, streamed tokens and the final state
+STREAM_MODES = ['updates', 'custom', 'values']
+
+
+class request_error(ValueError):
+    """A request refused by the server, with its HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class client_disconnected(Exception):
+    """Raised when the client went away before its response was ready."""
+
+
+def load_workflow():
+    """Import and compile the workflow variant of server_workflow (seconds, run off the event loop)."""
+    global served
+    if served is None:
+        import workflow
+        variants = {'default': workflow.workflow, 'fused': workflow.fused_workflow, 'speculative': workflow.speculative_workflow}
+        if config.server_workflow not in variants:
+            raise ValueError(f'unknown server_workflow {config.server_workflow!r}, expected one of {sorted(variants)}')
+        served = variants[config.server_workflow]
+    return served
+
+
+async def workflow_ready():
+    return served if served is not None else await asyncio.to_thread(load_workflow)
+
+
+def load_messages(items) -> list:
+    """Conversation of a request: messages as returned in a response (messages_to_dict), or chat {role, content} messages."""
+    if not isinstance(items, list):
+        raise request_error(400, 'messeges must be a list')
+    try:
+        return [
+            messages_from_dict([item])[0] if isinstance(item, dict) and 'type' in item and 'data' in item else convert_to_messages([item])[0]
+            for item in items
+        ]
+    except (KeyError, TypeError, ValueError, NotImplementedError) as error:
+        raise request_error(400, f'invalid messeges: {error}')
+
+
+def invalid_fields(record) -> str:
+    """Why a request (or a batch record) is malformed, or None when its fields have the right types."""
+    if not isinstance(record, dict):
+        return 'not a JSON object'
+    if not isinstance(record.get('prompt'), str) or not record['prompt'].strip():
+        return 'missing prompt'
+    if record.get('input_code') is not None and not isinstance(record['input_code'], str):
+        return 'input_code must be a string or null'
+    if record.get('use_cache') is not None and not isinstance(record['use_cache'], bool):
+        return 'use_cache must be true or false'
+    return None
+
+
+def initial_state(body) -> dict:
+    """Initial workflow state of a /v1/run or /v1/stream request."""
+    from llm_scheduler import PRIORITIES
+
+    if problem := invalid_fields(body):
+        raise request_error(400, problem)
+    priority = body.get('priority') or 'interactive'
+    if not isinstance(priority, str) or priority not in PRIORITIES:
+        raise request_error(400, f'unknown priority {priority!r}, expected one of {sorted(PRIORITIES)}')
+    return {
+        'prompt': body['prompt'],
+        'input_code': body.get('input_code') or None,
+        'messeges': load_messages(body.get('messeges') or []),
+        'use_cache': body.get('use_cache') is not False,
+        'priority': priority,
+    }
+
+
+def public_state(state: dict) -> dict:
+    """Final state of a run as JSON: its outputs, the conversation to send with the next request and the metadata."""
+    return {
+        name: messages_to_dict(value) if name == 'messeges' else value
+        for name, value in state.items() if name not in ('prompt', 'input_code')
+    }
+
+
+def error_body(error: Exception) -> dict:
+    """JSON error of a failed request, with its HTTP status: 400s for bad requests, 503 when the LLM calls are shed."""
+    from llm_scheduler import llm_overloaded
+
+    if isinstance(error, request_error):
+        return {'status': error.status, 'error': str(error)}
+    if isinstance(error, llm_overloaded):
+        return {'status': 503, 'error': str(error)}
+    return {'status': 500, 'error': f'{type(error).__name__}: {error}'}
+
+
+def encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def sse(event: str, data) -> bytes:
+    """One Server-Sent Event; the JSON data has no raw newlines, so it fits one data line."""
+    return b'event: ' + event.encode('ascii') + b'\ndata: ' + encode(data) + b'\n\n'
+
+
+async def send_json(send, status: int, payload, headers: list = ()):
+    body = encode(payload)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())] + list(headers),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_error(send, error: Exception):
+    body = error_body(error)
+    # shed calls are worth retrying shortly, once the queues drained
+    await send_json(send, body['status'], {'error': body['error']}, [(b'retry-after', b'1')] if body['status'] == 503 else [])
+
+
+async def read_body(receive):
+    """The JSON body of the request, within server_max_body_bytes."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise client_disconnected()
+        chunks.append(message.get('body', b''))
+        size += len(chunks[-1])
+        if size > config.server_max_body_bytes:
+            raise request_error(413, f'request body larger than {config.server_max_body_bytes} bytes')
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(b''.join(chunks) or b'null')
+    except ValueError as error:
+        raise request_error(400, f'invalid JSON: {error}')
+
+
+async def until_disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def unless_disconnected(receive, awaitable):
+    """Result of the awaitable, which is cancelled (client_disconnected raised) if the client goes away first."""
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(until_disconnected(receive))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if not work.done():
+        work.cancel()
+        raise client_disconnected()
+    return work.result()
+
+
+async def handle_run(body, receive, send):
+    state = initial_state(body)
+    graph = await workflow_ready()
+    final_state = await unless_disconnected(receive, graph.ainvoke(state))
+    await send_json(send, 200, public_state(final_state))
+
+
+async def handle_stream(body, receive, send):
+    state = initial_state(body)
+    graph = await workflow_ready()
+    events = asyncio.Queue()
+
+    async def pump():
+        """Queue the run's progress as (event, data), ending with its result or error."""
+        final_state = None
+        try:
+            async for mode, chunk in graph.astream(state, stream_mode=STREAM_MODES):
+                if mode == 'updates':
+                    for node in chunk:
+                        events.put_nowait(('node', {'node': node}))
+                elif mode == 'custom':
+                    events.put_nowait(('token', chunk))
+                else:
+                    final_state = chunk
+            events.put_nowait(('result', public_state(final_state)))
+        except Exception as error:
+            events.put_nowait(('error', error_body(error)))
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')],
+    })
+    work = asyncio.ensure_future(pump())
+    watcher = asyncio.ensure_future(until_disconnected(receive))
+    try:
+        while True:
+            getter = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({getter, watcher}, timeout=config.server_keepalive_seconds, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                if watcher in done:
+                    return
+                await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+                continue
+            event, data = getter.result()
+            await send({'type': 'http.response.body', 'body': sse(event, data), 'more_body': True})
+            if event in ('result', 'error'):
+                break
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        watcher.cancel()
+        work.cancel()
+
+
+async def handle_batch(body, receive, send):
+    from batch_runner import run_record
+
+    records = body.get('records') if isinstance(body, dict) else None
+    if not isinstance(records, list):
+        raise request_error(400, 'records must be a list')
+    if len(records) > config.server_batch_max_records:
+        raise request_error(413, f'more than {config.server_batch_max_records} records; split the batch')
+    if body.get('use_cache') is not None and not isinstance(body['use_cache'], bool):
+        raise request_error(400, 'use_cache must be true or false')
+    graph = await workflow_ready()
+    use_cache = body.get('use_cache') is not False
+    running = asyncio.Semaphore(config.server_batch_concurrency)
+
+    async def process(index, record):
+        # malformed records get an error result, as in batch_runner.py, and the others still run
+        if problem := invalid_fields(record):
+            return {'id': record.get('id', index) if isinstance(record, dict) else index, 'error': problem}
+        async with running:
+            return await run_record(graph, index, record, use_cache)
+
+    results = await unless_disconnected(receive, asyncio.gather(*(process(index, record) for index, record in enumerate(records))))
+    await send_json(send, 200, {'results': results})
+
+
+async def handle_health(send):
+    """200 with the worker's LLM call queues and shared executions once its workflow is loaded, 503 while it starts."""
+    if served is None:
+        return await send_json(send, 503, {'status': 'starting', 'pid': os.getpid()})
+
+    import workflow
+    from single_flight import in_flight
+
+    await send_json(send, 200, {
+        'status': 'ok',
+        'pid': os.getpid(),
+        'workflow': config.server_workflow,
+        'llm_queue': workflow.scheduler.snapshot(),
+        **in_flight(),
+    })
+
+
+async def handle_metrics(send):
+    from metrics import render_prometheus
+
+    body = render_prometheus().encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/plain; version=0.0.4'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class tracked_send:
+    """The ASGI send of one request, knowing whether its response started and ended."""
+
+    def __init__(self, send):
+        self.send = send
+        self.started = False
+        self.ended = False
+
+    async def __call__(self, message: dict):
+        if message['type'] == 'http.response.start':
+            self.started = True
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            self.ended = True
+        await self.send(message)
+
+
+# (method, path) -> handler of a JSON request body
+POST_ROUTES = {'/v1/run': handle_run, '/v1/stream': handle_stream, '/v1/batch': handle_batch}
+GET_ROUTES = {'/health': handle_health, '/metrics': handle_metrics}
+
+
+async def lifespan(receive, send):
+    """Load the workflow and pre-warm its async connections before the worker accepts requests, so the first ones do not wait for them."""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await asyncio.to_thread(load_workflow)
+                import workflow
+                await workflow.aprewarm_transport()
+            except Exception as error:
+                await send({'type': 'lifespan.startup.failed', 'message': f'{type(error).__name__}: {error}'})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    path, method = scope['path'].rstrip('/') or '/', scope['method']
+    send = tracked_send(send)
+    try:
+        if path in GET_ROUTES:
+            if method != 'GET':
+                raise request_error(405, f'{path} only takes GET')
+            return await GET_ROUTES[path](send)
+        if path not in POST_ROUTES:
+            raise request_error(404, f'no endpoint {path}')
+        if method != 'POST':
+            raise request_error(405, f'{path} only takes POST')
+        await POST_ROUTES[path](await read_body(receive), receive, send)
+    except client_disconnected:
+        pass
+    except Exception as error:
+        if not send.started:
+            return await send_error(send, error)
+        # the status line is out (an event stream, a response being written): log the error and end the response
+        print(f'{method} {path} failed after its response started: {type(error).__name__}: {error}', file=sys.stderr)
+        if not send.ended:
+            try:
+                await send({'type': 'http.response.body', 'body': b''})
+            except Exception:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the IntelliCode-SL workflow over HTTP.')
+    parser.add_argument('--host', default=config.server_host)
+    parser.add_argument('--port', type=int, default=config.server_port)
+    parser.add_argument('--workers', type=int, default=config.server_workers, help='worker processes')
+    args = parser.parse_args()
+
+    import uvicorn
+    # the app is passed by name, so every worker process imports it (and its own workflow)
+    uvicorn.run('server:app', host=args.host, port=args.port, workers=args.workers, timeout_graceful_shutdown=30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Single-flight coalescing of identical concurrent workflow runs.
+
+When several sessions send the same prompt and code at once (a demo, a
+classroom), each would run the whole chain of LLM calls. `coalesced_workflow`
+wraps a compiled graph so concurrent identical requests share one execution:
+the first one starts it, the others join it, and all of them receive the same
+stream events and final state. A request which joins late still gets every
+event from the start, so its progress and streamed tokens are complete.
+
+Requests are identical when their normalized prompt, input code, conversation
+and options are, on the same graph variant (`run_key`). The execution runs on
+its own thread (stream/invoke) or task (astream/ainvoke), not in the caller,
+so a caller which stops waiting (a cancelled job, a cancelled task, a closed
+stream) only leaves it; the execution itself is cancelled once no caller is
+waiting any more. Finished executions are forgotten, so later requests run
+afresh (and go through the response caches).
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+
+from metrics import register_collector
+
+
+# the shared execution streams every mode a caller may ask for; each caller only gets the modes it asked for
+FLIGHT_MODES = ('updates', 'custom', 'values')
+
+flight_stats = {'runs': 0, 'coalesced': 0, 'abandoned': 0, 'cancelled': 0, 'failed': 0}
+flight_stats_lock = threading.Lock()
+
+# single_flight tables of the process, for the in-flight gauge
+flight_tables = []
+
+
+def count_flight(event: str):
+    with flight_stats_lock:
+        flight_stats[event] += 1
+
+
+def normalize_text(text) -> str:
+    return ' '.join(str(text or '').split())
+
+
+def normalize_code(code) -> str:
+    """Code without trailing whitespace and blank lines at the ends; indentation is kept."""
+    return '\n'.join(line.rstrip() for line in str(code or '').split('\n')).strip('\n')
+
+
+def run_key(graph: str, state: dict) -> str:
+    """Hash of everything a run depends on: the graph variant, the normalized prompt and code, the conversation and options."""
+    options = {name: value for name, value in state.items() if name not in ('prompt', 'input_code', 'messeges')}
+    payload = {
+        'graph': graph,
+        'prompt': normalize_text(state.get('prompt')),
+        'input_code': normalize_code(state.get('input_code')),
+        'messeges': [(message.type, str(message.content)) for message in state.get('messeges') or []],
+        'options': options,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def select_modes(stream_mode) -> tuple:
+    """(modes wanted, whether events are (mode, chunk) pairs) of a stream_mode argument."""
+    if stream_mode is None:
+        return ('values',), False
+    if isinstance(stream_mode, str):
+        return (stream_mode,), False
+    return tuple(stream_mode), True
+
+
+class flight:
+    """One shared execution: its recorded events, its waiting callers and its outcome."""
+
+    def __init__(self, condition):
+        self.condition = condition
+        self.events = []
+        self.waiters = 0
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+
+
+class single_flight:
+    """Table of the executions in flight, per graph variant."""
+
+    def __init__(self, graph, name: str):
+        self.graph = graph
+        self.name = name
+        self.flights = {}
+        self.aflights = {}
+        self.lock = threading.Lock()
+        flight_tables.append(self)
+
+    def join(self, table: dict, key, condition, start) -> flight:
+        """The flight of a key, joining the one in progress or starting a new one (notified through condition) with start(flight)."""
+        with self.lock:
+            current = table.get(key)
+            if current is not None and not current.cancelled:
+                current.waiters += 1
+                count_flight('coalesced')
+                return current
+            current = table[key] = flight(condition)
+            current.waiters = 1
+        count_flight('runs')
+        start(current)
+        return current
+
+    def leave(self, table: dict, key, current: flight) -> bool:
+        """Stop waiting on a flight before it finished; True when it is left without callers and is to be cancelled."""
+        count_flight('abandoned')
+        with self.lock:
+            current.waiters -= 1
+            if current.waiters or current.finished:
+                return False
+            current.cancelled = True
+            if table.get(key) is current:
+                del table[key]
+        count_flight('cancelled')
+        return True
+
+    def finish(self, table: dict, key, current: flight):
+        with self.lock:
+            if table.get(key) is current:
+                del table[key]
+
+    # sync executions run on a thread of their own and are stopped between events once cancelled
+
+    def stream(self, state: dict, stream_mode=None):
+        key = run_key(self.name, state)
+
+        def start(current):
+            threading.Thread(target=self.drive, args=(key, current, state), name='single-flight', daemon=True).start()
+
+        current = self.join(self.flights, key, threading.Condition(), start)
+        return self.subscribe(key, current, stream_mode)
+
+    def drive(self, key, current: flight, state: dict):
+        stream = self.graph.stream(state, stream_mode=list(FLIGHT_MODES))
+        try:
+            for event in stream:
+                with current.condition:
+                    current.events.append(event)
+                    current.condition.notify_all()
+                if current.cancelled:
+                    break
+        except Exception as error:
+            current.error = error
+            count_flight('failed')
+        finally:
+            stream.close()
+            self.finish(self.flights, key, current)
+            with current.condition:
+                current.finished = True
+                current.condition.notify_all()
+
+    def subscribe(self, key, current: flight, stream_mode):
+        modes, pairs = select_modes(stream_mode)
+        index = 0
+        try:
+            while True:
+                with current.condition:
+                    while index == len(current.events) and not current.finished:
+                        current.condition.wait()
+                    events = current.events[index:]
+                    finished = current.finished
+                index += len(events)
+                for mode, chunk in events:
+                    if mode in modes:
+                        yield (mode, chunk) if pairs else chunk
+                if finished:
+                    break
+        finally:
+            if not (current.finished and index == len(current.events)):
+                self.leave(self.flights, key, current)
+        if current.error is not None:
+            raise current.error
+
+    def invoke(self, state: dict) -> dict:
+        final_state = None
+        for final_state in self.stream(state, stream_mode='values'):
+            pass
+        return final_state
+
+    # async executions run as a task of the caller's event loop and are cancelled with it
+
+    def astream(self, state: dict, stream_mode=None):
+        loop = asyncio.get_running_loop()
+        key = (loop, run_key(self.name, state))
+
+        def start(current):
+            current.task = loop.create_task(self.adrive(key, current, state))
+
+        current = self.join(self.aflights, key, asyncio.Condition(), start)
+        return self.asubscribe(key, current, stream_mode)
+
+    async def adrive(self, key, current: flight, state: dict):
+        try:
+            async for event in self.graph.astream(state, stream_mode=list(FLIGHT_MODES)):
+                async with current.condition:
+                    current.events.append(event)
+                    current.condition.notify_all()
+        except asyncio.CancelledError:
+            pass
+        except Exception as error:
+            current.error = error
+            count_flight('failed')
+        finally:
+            self.finish(self.aflights, key, current)
+            current.finished = True
+            async with current.condition:
+                current.condition.notify_all()
+
+    async def asubscribe(self, key, current: flight, stream_mode):
+        modes, pairs = select_modes(stream_mode)
+        index = 0
+        try:
+            while True:
+                async with current.condition:
+                    await current.condition.wait_for(lambda: index < len(current.events) or current.finished)
+                    events = current.events[index:]
+                    finished = current.finished
+                index += len(events)
+                for mode, chunk in events:
+                    if mode in modes:
+                        yield (mode, chunk) if pairs else chunk
+                if finished:
+                    break
+        finally:
+            if not (current.finished and index == len(current.events)) and self.leave(self.aflights, key, current):
+                current.task.cancel()
+        if current.error is not None:
+            raise current.error
+
+    async def ainvoke(self, state: dict) -> dict:
+        final_state = None
+        async for final_state in self.astream(state, stream_mode='values'):
+            pass
+        return final_state
+
+
+class coalesced_workflow:
+    """A compiled graph whose invoke/ainvoke/stream/astream share one execution between identical concurrent requests.
+
+    Calls with a config or other arguments, and every other attribute, go to the graph itself.
+    """
+
+    def __init__(self, graph, name: str):
+        self.graph = graph
+        self.flights = single_flight(graph, name)
+
+    def invoke(self, state: dict, config=None, **kwargs):
+        if config is not None or kwargs:
+            return self.graph.invoke(state, config, **kwargs)
+        return self.flights.invoke(state)
+
+    async def ainvoke(self, state: dict, config=None, **kwargs):
+        if config is not None or kwargs:
+            return await self.graph.ainvoke(state, config, **kwargs)
+        return await self.flights.ainvoke(state)
+
+    def stream(self, state: dict, config=None, stream_mode=None, **kwargs):
+        if config is not None or kwargs or not set(select_modes(stream_mode)[0]) <= set(FLIGHT_MODES):
+            return self.graph.stream(state, config, stream_mode=stream_mode, **kwargs)
+        return self.flights.stream(state, stream_mode)
+
+    def astream(self, state: dict, config=None, stream_mode=None, **kwargs):
+        if config is not None or kwargs or not set(select_modes(stream_mode)[0]) <= set(FLIGHT_MODES):
+            return self.graph.astream(state, config, stream_mode=stream_mode, **kwargs)
+        return self.flights.astream(state, stream_mode)
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+
+def in_flight() -> dict:
+    return {'executions': sum(len(table.flights) + len(table.aflights) for table in flight_tables)}
+
+register_collector('intellicode_single_flight_total', 'Workflow executions started, requests coalesced into one in flight, requests which stopped waiting, executions cancelled without waiters, failed executions.', 'counter', lambda: dict(flight_stats))
+register_collector('intellicode_single_flight_in_flight', 'Shared workflow executions in flight.', 'gauge', in_flight)
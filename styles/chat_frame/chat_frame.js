@@ -0,0 +1,78 @@
+// Chat pane of IntelliCode-SL as a Streamlit component.
+// The page is loaded once; every rerun only sends the [key, html] fragments of the visible
+// messages, and only the fragments that changed are written to the DOM.
+
+const FRAME_HEIGHT = 630;
+const chat = document.getElementById('chat');
+const rendered = new Map();  // key -> {node, html}
+let firstRender = true;
+
+function send(type, data) {
+    window.parent.postMessage(Object.assign({isStreamlitMessage: true, type: type}, data), '*');
+}
+
+function hiddenNote(hidden) {
+    let note = document.getElementById('hidden-note');
+    if (!hidden) {
+        if (note) note.remove();
+        return;
+    }
+    if (!note) {
+        note = document.createElement('div');
+        note.id = 'hidden-note';
+        note.className = 'hidden-note';
+        chat.prepend(note);
+    }
+    note.textContent = hidden + ' earlier message' + (hidden === 1 ? '' : 's') + ' not shown';
+}
+
+function render(args) {
+    const atBottom = chat.scrollHeight - chat.scrollTop - chat.clientHeight < 40;
+    const messages = args.messages || [];
+    const keys = new Set(messages.map(message => message[0]));
+    let appended = false;
+
+    for (const [key, entry] of rendered) {
+        if (!keys.has(key)) {
+            entry.node.remove();
+            rendered.delete(key);
+        }
+    }
+
+    let previous = null;
+    for (const [key, html] of messages) {
+        let entry = rendered.get(key);
+        if (!entry) {
+            const node = document.createElement('div');
+            node.innerHTML = html;
+            entry = {node: node, html: html};
+            rendered.set(key, entry);
+            appended = true;
+        } else if (entry.html !== html) {
+            entry.node.innerHTML = html;
+            entry.html = html;
+        }
+        // keep the DOM in the order of the messages
+        const expected = previous ? previous.nextSibling : chat.firstChild && chat.firstChild.id === 'hidden-note' ? chat.firstChild.nextSibling : chat.firstChild;
+        if (entry.node !== expected) {
+            chat.insertBefore(entry.node, expected);
+        }
+        previous = entry.node;
+    }
+    hiddenNote(args.hidden || 0);
+
+    // follow new messages, and streamed text unless the user scrolled up to read older messages
+    if (firstRender || atBottom || appended) {
+        chat.scrollTop = chat.scrollHeight;
+    }
+    firstRender = false;
+}
+
+window.addEventListener('message', event => {
+    if (event.data && event.data.type === 'streamlit:render') {
+        render(event.data.args);
+    }
+});
+
+send('streamlit:componentReady', {apiVersion: 1});
+send('streamlit:setFrameHeight', {height: FRAME_HEIGHT});
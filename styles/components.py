@@ -7,6 +7,8 @@ Contains reusable visual elements and styling helpers.
 import streamlit as st
 import streamlit.components.v1 as components
 import base64
+import functools
+import html as html_lib
 from pathlib import Path
 
 
@@ -155,131 +157,79 @@ def render_send_button():
     return st.button("", key="send_btn", type="secondary")
 
 
-def render_chat_history(chat_history: list):
-    """Render the complete chat history in a scrollable container."""
-    import html as html_lib
-    
-    # Build complete HTML
-    html_content = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-    <style>
-    body {
-        margin: 0;
-        padding: 0;
-        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', 'Oxygen', 'Ubuntu', 'Cantarell', 'Fira Sans', 'Droid Sans', 'Helvetica Neue', sans-serif;
-    }
-    .chat-scroll-wrapper {
-        height: 610px;
-        overflow-y: auto;
-        overflow-x: hidden;
-        background-color: #1a1a1a;
-        border: 1px solid #2a2a2a;
-        border-radius: 8px;
-        padding: 10px;
-    }
-    .chat-scroll-wrapper::-webkit-scrollbar {
-        width: 8px;
-    }
-    .chat-scroll-wrapper::-webkit-scrollbar-track {
-        background: #1a1a1a;
-    }
-    .chat-scroll-wrapper::-webkit-scrollbar-thumb {
-        background: #3a3a3a;
-        border-radius: 4px;
-    }
-    .chat-message {
-        display: flex;
-        padding: 16px;
-        border-radius: 12px;
-        font-size: 14px;
-        line-height: 1.6;
-        margin-bottom: 16px;
-        animation: fadeIn 0.3s ease-in;
-    }
-    @keyframes fadeIn {
-        from { opacity: 0; transform: translateY(10px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
-    .user-message {
-        background-color: #2f2f2f;
-        color: #ececec;
-        margin-left: 20px;
-        border: 1px solid #3f3f3f;
-    }
-    .assistant-message {
-        background-color: #1a1a1a;
-        color: #d1d1d1;
-        margin-right: 20px;
-        border: 1px solid #2a2a2a;
-    }
-    .message-label {
-        font-weight: 600;
-        margin-bottom: 8px;
-        font-size: 13px;
-        opacity: 0.8;
-    }
-    .user-label {
-        color: #4a9eff;
-    }
-    .assistant-label {
-        color: #10a37f;
-    }
-    .message-content {
-        white-space: pre-wrap;
-        word-wrap: break-word;
-    }
-    </style>
-    </head>
-    <body>
-    <div class="chat-scroll-wrapper">
+# Most recent messages shown in the chat pane; older ones are loaded on demand
+CHAT_WINDOW_SIZE = 40
+
+# The chat pane is a static component: its HTML, CSS and JS (styles/chat_frame) are loaded
+# once and cached by the browser, each rerun only sends the fragments of the visible messages
+chat_frame = components.declare_component('chat_frame', path=str(Path(__file__).parent / 'chat_frame'))
+
+
+@functools.lru_cache(maxsize=4096)
+def render_message_fragment(role: str, content: str) -> str:
+    """Escaped HTML bubble of one message, cached so long conversations are not escaped again on every rerun."""
+    content = html_lib.escape(content)
+    if role == 'user':
+        return render_user_message(content)
+    return render_assistant_message(content)
+
+
+def render_chat_messages(chat_history: list, window: int = CHAT_WINDOW_SIZE) -> tuple:
+    """Build the [key, html] fragments of the last `window` messages (or the welcome message when empty).
+
+    Returns (fragments, number of older messages not shown); a message's key is its
+    index in the history, so the pane only rewrites the fragments that changed.
     """
-    
     if len(chat_history) == 0:
-        html_content += """
-        <div style="text-align: center; padding: 40px 20px; color: #888;">
-            <div style="font-size: 48px; margin-bottom: 16px;">💬</div>
-            <div style="font-size: 16px; font-weight: 500; margin-bottom: 8px;">How can I help you today?</div>
-            <div style="font-size: 13px; opacity: 0.7;">Ask me anything about your code</div>
-        </div>
-        """
+        return [['welcome', render_welcome_message()]], 0
+
+    first = max(0, len(chat_history) - window)
+    fragments = [
+        [str(index), render_message_fragment(message['role'], str(message['content']))]
+        for index, message in enumerate(chat_history[first:], start=first)
+    ]
+    return fragments, first
+
+
+def render_chat_document(fragments: list, hidden: int = 0, placeholder=None, key='chat_pane'):
+    """Render the message fragments in the scrollable chat frame, optionally inside a placeholder.
+
+    A key keeps the same frame mounted across reruns, so only the changed
+    fragments are written to it.
+    """
+    if placeholder is not None:
+        with placeholder:
+            chat_frame(messages=fragments, hidden=hidden, key=key, default=None)
     else:
-        for message in chat_history:
-            # Escape HTML entities
-            content = html_lib.escape(str(message['content']))
-            
-            if message['role'] == 'user':
-                html_content += f"""
-                <div class="chat-message user-message">
-                    <div>
-                        <div class="message-label user-label">You</div>
-                        <div class="message-content">{content}</div>
-                    </div>
-                </div>
-                """
-            else:
-                html_content += f"""
-                <div class="chat-message assistant-message">
-                    <div>
-                        <div class="message-label assistant-label">Assistant</div>
-                        <div class="message-content">{content}</div>
-                    </div>
-                </div>
-                """
-    
-    html_content += """
-    </div>
-    <script>
-        // Auto-scroll to bottom when page loads
-        window.onload = function() {
-            var chatContainer = document.querySelector('.chat-scroll-wrapper');
-            chatContainer.scrollTop = chatContainer.scrollHeight;
-        };
-    </script>
-    </body>
-    </html>
+        chat_frame(messages=fragments, hidden=hidden, key=key, default=None)
+
+
+def render_chat_history(chat_history: list, placeholder=None, window: int = CHAT_WINDOW_SIZE):
+    """Render the most recent `window` messages of the chat history in a scrollable container.
+
+    Pass an st.empty() placeholder to render the pane inside it.
+    """
+    fragments, hidden = render_chat_messages(chat_history, window)
+    render_chat_document(fragments, hidden, placeholder)
+
+
+def render_streaming_message(placeholder, history: tuple, content: str):
+    """Render the chat pane with the in-progress assistant message.
+
+    history is the render_chat_messages output of the finished messages (their
+    fragments are cached), so each update only escapes the in-progress text.
     """
-    
-    # Use components.html to render
-    components.html(html_content, height=630, scrolling=False)
+    fragments, hidden = history
+    streaming = ['streaming', render_assistant_message(html_lib.escape(content) + '▌')]
+    render_chat_document(fragments + [streaming], hidden, placeholder)
+
+
+def format_job_progress(progress: dict) -> str:
+    """Text of the in-progress message: the streamed answer, or the finished steps while nothing streams yet."""
+    if progress['streamed_text']:
+        return progress['streamed_text']
+    if progress['status'] == 'queued':
+        return f"🤔 Thinking... (waiting for a free worker, {progress['elapsed']:.0f}s)"
+    steps = ''.join(f'\n✓ {node}' for node in progress['completed_nodes'])
+    retry = f"\n↻ retrying from the last completed step (attempt {progress['attempts'] + 1})" if progress.get('attempts') else ''
+    return f"🤔 Thinking... ({progress['elapsed']:.0f}s){steps}{retry}"
@@ -0,0 +1,92 @@
+"""
+End-to-end check of batch_runner.py against the local mock OpenAI server.
+
+Runs a JSONL input mixing valid and malformed records (invalid JSON, lines
+which are not objects, missing prompts, fields of the wrong type) through
+run_batch with a small window, and checks that it finishes, that every
+record gets exactly one result line in input order, and that exactly the
+malformed ones are errors. Nothing is sent to OpenRouter.
+
+Run from the project root:
+    python -m testing_files.batch_check
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+from testing_files.mock_openai_server import mock_profile, start_server
+
+
+# (input line, whether the record is malformed)
+RECORDS = [
+    ('{"id": "a", "prompt": "explain this", "input_code": "print(1)"}', False),
+    ('[1, 2]', True),
+    ('"x"', True),
+    ('{"id": "b", "prompt": "write a function which adds two numbers"}', False),
+    ('{not json', True),
+    ('{"id": "c", "input_code": "print(1)"}', True),
+    ('{"id": "d", "prompt": "explain this", "input_code": 5}', True),
+    ('{"id": "e", "prompt": "explain this", "use_cache": "yes"}', True),
+    ('null', True),
+    ('{"prompt": "explain this", "input_code": "x = 1"}', False),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check batch_runner.py on valid and malformed JSONL records.')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds before the batch counts as hung')
+    args = parser.parse_args()
+
+    server, base_url = start_server(0, mock_profile('instant'))
+
+    # the workflow reads its configuration when it is imported
+    os.environ['open_router_base_url'] = base_url
+    os.environ.setdefault('open_router_api', 'mock-key')
+    os.environ['cache_enabled'] = 'false'
+    os.environ['transport_prewarm'] = 'false'
+    os.environ['checkpoint_enabled'] = 'false'
+
+    from batch_runner import run_batch
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'input.jsonl')
+        output_path = os.path.join(directory, 'output.jsonl')
+        with open(input_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line, _ in RECORDS))
+
+        try:
+            asyncio.run(asyncio.wait_for(run_batch(input_path, output_path, 2, 'default', False, 2), args.timeout))
+        except asyncio.TimeoutError:
+            print(f'FAIL: the batch did not finish in {args.timeout:.0f}s')
+            sys.exit(1)
+
+        with open(output_path, encoding='utf-8') as f:
+            results = [json.loads(line) for line in f]
+    server.shutdown()
+
+    failures = []
+    if len(results) != len(RECORDS):
+        failures.append(f'{len(results)} result lines for {len(RECORDS)} records')
+    for index, ((line, malformed), result) in enumerate(zip(RECORDS, results)):
+        if malformed != ('error' in result):
+            failures.append(f'record {index} {line!r}: {result}')
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = None
+        expected_id = record.get('id', index) if isinstance(record, dict) else index
+        if result.get('id') != expected_id:
+            failures.append(f'record {index} {line!r}: id {result.get("id")!r}, expected {expected_id!r}')
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    print(f'{len(results)} results, {sum("error" in result for result in results)} errors, {len(failures)} failures')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Per-node and end-to-end latency benchmarks for the IntelliCode-SL workflow.
+
+Starts the local mock OpenAI-compatible server, points workflow.py at it and
+measures, for every task_type route, the latency of each node and of the whole
+run and the share of prompt tokens served from the (simulated) prompt cache,
+plus micro-benchmarks of the in-process work (prompt building, local
+intent classification, code-fence cleanup). Nothing is sent to OpenRouter.
+
+Run from the project root:
+    python -m testing_files.benchmark --profile instant --runs 30 --output bench.json
+    python -m testing_files.benchmark --profile instant --compare bench.json --tolerance 0.25
+
+With --small-profile the classifier, summary, collator and memory calls are
+routed (through the model registry) to a second mock server with that
+profile, standing in for a small local model:
+    python -m testing_files.benchmark --profile realistic --small-profile fast
+
+With --compare the run exits with status 1 when a p50 latency regressed by
+more than the tolerance, so it can gate CI.
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from testing_files.mock_openai_server import PROFILES, mock_profile, start_server
+
+
+ROUTES = ('explain', 'debug', 'write', 'docs', 'other')
+
+# nodes which do not generate code, routed to the small model with --small-profile
+SMALL_MODEL_NODES = ('task_classifier', 'debug_summary', 'write_summary', 'docs_summary', 'collator', 'memory')
+
+SAMPLE_CODE = '''def average(values):
+    total = 0
+    for value in values:
+        total += value
+    return total / len(values)
+
+print(average([]))
+'''
+
+
+def summarize(samples: list) -> dict:
+    """Latency distribution of a list of durations (seconds), in milliseconds."""
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def percentile(q):
+        return ordered[min(count - 1, int(round(q * (count - 1))))] * 1000
+
+    return {
+        'n': count,
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': percentile(0.50),
+        'p90_ms': percentile(0.90),
+        'p99_ms': percentile(0.99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def time_call(func, runs: int) -> dict:
+    """Micro-benchmark a callable."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def route_state(route: str, run: int = 0) -> dict:
+    """Initial state which the mock server classifies into the given route; the prompt differs per run, the code does not."""
+    return {
+        'prompt': f'[route:{route}] please handle this request (run {run})',
+        'input_code': None if route == 'write' else SAMPLE_CODE,
+    }
+
+
+def run_route(workflow, route: str, runs: int) -> dict:
+    """Time each node (between consecutive graph updates) and the whole run for one route, and count its prompt tokens."""
+    node_samples = {}
+    end_to_end = []
+    tokens = {'prompt': 0, 'cached': 0}
+    for run in range(runs):
+        start = last = time.perf_counter()
+        for update in workflow.stream(route_state(route, run + 1), stream_mode='updates'):
+            now = time.perf_counter()
+            for node, values in update.items():
+                node_samples.setdefault(node, []).append(now - last)
+                for call in (values or {}).get('metadata', {}).get('calls', []):
+                    tokens['prompt'] += call['prompt_tokens']
+                    tokens['cached'] += call['cached_tokens']
+            last = now
+        end_to_end.append(time.perf_counter() - start)
+    return {
+        'end_to_end': summarize(end_to_end),
+        'nodes': {node: summarize(samples) for node, samples in node_samples.items()},
+        'prompt_tokens': tokens['prompt'] / runs,
+        'cached_share': tokens['cached'] / tokens['prompt'] if tokens['prompt'] else 0.0,
+    }
+
+
+def run_concurrent(workflow, route: str, requests: int, concurrency: int) -> dict:
+    """End-to-end latency and throughput of concurrent ainvoke runs on one event loop."""
+    async def run():
+        limit = asyncio.Semaphore(concurrency)
+        samples = []
+
+        async def one():
+            async with limit:
+                start = time.perf_counter()
+                await workflow.ainvoke(route_state(route))
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return samples, time.perf_counter() - start
+
+    samples, elapsed = asyncio.run(run())
+    result = summarize(samples)
+    result['throughput_rps'] = requests / elapsed
+    return result
+
+
+def micro_benchmarks(workflow_module, runs: int) -> dict:
+    """In-process costs of the workflow which do not depend on the network."""
+    from code_utils import strip_code_fences
+
+    state = {
+        'prompt': 'fix the bug in this function',
+        'input_code': SAMPLE_CODE,
+        'modified_code': SAMPLE_CODE,
+        'change_summary': '- fixed the division by zero',
+    }
+    fenced = '```python\n' + SAMPLE_CODE * 50 + '```'
+
+    results = {
+        'strip_code_fences': time_call(lambda: strip_code_fences(fenced), runs),
+        'local_classifier': time_call(lambda: workflow_module.local_classifier.predict(state['prompt'], state['input_code']), runs),
+    }
+    for name in dir(workflow_module):
+        # the builders of the node prompts take the state only; chunk and reduce builders need more arguments
+        if name.endswith('_prompt') and callable(getattr(workflow_module, name)) and len(inspect.signature(getattr(workflow_module, name)).parameters) == 1:
+            builder = getattr(workflow_module, name)
+            results[f'prompt.{name}'] = time_call(lambda: builder(state), runs)
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def flatten(results: dict, prefix: str = '') -> dict:
+    """Map 'routes.debug.nodes.collator' style keys to their p50 latency."""
+    flat = {}
+    for key, value in results.items():
+        path = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict) and 'p50_ms' in value:
+            flat[path] = value['p50_ms']
+        elif isinstance(value, dict):
+            flat.update(flatten(value, path))
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float, floor_ms: float) -> list:
+    """Return the (key, baseline, current) p50 regressions beyond the tolerance."""
+    before = flatten({key: baseline[key] for key in ('routes', 'concurrent', 'micro') if key in baseline})
+    after = flatten({key: current[key] for key in ('routes', 'concurrent', 'micro') if key in current})
+    regressions = []
+    for key, old in before.items():
+        new = after.get(key)
+        if new is not None and new > old * (1 + tolerance) and new - old > floor_ms:
+            regressions.append((key, old, new))
+    return regressions
+
+
+def print_report(results: dict):
+    print(f"Profile: {results['meta']['profile']}  small model profile: {results['meta']['small_profile']}  runs/route: {results['meta']['runs']}  mode: {results['meta']['mode']}")
+    print(f"{'route / node':<36}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for route, data in results['routes'].items():
+        stats = data['end_to_end']
+        print(f"{route + ' (end to end)':<36}{stats['p50_ms']:>10.2f}{stats['p90_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+              f"  ({data['prompt_tokens']:.0f} prompt tokens/run, {data['cached_share']:.0%} cached)")
+        for node, stats in data['nodes'].items():
+            print(f"{'  ' + node:<36}{stats['p50_ms']:>10.2f}{stats['p90_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+    if 'concurrent' in results:
+        stats = results['concurrent']
+        print(f"{'concurrent ainvoke':<36}{stats['p50_ms']:>10.2f}{stats['p90_ms']:>10.2f}{stats['p99_ms']:>10.2f}  ({stats['throughput_rps']:.1f} req/s)")
+    print()
+    print(f"{'micro benchmark':<36}{'mean us':>10}{'p99 us':>10}")
+    for name, stats in results['micro'].items():
+        print(f"{name:<36}{stats['mean_ms'] * 1000:>10.1f}{stats['p99_ms'] * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the workflow against a local mock OpenAI server.')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='instant', help='latency profile of the mock server')
+    parser.add_argument('--small-profile', choices=sorted(PROFILES), help='route the non-code nodes to a second mock server with this profile')
+    parser.add_argument('--runs', type=int, default=20, help='runs per route')
+    parser.add_argument('--mode', choices=['default', 'fused', 'speculative'], default='default', help='graph variant to benchmark')
+    parser.add_argument('--local-classifier', action='store_true', help='keep the local intent fast path (default forces the LLM classifier)')
+    parser.add_argument('--concurrency', type=int, default=0, help='also run this many concurrent ainvoke requests (debug route)')
+    parser.add_argument('--micro-runs', type=int, default=2000, help='iterations per micro benchmark')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', help='baseline JSON to compare p50 latencies against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative p50 regression')
+    parser.add_argument('--floor-ms', type=float, default=0.05, help='ignore regressions smaller than this (ms)')
+    args = parser.parse_args()
+
+    server, base_url = start_server(0, mock_profile(args.profile))
+
+    # the workflow reads its configuration when it is imported
+    os.environ['open_router_base_url'] = base_url
+    os.environ.setdefault('open_router_api', 'mock-key')
+    os.environ['cache_enabled'] = 'false'
+    os.environ['transport_prewarm'] = 'false'
+    if not args.local_classifier:
+        os.environ['intent_threshold'] = '2'
+    if args.small_profile:
+        small_server, small_url = start_server(0, mock_profile(args.small_profile))
+        os.environ['model_endpoints'] = f'small={small_url}'
+        os.environ['node_models'] = ','.join(f'{node}=mock-small@small' for node in SMALL_MODEL_NODES)
+
+    import workflow as workflow_module
+    workflow = workflow_module.build_workflow(fused=args.mode == 'fused', speculative=args.mode == 'speculative')
+
+    # one warm-up run opens the pooled connection
+    workflow.invoke(route_state('debug'))
+
+    results = {
+        'meta': {
+            'profile': args.profile,
+            'runs': args.runs,
+            'mode': args.mode,
+            'small_profile': args.small_profile,
+            'local_classifier': args.local_classifier,
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'routes': {route: run_route(workflow, route, args.runs) for route in ROUTES},
+        'micro': micro_benchmarks(workflow_module, args.micro_runs),
+    }
+    if args.concurrency:
+        results['concurrent'] = run_concurrent(workflow, 'debug', args.concurrency * 4, args.concurrency)
+    server.shutdown()
+    if args.small_profile:
+        small_server.shutdown()
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.floor_ms)
+        print()
+        for key in ('profile', 'mode', 'small_profile', 'local_classifier'):
+            if baseline.get('meta', {}).get(key) != results['meta'][key]:
+                print(f"Warning: baseline {key} is {baseline.get('meta', {}).get(key)!r}, this run used {results['meta'][key]!r}")
+        if regressions:
+            print(f'{len(regressions)} p50 regressions beyond {args.tolerance:.0%}:')
+            for key, old, new in regressions:
+                print(f'  {key}: {old:.3f}ms -> {new:.3f}ms')
+            sys.exit(1)
+        print(f'No p50 regressions beyond {args.tolerance:.0%} against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Round-trip check of the chunked debug path.
+
+Splits source files at several chunk budgets and checks that the chunks put
+back together give the original code: as they are (patched chunks are exact
+slices) and as a model would regenerate them unchanged (wrapped in code
+fences, without their surrounding blank lines).
+
+Run from the project root (defaults to the project's own Python files):
+    python -m testing_files.chunk_roundtrip [files...]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from chunking import assemble_code, split_code
+
+
+BUDGETS = (40, 200, 800, 2500)
+
+
+def regenerated(chunk: str) -> str:
+    return f'```python\n{chunk.strip()}\n```\n\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that split_code and assemble_code round-trip source files.')
+    parser.add_argument('files', nargs='*', help='files to split (default: the *.py files of the project)')
+    args = parser.parse_args()
+
+    files = [Path(name) for name in args.files] or sorted(Path('.').rglob('*.py'))
+    checked = failures = 0
+    for path in files:
+        code = path.read_text(encoding='utf-8')
+        for budget in BUDGETS:
+            chunks = split_code(code, budget)
+            if len(chunks) < 2:
+                continue
+            checked += 1
+            everything = range(len(chunks))
+            for label, parts, redone in (('patched', chunks, ()), ('regenerated', [regenerated(chunk) for chunk in chunks], everything)):
+                if assemble_code(parts, chunks, redone) != code:
+                    failures += 1
+                    print(f'{path} at {budget} tokens: {label} chunks do not round-trip')
+
+    print(f'{checked} splits checked, {failures} failures')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Hit-rate / accuracy report for the local intent classifier.
+
+Run from the project root:
+    python -m testing_files.intent_report --labels testing_files/intent_eval.jsonl
+
+Every labelled record is classified locally; a record is a "hit" when the
+local confidence clears the threshold (the workflow then skips the LLM
+classifier). Accuracy is reported over the hits, which is the accuracy the
+workflow actually sees from the fast path.
+"""
+
+import argparse
+import time
+from collections import Counter, defaultdict
+
+from intent_classifier import LABELS, intent_classifier, load_samples
+from workflow_config import intent_threshold, intent_training_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate the local intent classifier against a labelled JSONL set.')
+    parser.add_argument('--labels', default='testing_files/intent_eval.jsonl', help='labelled JSONL with prompt, task_type and has_code/input_code')
+    parser.add_argument('--train', default=intent_training_data, help='JSONL used to train the bag-of-words model')
+    parser.add_argument('--threshold', type=float, default=intent_threshold, help='confidence needed to skip the LLM classifier')
+    args = parser.parse_args()
+
+    classifier = intent_classifier(load_samples(args.train))
+    records = [r for r in load_samples(args.labels) if r.get('task_type') in LABELS]
+
+    hits = 0
+    correct_hits = 0
+    correct_all = 0
+    latencies = []
+    per_label = defaultdict(Counter)
+    confusion = Counter()
+
+    for record in records:
+        input_code = record.get('input_code', 'code' if record.get('has_code') else None)
+
+        start = time.perf_counter()
+        label, confidence = classifier.predict(record['prompt'], input_code)
+        latencies.append(time.perf_counter() - start)
+
+        expected = record['task_type']
+        per_label[expected]['total'] += 1
+        correct_all += label == expected
+        if confidence >= args.threshold:
+            hits += 1
+            correct_hits += label == expected
+            per_label[expected]['hits'] += 1
+            per_label[expected]['correct'] += label == expected
+            if label != expected:
+                confusion[(expected, label)] += 1
+
+    total = len(records)
+    if total == 0:
+        print('No labelled records found.')
+        return
+
+    latencies.sort()
+    print(f"Records: {total}  (trained on {sum(classifier.label_counts.values())} samples, threshold {args.threshold})")
+    print(f"Hit rate (answered locally): {hits / total:.1%}")
+    print(f"Accuracy on hits:            {correct_hits / hits:.1%}" if hits else "Accuracy on hits:            n/a")
+    print(f"Accuracy if always local:    {correct_all / total:.1%}")
+    print(f"Latency: mean {sum(latencies) / total * 1e6:.0f}us, p99 {latencies[min(total - 1, int(total * 0.99))] * 1e6:.0f}us")
+    print()
+    print(f"{'label':<10}{'total':>7}{'hits':>7}{'correct':>9}")
+    for label in LABELS:
+        counts = per_label[label]
+        print(f"{label:<10}{counts['total']:>7}{counts['hits']:>7}{counts['correct']:>9}")
+    if confusion:
+        print()
+        print('Wrong local answers (expected -> predicted):')
+        for (expected, predicted), count in confusion.most_common():
+            print(f"  {expected} -> {predicted}: {count}")
+
+
+if __name__ == '__main__':
+    main()
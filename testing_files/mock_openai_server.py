@@ -0,0 +1,234 @@
+"""
+Local OpenAI-compatible stand-in server for benchmarking the workflow.
+
+Answers POST /v1/chat/completions (plain, streamed and json_schema
+structured responses) after a configurable latency profile, so the workflow's
+own overhead can be measured without calling OpenRouter. Structured responses
+pick enum values from a "[route:<value>]" marker in the prompt, which lets a
+benchmark force each task_type route. Like a provider's prompt cache, the
+usage reports the leading messages already sent in an earlier request as
+cached prompt tokens.
+
+Run standalone from the project root:
+    python -m testing_files.mock_openai_server --port 8999 --profile realistic
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# time to first token (s), generation rate (tokens/s), completion length (tokens),
+# relative jitter, and the share of requests that are slowed down 10x (the tail)
+PROFILES = {
+    'instant': {'ttft': 0.0, 'tokens_per_second': 0.0, 'completion_tokens': 40, 'jitter': 0.0, 'tail_rate': 0.0},
+    'fast': {'ttft': 0.05, 'tokens_per_second': 500.0, 'completion_tokens': 100, 'jitter': 0.1, 'tail_rate': 0.0},
+    'realistic': {'ttft': 0.4, 'tokens_per_second': 150.0, 'completion_tokens': 250, 'jitter': 0.2, 'tail_rate': 0.0},
+    'tail': {'ttft': 0.4, 'tokens_per_second': 150.0, 'completion_tokens': 250, 'jitter': 0.2, 'tail_rate': 0.05},
+}
+
+ROUTE_MARKER = re.compile(r'\[route:(\w+)\]')
+
+# hashes of the message prefixes seen so far (LRU), for the simulated prompt cache
+PREFIX_CACHE_ENTRIES = 10000
+seen_prefixes = OrderedDict()
+prefix_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def cached_prefix_tokens(messages: list) -> int:
+    """Tokens of the longest run of leading messages sent before (a prompt cache at message granularity)."""
+    digest = hashlib.sha256()
+    tokens = 0
+    cached = 0
+    with prefix_lock:
+        for message in messages:
+            digest.update(json.dumps(message, sort_keys=True).encode('utf-8'))
+            key = digest.hexdigest()
+            tokens += estimate_tokens(str(message.get('content', '')))
+            if key in seen_prefixes:
+                seen_prefixes.move_to_end(key)
+                cached = tokens
+            else:
+                seen_prefixes[key] = True
+                if len(seen_prefixes) > PREFIX_CACHE_ENTRIES:
+                    seen_prefixes.popitem(last=False)
+    return cached
+
+
+def filler_text(tokens: int) -> str:
+    """Deterministic text of roughly the requested number of tokens."""
+    words = ['result', 'value', 'items', 'return', 'loop', 'index', 'total', 'print']
+    return ' '.join(words[i % len(words)] for i in range(tokens))
+
+
+def schema_value(name: str, schema: dict, prompt_text: str, tokens: int):
+    """Generate a value for one json_schema property."""
+    options = schema.get('anyOf') or [schema]
+    for option in options:
+        if 'enum' in option:
+            match = ROUTE_MARKER.search(prompt_text)
+            if match and match.group(1) in option['enum']:
+                return match.group(1)
+            return option['enum'][-1]
+    if any(option.get('type') == 'string' for option in options):
+        return filler_text(tokens)
+    return None
+
+
+class mock_profile:
+    """Latency model of the stand-in server."""
+
+    def __init__(self, name: str = 'fast', **overrides):
+        settings = dict(PROFILES[name])
+        settings.update({key: value for key, value in overrides.items() if value is not None})
+        self.name = name
+        self.__dict__.update(settings)
+
+    def delays(self) -> tuple:
+        """Return (time to first token, seconds per token) for one request."""
+        factor = 1.0 + random.uniform(-self.jitter, self.jitter)
+        if self.tail_rate and random.random() < self.tail_rate:
+            factor *= 10
+        per_token = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        return self.ttft * factor, per_token * factor
+
+
+class mock_handler(BaseHTTPRequestHandler):
+    """Handler for the OpenAI chat completions endpoint."""
+
+    protocol_version = 'HTTP/1.1'
+    # small writes (headers, SSE chunks) must not wait for delayed ACKs
+    disable_nagle_algorithm = True
+    profile = mock_profile()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_json(404, {'error': {'message': f'unknown path {self.path}'}})
+            return
+
+        prompt_text = '\n'.join(str(message.get('content', '')) for message in request.get('messages', []))
+        completion_tokens = self.profile.completion_tokens
+        ttft, per_token = self.profile.delays()
+
+        response_format = request.get('response_format') or {}
+        if response_format.get('type') == 'json_schema':
+            schema = response_format['json_schema']['schema']
+            content = json.dumps({
+                name: schema_value(name, prop, prompt_text, completion_tokens)
+                for name, prop in schema.get('properties', {}).items()
+            })
+        else:
+            content = filler_text(completion_tokens)
+
+        usage = {
+            'prompt_tokens': estimate_tokens(prompt_text),
+            'completion_tokens': completion_tokens,
+            'total_tokens': estimate_tokens(prompt_text) + completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': min(cached_prefix_tokens(request.get('messages', [])), estimate_tokens(prompt_text))},
+        }
+        model = request.get('model', 'mock')
+
+        time.sleep(ttft)
+        if request.get('stream'):
+            self.stream_response(model, content, usage, per_token, request.get('stream_options') or {})
+        else:
+            time.sleep(per_token * completion_tokens)
+            self.send_json(200, {
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': usage,
+            })
+
+    def send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_response(self, model: str, content: str, usage: dict, per_token: float, stream_options: dict):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send_event(payload):
+            data = f'data: {payload}\n\n'.encode('utf-8')
+            self.wfile.write(f'{len(data):X}\r\n'.encode('ascii') + data + b'\r\n')
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None, chunk_usage=None, choices=True):
+            return json.dumps({
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}] if choices else [],
+                'usage': chunk_usage,
+            })
+
+        for index, word in enumerate(content.split(' ')):
+            time.sleep(per_token)
+            send_event(chunk({'content': word if index == 0 else ' ' + word}))
+        send_event(chunk({}, finish_reason='stop'))
+        if stream_options.get('include_usage'):
+            send_event(chunk({}, chunk_usage=usage, choices=False))
+        send_event('[DONE]')
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+
+def start_server(port: int = 0, profile: mock_profile = None):
+    """Start the server on a background thread; returns (server, base_url)."""
+    handler = type('profiled_mock_handler', (mock_handler,), {'profile': profile or mock_profile()})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='mock-openai-server', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI-compatible mock server with configurable latency.')
+    parser.add_argument('--port', type=int, default=8999)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='fast')
+    parser.add_argument('--ttft', type=float, default=None, help='override time to first token (s)')
+    parser.add_argument('--tokens-per-second', type=float, default=None, help='override generation rate')
+    parser.add_argument('--completion-tokens', type=int, default=None, help='override completion length')
+    args = parser.parse_args()
+
+    profile = mock_profile(args.profile, ttft=args.ttft, tokens_per_second=args.tokens_per_second, completion_tokens=args.completion_tokens)
+    server, base_url = start_server(args.port, profile)
+    print(f'Mock OpenAI server ({profile.name}) at {base_url}; set open_router_base_url={base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
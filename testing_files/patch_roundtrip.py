@@ -0,0 +1,72 @@
+"""
+Round-trip check of the unified diffs accepted by patching.py.
+
+Makes random line edits (insertions, deletions, replacements) to source
+files, writes the difflib unified diff of each edit, without context (so a
+pure insertion is a `@@ -N,0 +M,k @@` hunk) and with the usual three lines,
+and checks that apply_patch turns the original into the edited code.
+
+Run from the project root (defaults to the project's own Python files):
+    python -m testing_files.patch_roundtrip [files...]
+"""
+
+import argparse
+import difflib
+import random
+import sys
+from pathlib import Path
+
+from patching import apply_patch, patch_error
+
+
+CONTEXTS = (0, 3)
+
+
+def edit(lines: list, rng: random.Random) -> list:
+    """The lines with one to three random insertions, deletions or replacements."""
+    lines = list(lines)
+    for _ in range(rng.randint(1, 3)):
+        kind = rng.choice(('insert', 'delete', 'replace'))
+        index = rng.randint(0, len(lines))
+        added = [f'inserted_{rng.randrange(10 ** 6)} = {line}' for line in range(rng.randint(1, 3))]
+        if kind == 'insert' or index == len(lines):
+            lines[index:index] = added
+        elif kind == 'delete':
+            del lines[index:index + rng.randint(1, 3)]
+        else:
+            lines[index:index + rng.randint(1, 3)] = added
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that apply_patch applies unified diffs of random edits.')
+    parser.add_argument('files', nargs='*', help='files to edit (default: the *.py files of the project)')
+    parser.add_argument('--edits', type=int, default=20, help='random edits per file')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    files = [Path(name) for name in args.files] or sorted(Path('.').rglob('*.py'))
+    checked = failures = 0
+    for path in files:
+        code = path.read_text(encoding='utf-8')
+        lines = code.split('\n')
+        for _ in range(args.edits):
+            edited = edit(lines, rng)
+            for context in CONTEXTS:
+                patch = '\n'.join(difflib.unified_diff(lines, edited, 'a', 'b', n=context, lineterm=''))
+                checked += 1
+                try:
+                    result = apply_patch(code, patch)
+                except patch_error as error:
+                    result = f'patch_error: {error}'
+                if result != '\n'.join(edited):
+                    failures += 1
+                    print(f'{path} with {context} context lines: the diff does not round-trip\n{patch}\n')
+
+    print(f'{checked} diffs checked, {failures} failures')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Cold-start timings of the IntelliCode-SL app.
+
+Every stage runs in a fresh interpreter, so nothing is already imported:
+the UI modules main.py needs for its first paint, the workflow import (the
+LLM stack, clients and graph compilation), and the first full script run of
+main.py under Streamlit's AppTest (the time until the page is rendered).
+
+Run from the project root:
+    python -m testing_files.startup_time --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+STAGES = {
+    'streamlit': 'import streamlit',
+    'ui modules': 'import streamlit, streamlit_ace, code_utils, styles.components, job_runner',
+    'workflow import': 'import workflow',
+    'workflow import + graph': 'import workflow; workflow.workflow',
+    'main.py first render': "from streamlit.testing.v1 import AppTest; AppTest.from_file('main.py', default_timeout=60).run()",
+}
+
+TIMER = '''
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+'''
+
+
+def time_stage(statement: str) -> float:
+    """Seconds a statement takes in a fresh interpreter."""
+    env = dict(os.environ)
+    env.setdefault('open_router_api', 'startup-timing')
+    env['transport_prewarm'] = 'false'
+    result = subprocess.run(
+        [sys.executable, '-c', TIMER.format(statement=statement)],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold-start import and first-render times.')
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters per stage')
+    parser.add_argument('--stage', action='append', choices=sorted(STAGES), help='only time these stages')
+    args = parser.parse_args()
+
+    print(f"{'stage':<28}{'median s':>10}{'min s':>10}{'max s':>10}")
+    for name, statement in STAGES.items():
+        if args.stage and name not in args.stage:
+            continue
+        samples = [time_stage(statement) for _ in range(args.runs)]
+        print(f'{name:<28}{statistics.median(samples):>10.3f}{min(samples):>10.3f}{max(samples):>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
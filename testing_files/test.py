@@ -1,4 +1,5 @@
 from workflow import workflow
+from code_utils import strip_code_fences
 
 initial_state = {
             'prompt': 'modify this code to a fucntion ' ,
@@ -32,16 +33,7 @@ modified_code = final_state.get('modified_code', None)
 # If workflow returned modified code, update the editor
 if modified_code is not None and modified_code.strip():
     # Strip markdown code blocks if LLM wrapped code in ```
-    cleaned_code = modified_code.strip()
-    if cleaned_code.startswith('```'):
-        lines = cleaned_code.split('\n')
-        # Remove first line if it's ```python or similar
-        if lines[0].startswith('```'):
-            lines = lines[1:]
-        # Remove last line if it's ```
-        if lines and lines[-1].strip() == '```':
-            lines = lines[:-1]
-        cleaned_code = '\n'.join(lines)
+    cleaned_code = strip_code_fences(modified_code)
 
     # Update the code in editor
     # st.session_state.code_content = cleaned_code
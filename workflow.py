@@ -1,12 +1,35 @@
 ## IMPORTING THE NEEDED LIBRARIES
 
 from langgraph.graph import StateGraph, START, END
-from langchain_core.messages import BaseMessage
-from typing import TypedDict, Literal,Optional
-from openai import OpenAI
+from langgraph.config import get_stream_writer
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
+from typing import TypedDict, Literal,Optional,Annotated
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from llm_transport import node_timeout
+from model_registry import registry_from_config, model_key
+from llm_scheduler import scheduler_from_config
+from llm_hedging import hedging_from_config
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
+from intent_classifier import intent_classifier, load_samples, log_intent, has_input_code
+from llm_cache import llm_cache, cache_key
+from semantic_cache import semantic_cache, answer_similarity
+from single_flight import coalesced_workflow
+from run_checkpoints import sqlite_checkpointer
+from patching import apply_patch, patch_error
+from change_summary import diff_facts, is_small_change, format_summary
+from chunking import estimate_tokens, split_code, outline, code_preview, assemble_code
+from conversation_memory import chat_messages, context_tokens, history_tokens, select_turns, summary_text, summary_message, local_summary, format_turns
+from metrics import call_record, merge_metadata, observe_call, observe_node, register_collector
+import workflow_config as config
+import asyncio
+import functools
+import json
 import os
+import threading
+import time
 
 
 
@@ -17,14 +40,355 @@ import os
 load_dotenv()
 open_router_api=os.getenv('open_router_api')
 
-# validation 
-model=OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=open_router_api,
-)
-
-
-
+# endpoint, model and generation parameters of every node (config.default_model unless overridden in config.node_models);
+# each endpoint has a sync client (workflow.invoke) and an async one (workflow.ainvoke / workflow.astream) on a pooled
+# keep-alive transport with per-node timeouts and bounded retries, see model_registry.py and llm_transport.py
+models=registry_from_config(open_router_api)
+
+# process-wide admission of the API calls: per-model rate limits and concurrency, interactive calls before batch ones,
+# shedding of calls which wait too long (see llm_scheduler.py)
+scheduler=scheduler_from_config()
+
+# optional hedging of the non-streamed node calls: a call slower than its node's learned percentile deadline is sent
+# again (to the same or an alternate model) and the first answer wins, within a budget (see llm_hedging.py)
+hedger=hedging_from_config(models) if config.hedge_enabled else None
+
+# opening the connections to the endpoints in use ahead of the first request
+if config.transport_prewarm:
+    models.prewarm()
+
+# the same for the async clients, whose connections belong to one event loop: the server and the batch runner await it
+# on the loop of their runs before the first one
+async def aprewarm_transport ():
+    if config.transport_prewarm:
+        await models.aprewarm()
+
+# version of the prompt templates below; bump it whenever a template changes so cached responses are not reused
+prompt_version="2"
+
+# cache for the responses of the node calls (memory LRU in front of SQLite)
+response_cache=llm_cache(
+    path=config.cache_path or None,
+    max_memory_entries=config.cache_memory_entries,
+    max_disk_entries=config.cache_disk_entries,
+    ttl_seconds=config.cache_ttl_seconds,
+) if config.cache_enabled else None
+
+if response_cache is not None:
+    register_collector('intellicode_cache_events_total','Response cache lookups and writes.','counter',lambda: dict(response_cache.stats))
+
+# near-duplicate cache of final answers, looked up after the classifier (see semantic_lookup)
+semantic_index=semantic_cache(
+    max_entries=config.semantic_cache_entries,
+    prompt_threshold=config.semantic_prompt_threshold,
+    code_threshold=config.semantic_code_threshold,
+    audit_log=config.semantic_cache_audit_log,
+) if config.semantic_cache_enabled else None
+
+if semantic_index is not None:
+    register_collector('intellicode_semantic_cache_total','Semantic cache hits (served), misses, audit samples, writes, evictions and audited false hits.','counter',lambda: dict(semantic_index.stats))
+
+# checkpoints of the runs of durable_workflow, saved after every node so a failed run resumes at the failed node
+# instead of paying for the completed ones again (see run_checkpoints.py)
+checkpoints=sqlite_checkpointer(
+    config.checkpoint_path,
+    ttl_seconds=config.checkpoint_ttl_seconds,
+    max_runs=config.checkpoint_max_runs,
+) if config.checkpoint_enabled else None
+
+if checkpoints is not None:
+    register_collector('intellicode_checkpoints_total','Run checkpoints written, runs deleted after finishing and runs expired unfinished.','counter',lambda: dict(checkpoints.stats))
+
+# local classifier which answers confident task classifications in-process, before falling back to the LLM
+local_classifier=intent_classifier(load_samples(config.intent_training_data))
+
+
+
+
+## DEFINING THE HELPERS WHICH MAKE THE LLM CALLS
+
+# the chat messages of a call: the stable prefix of the prompt (system message, input code, see prompt_messages),
+# the previous turns of the conversation if any, then the node instruction
+def call_messages (prompt:list, history:list=()):
+    return [*prompt[:-1],*history,prompt[-1]]
+
+# the previous turns (state['messeges']) sent with the calls of the nodes listed in config.memory_nodes
+def conversation (node:str, state):
+    if node not in config.memory_nodes or not state.get('messeges'):
+        return []
+    return chat_messages(state['messeges'])
+
+# records (metrics.call_record) of the calls made in the current context are appended here while it is set;
+# set by the graph nodes (see node) and around speculative workers
+call_records=ContextVar('call_records',default=None)
+
+# set while a node runs speculatively, next to the classifier
+speculating=ContextVar('speculating',default=False)
+
+# accounts one call of a node: process-wide metrics plus the records of the running node
+def record_call (node:str, route:dict, started:float, usage=None, cached:bool=False):
+    record=call_record(node,route['model'],started,usage,cached)
+    observe_call(record)
+    sink=call_records.get()
+    if sink is not None:
+        sink.append(record)
+
+# a request opts out of the response cache with use_cache=False (e.g. when it wants fresh, non-deterministic output)
+def cache_lookup (node:str, route:dict, state, messages):
+    if response_cache is None or state.get('use_cache') is False:
+        return None, None
+    key=cache_key(node,model_key(route),prompt_version,messages)
+    return key, response_cache.get(key)
+
+# async counterpart of cache_lookup; the SQLite tier is read on a worker thread, off the event loop
+async def acache_lookup (node:str, route:dict, state, messages):
+    if response_cache is None or state.get('use_cache') is False:
+        return None, None
+    key=cache_key(node,model_key(route),prompt_version,messages)
+    return key, await response_cache.aget(key)
+
+# cached values are JSON, holding the text or the dumped schema object
+def encode_response (response):
+    if isinstance(response, BaseModel):
+        return json.dumps({'parsed':response.model_dump()})
+    return json.dumps({'text':response})
+
+def decode_response (value:str, response_format=None):
+    data=json.loads(value)
+    if response_format is not None:
+        return response_format.model_validate(data['parsed'])
+    return data['text']
+
+# runs the request of a node call through the hedging policy when it is enabled; (response, route which answered)
+def hedged_call (node:str, route:dict, request):
+    if hedger is None:
+        return request(route,threading.Event()), route
+    return hedger.call(node,route,request)
+
+async def ahedged_call (node:str, route:dict, request):
+    if hedger is None:
+        return await request(route,asyncio.Event()), route
+    return await hedger.acall(node,route,request)
+
+# sends the prompt messages of a node (see prompt_messages) to the model; returns the parsed schema object when a response_format is given, else the text
+def llm_call (node:str, state, prompt:list, response_format=None):
+    messages=call_messages(prompt,conversation(node,state))
+    route=models.route(node)
+    started=time.perf_counter()
+
+    key,cached=cache_lookup(node,route,state,messages)
+    if cached is not None:
+        record_call(node,route,started,cached=True)
+        return decode_response(cached,response_format)
+
+    # one attempt on a route; sent is set once the scheduler admitted it, so only calls at the provider are hedged;
+    # every attempt records its own usage, so a hedge which lost still counts in the metrics (and in the run's
+    # metadata when it returned before the node finished)
+    def request (route:dict, sent):
+        attempt=time.perf_counter()
+        with scheduler.admit(route,messages,state.get('priority')) as admitted:
+            sent.set()
+            if response_format is None:
+                completion = models.client(route).chat.completions.create(model=route['model'], messages=messages, timeout=node_timeout(node), **route['params'])
+            else:
+                completion = models.client(route).beta.chat.completions.parse(model=route['model'], messages=messages, response_format=response_format, timeout=node_timeout(node), **route['params'])
+            admitted.usage=completion.usage
+        record_call(node,route,attempt,completion.usage)
+        return completion
+
+    completion,route=hedged_call(node,route,request)
+    response=completion.choices[0].message.content if response_format is None else completion.choices[0].message.parsed
+
+    # keyed by the route which answered: the answer of a hedge's alternate model is not cached as the primary model's
+    if key is not None and response is not None:
+        response_cache.set(cache_key(node,model_key(route),prompt_version,messages),encode_response(response))
+    return response
+
+# async counterpart of llm_call, so many requests can share one event loop instead of one thread each
+async def allm_call (node:str, state, prompt:list, response_format=None):
+    messages=call_messages(prompt,conversation(node,state))
+    route=models.route(node)
+    started=time.perf_counter()
+
+    key,cached=await acache_lookup(node,route,state,messages)
+    if cached is not None:
+        record_call(node,route,started,cached=True)
+        return decode_response(cached,response_format)
+
+    async def request (route:dict, sent):
+        attempt=time.perf_counter()
+        async with scheduler.admit(route,messages,state.get('priority')) as admitted:
+            sent.set()
+            try:
+                if response_format is None:
+                    completion = await models.aclient(route).chat.completions.create(model=route['model'], messages=messages, timeout=node_timeout(node), **route['params'])
+                else:
+                    completion = await models.aclient(route).beta.chat.completions.parse(model=route['model'], messages=messages, response_format=response_format, timeout=node_timeout(node), **route['params'])
+            except asyncio.CancelledError:
+                # the losing attempt of a hedge is cancelled at the provider; the call counts, its tokens are unknown
+                record_call(node,route,attempt)
+                raise
+            admitted.usage=completion.usage
+        record_call(node,route,attempt,completion.usage)
+        return completion
+
+    completion,route=await ahedged_call(node,route,request)
+    response=completion.choices[0].message.content if response_format is None else completion.choices[0].message.parsed
+
+    if key is not None and response is not None:
+        await response_cache.aset(cache_key(node,model_key(route),prompt_version,messages),encode_response(response))
+    return response
+
+
+# forwards streamed tokens to LangGraph's custom stream (workflow.stream(..., stream_mode='custom')); a no-op outside a graph run
+def token_writer ():
+    # speculative calls are not shown to the user, the result may still be discarded
+    if speculating.get():
+        return lambda chunk: None
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda chunk: None
+
+# streaming variant of llm_call for the nodes whose text is shown to the user; every delta is written as {'node','token'}
+def llm_stream (node:str, state, prompt:list):
+    messages=call_messages(prompt,conversation(node,state))
+    route=models.route(node)
+    write=token_writer()
+    started=time.perf_counter()
+
+    key,cached=cache_lookup(node,route,state,messages)
+    if cached is not None:
+        record_call(node,route,started,cached=True)
+        response=decode_response(cached)
+        write({'node':node,'token':response})
+        return response
+
+    with scheduler.admit(route,messages,state.get('priority')) as admitted:
+        stream = models.client(route).chat.completions.create(model=route['model'], messages=messages, stream=True, stream_options={"include_usage": True}, timeout=node_timeout(node), **route['params'])
+        parts=[]
+        usage=None
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                token=chunk.choices[0].delta.content
+                parts.append(token)
+                write({'node':node,'token':token})
+            if chunk.usage is not None:
+                usage=chunk.usage
+        admitted.usage=usage
+    response=''.join(parts)
+    record_call(node,route,started,usage)
+
+    if key is not None:
+        response_cache.set(key,encode_response(response))
+    return response
+
+# async counterpart of llm_stream
+async def allm_stream (node:str, state, prompt:list):
+    messages=call_messages(prompt,conversation(node,state))
+    route=models.route(node)
+    write=token_writer()
+    started=time.perf_counter()
+
+    key,cached=await acache_lookup(node,route,state,messages)
+    if cached is not None:
+        record_call(node,route,started,cached=True)
+        response=decode_response(cached)
+        write({'node':node,'token':response})
+        return response
+
+    async with scheduler.admit(route,messages,state.get('priority')) as admitted:
+        stream = await models.aclient(route).chat.completions.create(model=route['model'], messages=messages, stream=True, stream_options={"include_usage": True}, timeout=node_timeout(node), **route['params'])
+        parts=[]
+        usage=None
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                token=chunk.choices[0].delta.content
+                parts.append(token)
+                write({'node':node,'token':token})
+            if chunk.usage is not None:
+                usage=chunk.usage
+        admitted.usage=usage
+    response=''.join(parts)
+    record_call(node,route,started,usage)
+
+    if key is not None:
+        await response_cache.aset(key,encode_response(response))
+    return response
+
+
+# pre-flight for the chunked map-reduce path: the chunks of input code above the token threshold, None for the direct path
+def input_chunks (state):
+    code=state.get('input_code')
+    if not has_input_code(code) or estimate_tokens(code)<=config.chunk_threshold_tokens:
+        return None
+    return split_code(code,config.chunk_max_tokens)
+
+# threads running the sync chunk calls (shared by all requests, so it also caps their concurrency)
+chunk_pool=ThreadPoolExecutor(max_workers=config.chunk_concurrency,thread_name_prefix='chunk')
+
+# map step: one call per chunk prompt, run concurrently; results keep the chunk order
+def map_chunks (node:str, state, prompts:list, response_format=None):
+    if len(prompts)==1:
+        return [llm_call(node,state,prompts[0],response_format)]
+    futures=[chunk_pool.submit(copy_context().run,llm_call,node,state,prompt,response_format) for prompt in prompts]
+    return [future.result() for future in futures]
+
+async def amap_chunks (node:str, state, prompts:list, response_format=None):
+    if len(prompts)==1:
+        return [await allm_call(node,state,prompts[0],response_format)]
+    limit=asyncio.Semaphore(config.chunk_concurrency)
+
+    async def one (prompt):
+        async with limit:
+            return await allm_call(node,state,prompt,response_format)
+
+    return list(await asyncio.gather(*(one(prompt) for prompt in prompts)))
+
+
+# patch mode of debug_code: output tokens scale with the size of the fix instead of the size of the code
+patch_stats={'applied':0,'fallbacks':0}
+patch_lock=threading.Lock()
+
+register_collector('intellicode_debug_patches_total','debug_code patches applied locally or regenerated in full.','counter',lambda: dict(patch_stats))
+
+def use_patches (state):
+    code=state.get('input_code')
+    return config.debug_output_mode=='patch' and has_input_code(code) and estimate_tokens(code)>=config.patch_min_tokens
+
+# applying the patch answers to their sources; None marks a source whose patch did not apply and needs a full regeneration
+def apply_patches (sources:list, patches:list):
+    results=[]
+    for source,patch in zip(sources,patches):
+        try:
+            results.append(apply_patch(source,patch))
+            outcome='applied'
+        except patch_error:
+            results.append(None)
+            outcome='fallbacks'
+        with patch_lock:
+            patch_stats[outcome]+=1
+    return results
+
+
+# conversation memory: the previous turns sent per request stay under config.memory_budget_tokens;
+# history tokens are what a user re-pasting the whole earlier conversation would send instead
+memory_stats={'turns':0,'compactions':0,'history_tokens':0,'context_tokens':0,'saved_tokens':0}
+memory_lock=threading.Lock()
+
+register_collector('intellicode_memory_total','Conversation memory compactions and the history tokens sent or saved per request.','counter',lambda: dict(memory_stats))
+
+# the compacted history for the state and this turn's memory entry of the run metadata
+def memory_update (history:list, messages:list, compacted:bool):
+    usage={'history_tokens':history_tokens(history),'context_tokens':context_tokens(messages),'compacted':compacted}
+    usage['saved_tokens']=usage['history_tokens']-usage['context_tokens']
+    if history:
+        with memory_lock:
+            memory_stats['turns']+=1
+            memory_stats['compactions']+=compacted
+            for key in ('history_tokens','context_tokens','saved_tokens'):
+                memory_stats[key]+=usage[key]
+    return {'messeges':messages,'metadata':{'memory':usage}}
 
 ## DEFINING SCHEMAS FOR VARIOUS LLM/SLM POMPTS
 
@@ -37,6 +401,11 @@ class unknown_node_schema(BaseModel):
     summary: str= Field(description='Point-wise brief response explaining the action taken for prompts that do not fit any predefined category.')
     modified_code : Optional[str] = Field(default=None, description='The final modified code produced by the node, containing only the corrected or generated code.')
 
+# defining the schema for the fused worker nodes which return the code and its summary in a single call
+class fused_worker_schema(BaseModel):
+    summary: str= Field(description='Point-wise brief summary of the work done, in the same style as the separate summary nodes.')
+    modified_code : str = Field(description='The final code or document produced by the node, containing only the raw content.')
+
 
 
 ## DEFINING THE STATE FOR THE WORKFLOW
@@ -51,11 +420,12 @@ class intellicode_state( TypedDict):
     prompt:str
     input_code: Optional[str] 
 
-    # context
+    # context: previous turns of the conversation, led by the rolling summary of the older ones (see conversation_memory.py)
     messeges: list[BaseMessage]
 
     # Routing and task info
     task_type: task_type
+    speculated_task: Optional[str]
     task_output: Optional[str]
     change_summary: Optional[str]
 
@@ -63,16 +433,42 @@ class intellicode_state( TypedDict):
     final_answer: Optional[str]
     modified_code: Optional[str]
 
-    # metasdata (left empty for future additions)
+    # request options
+    use_cache: Optional[bool]
+    # scheduling priority of the request's LLM calls: 'interactive' (the default) or 'batch' (see llm_scheduler.py)
+    priority: Optional[str]
 
+    # outcome of the semantic cache lookup: {'hit', similarities} or the audited match (see semantic_lookup)
+    semantic_cache: Optional[dict]
 
+    # metadata: per-node wall time, tokens, model and estimated cost of the run (merged across nodes, see metrics.py)
+    metadata: Annotated[dict, merge_metadata]
 
 
-## DEFINING THE FUNTIONS FOR ALL THE NODES OF THE WORKFLOW
 
-# Defining the task_classifier function to classify the prompt into various catergories
-def task_classifier (state:intellicode_state):
-    prompt = f"""You are a coding-assistant classifier.
+
+## DEFINING THE PROMPTS FOR ALL THE NODES OF THE WORKFLOW
+# every call is laid out for provider-side prompt caching (and KV reuse on local servers): the same system message
+# first, then the code the request works on as its own message, identical for every node of a request which reads
+# it, and only then the node's instruction with the variable parts (user prompt, intermediate results)
+
+# stable system message shared by every call of every request
+system_prompt="""You are a coding assistant.
+When the user has code in the editor, it is given as the input code in the message before your task.
+Follow the instructions of the task exactly and output only what they ask for."""
+
+# chat messages of one node call: system message, input code (when there is any), node instruction
+def prompt_messages (instruction:str, code:Optional[str]=None):
+    messages=[{"role": "system", "content": system_prompt}]
+    if has_input_code(code):
+        messages.append({"role": "user", "content": f'Input code:\n"""{code}"""'})
+    messages.append({"role": "user", "content": instruction})
+    return messages
+
+# building the prompt for the task_classifier node
+# the classifier only sees the start of large code; small code is the same prefix the worker sends next
+def task_classifier_prompt (state:intellicode_state):
+    return prompt_messages(f"""You are a coding-assistant classifier.
 Your job is to classify the user's request into one of the following five categories:
 
 1. explain — The user wants an explanation of the given input code.
@@ -83,76 +479,33 @@ Your job is to classify the user's request into one of the following five catego
    - The request is coding-related but does not fit any category above, OR
    - The request is not related to coding.
 
-Use the prompt below and the provided input code as context.
+Use the prompt below and the provided input code (if any) as context.
 
 User prompt:
 \"\"\"{state['prompt']}\"\"\"
 
-Input code:
-\"\"\"{state['input_code']}\"\"\"
-
 Return only one word: explain, debug, write, docs, or other.
-"""
-
-    completion = model.beta.chat.completions.parse(
-
-    model="x-ai/grok-4.1-fast",
-    messages=[
-        {
-        "role": "user",
-        "content": prompt
-        }
-    ],
-    response_format=task_classifier_schema,
-    )
+""",code_preview(state['input_code'],config.classifier_code_tokens))
 
-    task_type=completion.choices[0].message.parsed.task_type
-    
-    return {'task_type':task_type}
-
-# defining the function which handles the explaination node of the workflow
-def explain_slm (state:intellicode_state):
-    prompt = f"""You are a coding assistant. 
-Your task is to **explain the given input code** in a clear, concise, and point-wise format.
+# building the prompt for the explain_slm node
+def explain_slm_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to **explain the given input code** in a clear, concise, and point-wise format.
 Do NOT rewrite the code. Do NOT add unnecessary details.
 Produce a brief, easy-to-understand list of points describing what the code does.
 
 User prompt:
 \"\"\"{state['prompt']}\"\"\"
 
-Input code:
-\"\"\"{state['input_code']}\"\"\"
-
 Now explain the code in a numbered point-wise format.
-"""
+""",state['input_code'])
 
-
-    completion = model.chat.completions.create(
-    
-    model="x-ai/grok-4.1-fast",
-    messages=[
-        {
-        "role": "user",
-        "content": prompt
-        }
-    ]
-    )
-    # extracting the content
-
-    explain=completion.choices[0].message.content
-    return {'change_summary':explain}
-
-# defining the function which handles the debuggin of the code
-def debug_code (state:intellicode_state):
-    prompt = f"""You are a coding assistant.
-Your task is to debug the given input code.
+# building the prompt for the debug_code node
+def debug_code_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to debug the given input code.
 
 - Read the user's prompt:
 \"\"\"{state['prompt']}\"\"\"
 
-- Read the input code:
-\"\"\"{state['input_code']}\"\"\"
-
 Fix all bugs, errors, and issues in the code.
 Improve correctness ONLY—do not change logic unless required to fix an error.
 
@@ -160,34 +513,43 @@ IMPORTANT:
 Output **only** the fully corrected code.
 Do NOT include explanations, comments, or markdown formatting.
 Return raw code only.
-"""
+""",state['input_code'])
 
-    completion = model.chat.completions.create(
-    
-    model="x-ai/grok-4.1-fast",
-    messages=[
-        {
-        "role": "user",
-        "content": prompt
-        }
-    ]
-    )
-    # extracting the content
-
-    code=completion.choices[0].message.content
-    return {'modified_code':code}
+# building the prompt for the debug_code node in patch mode, which asks only for the edits
+def debug_patch_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to debug the given input code.
 
-# defining the fuction for the node which handles the response of debugging the code
-def debug_summary (state:intellicode_state):
-    prompt = f"""You are a coding assistant.
-Your task is to generate a brief, point-wise summary of the changes made during debugging.
+- Read the user's prompt:
+\"\"\"{state['prompt']}\"\"\"
+
+Fix all bugs, errors, and issues in the code.
+Improve correctness ONLY—do not change logic unless required to fix an error.
+
+IMPORTANT:
+Do NOT output the whole code. Output only the edits, as one or more search/replace blocks:
+
+<<<<<<< SEARCH
+lines copied exactly from the input code
+=======
+the corrected lines
+>>>>>>> REPLACE
+
+- The SEARCH lines must match the input code exactly, including indentation, and occur only once in it;
+  add a neighbouring line when they are not unique.
+- Keep every block as small as possible.
+- If nothing needs to be fixed, output exactly: NO CHANGES
+Do NOT include explanations or markdown formatting.
+""",state['input_code'])
+
+# building the prompt for the debug_summary node
+# the original code is the cached prefix of the debug_code call, only the debugged code is new
+def debug_summary_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to generate a brief, point-wise summary of the changes made during debugging
+of the input code above.
 
 User prompt:
 \"\"\"{state['prompt']}\"\"\"
 
-Original input code:
-\"\"\"{state['input_code']}\"\"\"
-
 Debugged code (final corrected version):
 \"\"\"{state['modified_code']}\"\"\"
 
@@ -201,27 +563,11 @@ Focus only on meaningful modifications:
 Do NOT rewrite the code.
 Do NOT include extra explanations.
 Output only concise bullet points.
-"""
+""",state['input_code'])
 
-    completion = model.chat.completions.create(
-    
-    model="x-ai/grok-4.1-fast",
-    messages=[
-        {
-        "role": "user",
-        "content": prompt
-        }
-    ]
-    )
-    # extracting the content
-
-    summary=completion.choices[0].message.content
-    return {'change_summary':summary}
-
-# defining the function for the node which handles writing the code from scratch 
-def write_code (state: intellicode_state):
-    prompt = f"""You are a coding assistant.
-Your task is to write the required code from scratch based on the user's prompt.
+# building the prompt for the write_code node
+def write_code_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to write the required code from scratch based on the user's prompt.
 
 User prompt:
 \"\"\"{state['prompt']}\"\"\"
@@ -229,27 +575,11 @@ User prompt:
 Generate only the code that satisfies the request.
 Do NOT include explanations, comments, markdown, or any extra text.
 Output raw executable code only.
-"""
+""")
 
-    completion = model.chat.completions.create(
-    
-    model="x-ai/grok-4.1-fast",
-    messages=[
-        {
-        "role": "user",
-        "content": prompt
-        }
-    ]
-    )
-    # extracting the content
-
-    code=completion.choices[0].message.content
-    return {'modified_code':code}
-
-# defining the function which handles the node for writing summary about the code written from scratch
-def write_summary (state: intellicode_state):
-    prompt = f"""You are a coding assistant.
-Your task is to generate a brief, point-wise summary of the code that was written from scratch.
+# building the prompt for the write_summary node
+def write_summary_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to generate a brief, point-wise summary of the code that was written from scratch.
 
 User prompt:
 \"\"\"{state['prompt']}\"\"\"
@@ -261,58 +591,23 @@ Write a short, clear, point-wise summary explaining what the generated code does
 Do NOT rewrite the code.
 Do NOT include unnecessary details.
 Only describe the key functionality in concise bullet points.
-"""
+""")
 
-    completion = model.chat.completions.create(
-    
-    model="x-ai/grok-4.1-fast",
-    messages=[
-        {
-        "role": "user",
-        "content": prompt
-        }
-    ]
-    )
-    # extracting the content
-
-    summary=completion.choices[0].message.content
-    return {'change_summary':summary}
-
-# defining the function for the node which handles the writing of the documents for the code
-def docs_worker (state: intellicode_state):
-    prompt = f"""You are a coding assistant.
-Your task is to create the document requested by the user, using the provided code as context.
+# building the prompt for the docs_worker node
+def docs_worker_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to create the document requested by the user, using the input code above as context.
 
 User prompt:
 \"\"\"{state['prompt']}\"\"\"
 
-Input code (context):
-\"\"\"{state['input_code']}\"\"\"
-
 Generate the required document exactly as requested.
 Output only the document content.
 Do NOT include explanations, comments, markdown formatting, or any extra text.
-"""
+""",state['input_code'])
 
-    completion = model.chat.completions.create(
-    
-    model="x-ai/grok-4.1-fast",
-    messages=[
-        {
-        "role": "user",
-        "content": prompt
-        }
-    ]
-    )
-    # extracting the content
-
-    doc=completion.choices[0].message.content
-    return {'modified_code':doc}
-
-# defining the function for the node which handles wrting response for the document created 
-def docs_summary (state: intellicode_state):
-    prompt = f"""You are a coding assistant.
-Your task is to generate a brief, point-wise summary of the document that was created based on the user's request.
+# building the prompt for the docs_summary node
+def docs_summary_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to generate a brief, point-wise summary of the document that was created based on the user's request.
 
 User prompt:
 \"\"\"{state['prompt']}\"\"\"
@@ -328,27 +623,11 @@ Write a short, clear, point-wise summary explaining:
 Do NOT rewrite the document.
 Do NOT include unnecessary details.
 Output only concise bullet points.
-"""
-
-    completion = model.chat.completions.create(
-    
-    model="x-ai/grok-4.1-fast",
-    messages=[
-        {
-        "role": "user",
-        "content": prompt
-        }
-    ]
-    )
-    # extracting the content
-
-    summary=completion.choices[0].message.content
-    return {'change_summary':summary}
+""")
 
-# defining the function for the collator node which intake summary points from the nodes and create a refined response from the user
-def collator (state: intellicode_state):
-    prompt = f"""You are a coding assistant.
-Your task is to generate a refined, medium-length response for the user based on:
+# building the prompt for the collator node
+def collator_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to generate a refined, medium-length response for the user based on:
 1. the original user prompt
 2. the point-wise summary of the work done
 
@@ -365,27 +644,11 @@ Write a clear, polished response that:
 
 Do NOT include code unless the user explicitly asked for it.
 Output a refined answer only—no extra commentary.
-"""
+""")
 
-    completion = model.chat.completions.create(
-    
-    model="x-ai/grok-4.1-fast",
-    messages=[
-        {
-        "role": "user",
-        "content": prompt
-        }
-    ]
-    )
-    # extracting the content
-
-    final_answer=completion.choices[0].message.content
-    return {'final_answer':final_answer}
-
-# defining the function for the unknown node which handles prompt which are not in default catagories
-def unknown ( state: intellicode_state):
-    prompt = f"""You are a coding assistant.
-This node handles prompts that do not fit any predefined category. 
+# building the prompt for the unknown node
+def unknown_prompt (state:intellicode_state):
+    return prompt_messages(f"""This node handles prompts that do not fit any predefined category. 
 Your task is to produce output that matches the schema with the fields:
 - summary: a brief, point-wise explanation of how the request was handled
 - modified_code: optional, only include corrected or generated code if the user's prompt explicitly requires code
@@ -393,14 +656,13 @@ Your task is to produce output that matches the schema with the fields:
 User prompt:
 \"\"\"{state['prompt']}\"\"\"
 
-Input code (optional; may be null):
-\"\"\"{state['input_code']}\"\"\"
+The input code above is optional; there may be none.
 
 Generate output following these rules:
 
 1. **summary**  
    - Provide a short, clear, point-wise response addressing the user's request.  
-   - If input code is irrelevant or null, ignore it.  
+   - If input code is irrelevant or absent, ignore it.  
    - Keep the points concise and helpful.  
    - No unnecessary details or commentary.
 
@@ -414,25 +676,448 @@ Return your final output strictly in this JSON structure:
   "summary": "...",
   "modified_code": "..." or null
 }}
-"""
-
-    completion = model.beta.chat.completions.parse(
-
-    model="x-ai/grok-4.1-fast",
-    messages=[
-        {
-        "role": "user",
-        "content": prompt
-        }
-    ],
-    response_format=unknown_node_schema,
-    )
-
-    response=completion.choices[0].message.parsed
-    change_summary=response.summary
-    modified_code=response.modified_code
-    
-    return {'change_summary':change_summary,'modified_code': modified_code}
+""",state['input_code'])
+
+
+# building the prompt for the fused debug node (debug_code + debug_summary in one call)
+def debug_fused_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to debug the given input code and summarize the changes you made.
+
+User prompt:
+\"\"\"{state['prompt']}\"\"\"
+
+Generate output following these rules:
+
+1. **modified_code**
+   - Fix all bugs, errors, and issues in the code.
+   - Improve correctness ONLY—do not change logic unless required to fix an error.
+   - Return only the fully corrected raw code, without explanations or markdown formatting.
+
+2. **summary**
+   - A short, clear, point-wise summary describing exactly what was fixed, changed, or improved.
+   - Focus only on bug fixes, syntax corrections, logic corrections and improvements required for the code to run.
+   - Output only concise bullet points.
+
+Return your final output strictly in this JSON structure:
+
+{{
+  "summary": "...",
+  "modified_code": "..."
+}}
+""",state['input_code'])
+
+# building the prompt for the fused write node (write_code + write_summary in one call)
+def write_fused_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to write the required code from scratch based on the user's prompt and summarize it.
+
+User prompt:
+\"\"\"{state['prompt']}\"\"\"
+
+Generate output following these rules:
+
+1. **modified_code**
+   - Generate only the code that satisfies the request.
+   - Do NOT include explanations, comments, markdown, or any extra text.
+   - Return raw executable code only.
+
+2. **summary**
+   - A short, clear, point-wise summary explaining what the generated code does.
+   - Only describe the key functionality in concise bullet points.
+
+Return your final output strictly in this JSON structure:
+
+{{
+  "summary": "...",
+  "modified_code": "..."
+}}
+""")
+
+# building the prompt for the fused docs node (docs_worker + docs_summary in one call)
+def docs_fused_prompt (state:intellicode_state):
+    return prompt_messages(f"""Your task is to create the document requested by the user, using the input code above as context, and summarize it.
+
+User prompt:
+\"\"\"{state['prompt']}\"\"\"
+
+Generate output following these rules:
+
+1. **modified_code**
+   - Generate the required document exactly as requested.
+   - Return only the document content, without explanations or any extra text.
+
+2. **summary**
+   - A short, clear, point-wise summary explaining what the generated document contains and what was done to create it.
+   - Mention which file format the document should be saved in (e.g., .md, .txt, .pdf, .docx) based on the user's request.
+   - Output only concise bullet points.
+
+Return your final output strictly in this JSON structure:
+
+{{
+  "summary": "...",
+  "modified_code": "..."
+}}
+""",state['input_code'])
+
+
+# building the prompt for one chunk of a large input: the node's own prompt on the chunk, plus where the chunk sits in the file
+def chunk_prompt (builder, state:intellicode_state, chunk:str, index:int, total:int, file_outline:str):
+    messages=builder({**state,'input_code':chunk})
+    return messages[:-1]+[{"role": "user", "content": f"""{messages[-1]['content']}
+Note: the input code above is part {index} of {total} of a larger file, split at function/class boundaries.
+Handle only this part; the other parts are processed separately and combined afterwards.
+
+Top-level declarations of the whole file (context only):
+\"\"\"{file_outline}\"\"\"
+"""}]
+
+# building the prompts of all the chunks of a large input
+def chunk_prompts (builder, state:intellicode_state, chunks:list):
+    file_outline=outline(state['input_code'])
+    return [chunk_prompt(builder,state,chunk,index,len(chunks),file_outline) for index,chunk in enumerate(chunks,1)]
+
+# building the prompt which merges the partial explanations of a chunked input
+def explain_reduce_prompt (state:intellicode_state, parts:list):
+    sections='\n\n'.join(f'Part {index}:\n{part}' for index,part in enumerate(parts,1))
+    return prompt_messages(f"""A large input file was explained part by part. Your task is to merge the partial explanations below
+into one clear, concise, point-wise explanation of the whole code.
+Remove repetition, keep the order of the file, and do NOT add details that are not in the parts.
+
+User prompt:
+\"\"\"{state['prompt']}\"\"\"
+
+Partial explanations:
+\"\"\"{sections}\"\"\"
+
+Now explain the code in a numbered point-wise format.
+""")
+
+# building the prompt which merges the partial documents of a chunked input
+def docs_reduce_prompt (state:intellicode_state, parts:list):
+    sections='\n\n'.join(f'Part {index}:\n{part}' for index,part in enumerate(parts,1))
+    return prompt_messages(f"""A document was created part by part for a large input file. Your task is to merge the partial documents below
+into the single document requested by the user, with one consistent structure and no repeated sections.
+
+User prompt:
+\"\"\"{state['prompt']}\"\"\"
+
+Partial documents:
+\"\"\"{sections}\"\"\"
+
+Generate the required document exactly as requested.
+Output only the document content.
+Do NOT include explanations, comments, markdown formatting, or any extra text.
+""")
+
+# building the prompt which folds older turns of the conversation into its rolling summary
+def memory_summary_prompt (previous:str, turns:list):
+    return prompt_messages(f"""Your task is to update the running summary of a conversation between a user and a coding assistant.
+
+Current summary (may be empty):
+\"\"\"{previous}\"\"\"
+
+Older turns to add to the summary:
+\"\"\"{format_turns(turns)}\"\"\"
+
+Write the updated summary in at most {config.memory_summary_tokens*3//4} words.
+Keep what later requests may refer to: the user's goals and decisions, names of files, functions and variables,
+what was already explained or changed, and open questions.
+Output only the summary as concise bullet points.
+""")
+
+
+## DEFINING THE FUNTIONS FOR ALL THE NODES OF THE WORKFLOW
+# every node has a sync version (workflow.invoke) and an async version prefixed with 'a' (workflow.ainvoke / workflow.astream)
+
+# defining the memory node which keeps the previous turns of the conversation under the token budget
+# over the budget, the older turns are folded into the rolling summary by a model call or by local truncation
+def memory (state:intellicode_state):
+    history=state.get('messeges') or []
+    plan=select_turns(history,config.memory_budget_tokens,config.memory_recent_tokens)
+    if plan is None:
+        return memory_update(history,history,False)
+    summary,folded,kept=plan
+    if config.memory_summary_mode=='llm':
+        text=llm_call('memory',state,memory_summary_prompt(summary_text(summary),folded))
+    else:
+        text=local_summary(summary_text(summary),folded,config.memory_summary_tokens)
+    return memory_update(history,[summary_message(text,summary,folded,config.memory_summary_tokens)]+kept,True)
+
+async def amemory (state:intellicode_state):
+    history=state.get('messeges') or []
+    plan=select_turns(history,config.memory_budget_tokens,config.memory_recent_tokens)
+    if plan is None:
+        return memory_update(history,history,False)
+    summary,folded,kept=plan
+    if config.memory_summary_mode=='llm':
+        text=await allm_call('memory',state,memory_summary_prompt(summary_text(summary),folded))
+    else:
+        text=local_summary(summary_text(summary),folded,config.memory_summary_tokens)
+    return memory_update(history,[summary_message(text,summary,folded,config.memory_summary_tokens)]+kept,True)
+
+# Defining the task_classifier function to classify the prompt into various catergories
+# the local classifier answers first; only prompts below the confidence threshold pay for the LLM round-trip
+def local_task_type (state:intellicode_state):
+    task_type,confidence=local_classifier.predict(state['prompt'],state.get('input_code'))
+    if confidence>=config.intent_threshold:
+        return task_type
+    return None
+
+def task_classifier (state:intellicode_state):
+    task_type=local_task_type(state)
+    if task_type is not None:
+        return {'task_type':task_type}
+
+    response=llm_call('task_classifier',state,task_classifier_prompt(state),task_classifier_schema)
+    if config.intent_traffic_log:
+        log_intent(config.intent_traffic_log,state['prompt'],state.get('input_code'),response.task_type)
+    return {'task_type':response.task_type}
+
+async def atask_classifier (state:intellicode_state):
+    task_type=local_task_type(state)
+    if task_type is not None:
+        return {'task_type':task_type}
+
+    response=await allm_call('task_classifier',state,task_classifier_prompt(state),task_classifier_schema)
+    if config.intent_traffic_log:
+        log_intent(config.intent_traffic_log,state['prompt'],state.get('input_code'),response.task_type)
+    return {'task_type':response.task_type}
+
+# defining the function which handles the explaination node of the workflow
+# large inputs are explained chunk by chunk and the partial explanations merged (streamed) in a reduce call
+def explain_slm (state:intellicode_state):
+    chunks=input_chunks(state)
+    if chunks is None:
+        explain=llm_stream('explain_slm',state,explain_slm_prompt(state))
+    else:
+        parts=map_chunks('explain_slm',state,chunk_prompts(explain_slm_prompt,state,chunks))
+        explain=llm_stream('explain_slm',state,explain_reduce_prompt(state,parts))
+    return {'change_summary':explain}
+
+async def aexplain_slm (state:intellicode_state):
+    chunks=input_chunks(state)
+    if chunks is None:
+        explain=await allm_stream('explain_slm',state,explain_slm_prompt(state))
+    else:
+        parts=await amap_chunks('explain_slm',state,chunk_prompts(explain_slm_prompt,state,chunks))
+        explain=await allm_stream('explain_slm',state,explain_reduce_prompt(state,parts))
+    return {'change_summary':explain}
+
+# defining the function which handles the debuggin of the code
+# large inputs are debugged chunk by chunk; the corrected chunks are put back together in file order
+# in patch mode every part (the whole code or a chunk) is fixed with search/replace edits, falling back to its full regeneration
+def debug_prompts (builder, state:intellicode_state, chunks):
+    return [builder(state)] if chunks is None else chunk_prompts(builder,state,chunks)
+
+def debug_code (state:intellicode_state):
+    chunks=input_chunks(state)
+    if not use_patches(state):
+        parts=map_chunks('debug_code',state,debug_prompts(debug_code_prompt,state,chunks))
+        return {'modified_code':assemble_code(parts,chunks or [state['input_code']],range(len(parts)))}
+
+    parts=apply_patches(chunks or [state['input_code']],map_chunks('debug_code',state,debug_prompts(debug_patch_prompt,state,chunks)))
+    failed=[index for index,part in enumerate(parts) if part is None]
+    if failed:
+        prompts=debug_prompts(debug_code_prompt,state,chunks)
+        for index,part in zip(failed,map_chunks('debug_code',state,[prompts[index] for index in failed])):
+            parts[index]=part
+    return {'modified_code':assemble_code(parts,chunks or [state['input_code']],failed)}
+
+async def adebug_code (state:intellicode_state):
+    chunks=input_chunks(state)
+    if not use_patches(state):
+        parts=await amap_chunks('debug_code',state,debug_prompts(debug_code_prompt,state,chunks))
+        return {'modified_code':assemble_code(parts,chunks or [state['input_code']],range(len(parts)))}
+
+    parts=apply_patches(chunks or [state['input_code']],await amap_chunks('debug_code',state,debug_prompts(debug_patch_prompt,state,chunks)))
+    failed=[index for index,part in enumerate(parts) if part is None]
+    if failed:
+        prompts=debug_prompts(debug_code_prompt,state,chunks)
+        for index,part in zip(failed,await amap_chunks('debug_code',state,[prompts[index] for index in failed])):
+            parts[index]=part
+    return {'modified_code':assemble_code(parts,chunks or [state['input_code']],failed)}
+
+# defining the fuction for the node which handles the response of debugging the code
+# small or mechanical changes are described from a local diff of the code (see change_summary.py), skipping the LLM call
+debug_summary_stats={'local':0,'llm':0}
+debug_summary_lock=threading.Lock()
+
+register_collector('intellicode_debug_summaries_total','debug_summary answers written from the local diff or by the model.','counter',lambda: dict(debug_summary_stats))
+
+def local_debug_summary (state:intellicode_state):
+    summary=None
+    if config.debug_summary_mode!='llm':
+        facts=diff_facts(state['input_code'],state.get('modified_code'))
+        if config.debug_summary_mode=='local' or is_small_change(facts,config.debug_summary_local_lines):
+            summary=format_summary(facts)
+    with debug_summary_lock:
+        debug_summary_stats['llm' if summary is None else 'local']+=1
+    return summary
+
+def debug_summary (state:intellicode_state):
+    summary=local_debug_summary(state)
+    if summary is None:
+        summary=llm_call('debug_summary',state,debug_summary_prompt(state))
+    return {'change_summary':summary}
+
+async def adebug_summary (state:intellicode_state):
+    summary=local_debug_summary(state)
+    if summary is None:
+        summary=await allm_call('debug_summary',state,debug_summary_prompt(state))
+    return {'change_summary':summary}
+
+# defining the function for the node which handles writing the code from scratch 
+def write_code (state: intellicode_state):
+    code=llm_call('write_code',state,write_code_prompt(state))
+    return {'modified_code':code}
+
+async def awrite_code (state: intellicode_state):
+    code=await allm_call('write_code',state,write_code_prompt(state))
+    return {'modified_code':code}
+
+# defining the function which handles the node for writing summary about the code written from scratch
+def write_summary (state: intellicode_state):
+    summary=llm_call('write_summary',state,write_summary_prompt(state))
+    return {'change_summary':summary}
+
+async def awrite_summary (state: intellicode_state):
+    summary=await allm_call('write_summary',state,write_summary_prompt(state))
+    return {'change_summary':summary}
+
+# defining the function for the node which handles the writing of the documents for the code
+# large inputs are documented chunk by chunk and the partial documents merged in a reduce call
+def docs_worker (state: intellicode_state):
+    chunks=input_chunks(state)
+    if chunks is None:
+        doc=llm_call('docs_worker',state,docs_worker_prompt(state))
+    else:
+        parts=map_chunks('docs_worker',state,chunk_prompts(docs_worker_prompt,state,chunks))
+        doc=llm_call('docs_worker',state,docs_reduce_prompt(state,parts))
+    return {'modified_code':doc}
+
+async def adocs_worker (state: intellicode_state):
+    chunks=input_chunks(state)
+    if chunks is None:
+        doc=await allm_call('docs_worker',state,docs_worker_prompt(state))
+    else:
+        parts=await amap_chunks('docs_worker',state,chunk_prompts(docs_worker_prompt,state,chunks))
+        doc=await allm_call('docs_worker',state,docs_reduce_prompt(state,parts))
+    return {'modified_code':doc}
+
+# defining the function for the node which handles wrting response for the document created 
+def docs_summary (state: intellicode_state):
+    summary=llm_call('docs_summary',state,docs_summary_prompt(state))
+    return {'change_summary':summary}
+
+async def adocs_summary (state: intellicode_state):
+    summary=await allm_call('docs_summary',state,docs_summary_prompt(state))
+    return {'change_summary':summary}
+
+# defining the function for the collator node which intake summary points from the nodes and create a refined response from the user
+# the answered turn is added to the conversation, so the caller passes the returned messeges with its next request
+def next_turn (state: intellicode_state, final_answer:str):
+    return (state.get('messeges') or [])+[HumanMessage(content=state['prompt']),AIMessage(content=final_answer)]
+
+def collator (state: intellicode_state):
+    final_answer=llm_stream('collator',state,collator_prompt(state))
+    remember_answer(state,final_answer)
+    return {'final_answer':final_answer,'messeges':next_turn(state,final_answer)}
+
+async def acollator (state: intellicode_state):
+    final_answer=await allm_stream('collator',state,collator_prompt(state))
+    remember_answer(state,final_answer)
+    return {'final_answer':final_answer,'messeges':next_turn(state,final_answer)}
+
+# defining the semantic cache lookup, which answers a request from a near-duplicate earlier one after classification
+# (see semantic_cache.py); a sampled share of the hits is audited: the request runs as a miss and the collator
+# compares its answer with the cached one, logging a false hit when they differ
+def semantic_cacheable (state: intellicode_state):
+    return semantic_index is not None and state['task_type'] in config.semantic_cache_tasks and state.get('use_cache') is not False
+
+def semantic_lookup (state: intellicode_state):
+    if not semantic_cacheable(state):
+        return {}
+    match=semantic_index.lookup(state['task_type'],state['prompt'],state.get('input_code'),config.semantic_cache_audit_rate)
+    if match is None:
+        return {'semantic_cache':{'hit':False}}
+    if match['audit']:
+        return {'semantic_cache':{'hit':False,'audit':match}}
+    similarity={'prompt_similarity':match['prompt_similarity'],'code_similarity':match['code_similarity']}
+    semantic_index.audit({'event':'hit','task':state['task_type'],'prompt':state['prompt'],'cached_prompt':match['prompt'],**similarity})
+    final_answer=match['value']['final_answer']
+    token_writer()({'node':'semantic_lookup','token':final_answer})
+    return {**match['value'],'semantic_cache':{'hit':True,**similarity},'messeges':next_turn(state,final_answer)}
+
+async def asemantic_lookup (state: intellicode_state):
+    return semantic_lookup(state)
+
+# adding the answer of a finished run to the semantic cache, auditing the cached answer first when the lookup sampled it
+def remember_answer (state: intellicode_state, final_answer:str):
+    if not semantic_cacheable(state):
+        return
+    audited=(state.get('semantic_cache') or {}).get('audit')
+    if audited is not None:
+        similarity=answer_similarity(final_answer,audited['value']['final_answer'])
+        semantic_index.audit({
+            'event':'audit','task':state['task_type'],'prompt':state['prompt'],'cached_prompt':audited['prompt'],
+            'prompt_similarity':audited['prompt_similarity'],'code_similarity':audited['code_similarity'],
+            'answer_similarity':similarity,'verdict':'false_hit' if similarity<config.semantic_audit_threshold else 'hit',
+        })
+    semantic_index.store(state['task_type'],state['prompt'],state.get('input_code'),{
+        'final_answer':final_answer,'modified_code':state.get('modified_code'),'change_summary':state.get('change_summary'),
+    })
+
+# defining the function for the unknown node which handles prompt which are not in default catagories
+def unknown ( state: intellicode_state):
+    response=llm_call('unknown',state,unknown_prompt(state),unknown_node_schema)
+    return {'change_summary':response.summary,'modified_code': response.modified_code}
+
+async def aunknown ( state: intellicode_state):
+    response=await allm_call('unknown',state,unknown_prompt(state),unknown_node_schema)
+    return {'change_summary':response.summary,'modified_code': response.modified_code}
+# defining the fused worker nodes, each returning the code and its point-wise summary from a single structured call
+# with large inputs the fused nodes map over the chunks as well, joining the per-chunk code and summaries
+def debug_fused (state: intellicode_state):
+    chunks=input_chunks(state)
+    if chunks is None:
+        response=llm_call('debug_fused',state,debug_fused_prompt(state),fused_worker_schema)
+        return {'change_summary':response.summary,'modified_code': response.modified_code}
+    parts=map_chunks('debug_fused',state,chunk_prompts(debug_fused_prompt,state,chunks),fused_worker_schema)
+    return {'change_summary':'\n'.join(part.summary for part in parts),'modified_code': assemble_code([part.modified_code for part in parts],chunks,range(len(parts)))}
+
+async def adebug_fused (state: intellicode_state):
+    chunks=input_chunks(state)
+    if chunks is None:
+        response=await allm_call('debug_fused',state,debug_fused_prompt(state),fused_worker_schema)
+        return {'change_summary':response.summary,'modified_code': response.modified_code}
+    parts=await amap_chunks('debug_fused',state,chunk_prompts(debug_fused_prompt,state,chunks),fused_worker_schema)
+    return {'change_summary':'\n'.join(part.summary for part in parts),'modified_code': assemble_code([part.modified_code for part in parts],chunks,range(len(parts)))}
+
+def write_fused (state: intellicode_state):
+    response=llm_call('write_fused',state,write_fused_prompt(state),fused_worker_schema)
+    return {'change_summary':response.summary,'modified_code': response.modified_code}
+
+async def awrite_fused (state: intellicode_state):
+    response=await allm_call('write_fused',state,write_fused_prompt(state),fused_worker_schema)
+    return {'change_summary':response.summary,'modified_code': response.modified_code}
+
+def docs_fused (state: intellicode_state):
+    chunks=input_chunks(state)
+    if chunks is None:
+        response=llm_call('docs_fused',state,docs_fused_prompt(state),fused_worker_schema)
+        return {'change_summary':response.summary,'modified_code': response.modified_code}
+    parts=map_chunks('docs_fused',state,chunk_prompts(docs_fused_prompt,state,chunks),fused_worker_schema)
+    doc=llm_call('docs_fused',state,docs_reduce_prompt(state,[part.modified_code for part in parts]))
+    return {'change_summary':'\n'.join(part.summary for part in parts),'modified_code': doc}
+
+async def adocs_fused (state: intellicode_state):
+    chunks=input_chunks(state)
+    if chunks is None:
+        response=await allm_call('docs_fused',state,docs_fused_prompt(state),fused_worker_schema)
+        return {'change_summary':response.summary,'modified_code': response.modified_code}
+    parts=await amap_chunks('docs_fused',state,chunk_prompts(docs_fused_prompt,state,chunks),fused_worker_schema)
+    doc=await allm_call('docs_fused',state,docs_reduce_prompt(state,[part.modified_code for part in parts]))
+    return {'change_summary':'\n'.join(part.summary for part in parts),'modified_code': doc}
+
 
 # defining a function which handles the routing of the workflow from classifier node to the needed node for further processing 
 
@@ -452,42 +1137,274 @@ def task_router (state: intellicode_state)-> Literal['explain_slm','debug_code',
 
 
 
+## SPECULATIVE EXECUTION OF THE WORKER NODES
+# in speculative mode the most likely worker starts at the same time as the LLM classifier; its result is kept when
+# the classifier agrees and discarded (cancelled on the async path) when it does not
+
+# counters for tuning the speculation trade-off
+speculation_stats={'attempts':0,'hits':0,'misses':0,'skipped':0,'failed':0,'cancelled':0,'wasted_prompt_tokens':0,'wasted_completion_tokens':0}
+speculation_lock=threading.Lock()
+
+# threads running the sync speculative worker calls
+speculation_pool=ThreadPoolExecutor(max_workers=config.speculation_workers,thread_name_prefix='speculation')
+
+def count_speculation (outcome:str, usage=()):
+    with speculation_lock:
+        speculation_stats[outcome]+=1
+        for record in usage:
+            speculation_stats['wasted_prompt_tokens']+=record['prompt_tokens']
+            speculation_stats['wasted_completion_tokens']+=record['completion_tokens']
+
+def speculation_hit_rate ():
+    with speculation_lock:
+        attempts=speculation_stats['attempts']
+        return speculation_stats['hits']/attempts if attempts else 0.0
+
+def speculation_snapshot ():
+    with speculation_lock:
+        return dict(speculation_stats)
+
+register_collector('intellicode_speculation_total','Speculative worker outcomes and wasted tokens.','counter',speculation_snapshot)
+
+# cheap prior: the local classifier's best guess, where explain/debug/docs need code in the editor
+def speculation_prior (state:intellicode_state):
+    guess,confidence=local_classifier.predict(state['prompt'],state.get('input_code'))
+    if guess not in ('explain','debug','write','docs') or confidence<config.speculation_min_confidence:
+        return None
+    if guess!='write' and not has_input_code(state.get('input_code')):
+        return None
+    return guess
+
+# runs one worker in a copy of the current context, marked as speculative and collecting its call records
+def speculative_context (usage:list):
+    context=copy_context()
+    context.run(speculating.set,True)
+    context.run(call_records.set,usage)
+    return context
+
+# after a hit the speculative calls belong to the run, so they join the classifier node's records
+def adopt_records (usage:list):
+    sink=call_records.get()
+    if sink is not None:
+        sink.extend(usage)
+
+# building the sync and async speculative classifier nodes around the worker functions of the graph
+def speculative_classifier (workers:dict, aworkers:dict):
+
+    def classify (state:intellicode_state):
+        task_type=local_task_type(state)
+        if task_type is not None:
+            return {'task_type':task_type}
+
+        guess=speculation_prior(state)
+        if guess is None:
+            count_speculation('skipped')
+            return task_classifier(state)
+
+        usage=[]
+        future=speculation_pool.submit(speculative_context(usage).run,workers[guess],state)
+        count_speculation('attempts')
+        try:
+            task_type=task_classifier(state)['task_type']
+        except BaseException:
+            future.cancel()
+            raise
+
+        if task_type!=guess:
+            # a running thread cannot be interrupted; its tokens are accounted once it finishes
+            if future.cancel():
+                count_speculation('cancelled')
+            future.add_done_callback(lambda done: count_speculation('misses',usage))
+            return {'task_type':task_type}
+
+        try:
+            update=future.result()
+        except Exception:
+            count_speculation('failed')
+            return {'task_type':task_type}
+        count_speculation('hits')
+        adopt_records(usage)
+        return {'task_type':task_type,'speculated_task':guess,**update}
+
+    async def aclassify (state:intellicode_state):
+        task_type=local_task_type(state)
+        if task_type is not None:
+            return {'task_type':task_type}
+
+        guess=speculation_prior(state)
+        if guess is None:
+            count_speculation('skipped')
+            return await atask_classifier(state)
+
+        usage=[]
+        task=asyncio.create_task(aworkers[guess](state),context=speculative_context(usage))
+        count_speculation('attempts')
+        try:
+            task_type=(await atask_classifier(state))['task_type']
+        except BaseException:
+            task.cancel()
+            raise
+
+        if task_type!=guess:
+            if not task.done():
+                task.cancel()
+                count_speculation('cancelled')
+            count_speculation('misses',usage)
+            return {'task_type':task_type}
+
+        try:
+            update=await task
+        except Exception:
+            count_speculation('failed')
+            return {'task_type':task_type}
+        count_speculation('hits')
+        adopt_records(usage)
+        return {'task_type':task_type,'speculated_task':guess,**update}
+
+    return classify, aclassify
+
+# a semantic cache hit already carries the final answer, so the run ends after the lookup
+def semantic_router (state: intellicode_state, route):
+    if (state.get('semantic_cache') or {}).get('hit'):
+        return END
+    return route(state)
+
+# after a speculation hit the worker already ran, so routing continues at the node which follows it
+def speculative_router (state: intellicode_state, successors:dict):
+    if state.get('speculated_task') is not None and state['speculated_task']==state['task_type']:
+        return successors[state['task_type']]
+    return task_router(state)
+
+
+
+
 ## DEFINING THE GRAPH/ WORKFLOW FOR THE AGENTIC SYSTEM
 
-graph=StateGraph(intellicode_state)
+# adding the wall time and the LLM calls of one node run to its state update
+def with_metadata (update, name:str, started:float, calls:list):
+    wall_time=time.perf_counter()-started
+    observe_node(name,wall_time)
+    update=update or {}
+    return {**update,'metadata':{**update.get('metadata',{}),'calls':calls,'node_times':{name:wall_time}}}
+
+# pairing the sync and async implementation of a node so the compiled graph supports both invoke and ainvoke;
+# every run of the node reports its timing and calls in the metadata field of the state
+def node (func, afunc, name:str=None):
+    name=name or func.__name__
+
+    def run (state:intellicode_state):
+        calls=[]
+        token=call_records.set(calls)
+        started=time.perf_counter()
+        try:
+            update=func(state)
+        finally:
+            call_records.reset(token)
+        return with_metadata(update,name,started,calls)
+
+    async def arun (state:intellicode_state):
+        calls=[]
+        token=call_records.set(calls)
+        started=time.perf_counter()
+        try:
+            update=await afunc(state)
+        finally:
+            call_records.reset(token)
+        return with_metadata(update,name,started,calls)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+# building and compiling the graph
+# fused=True replaces each worker + summary pair with a single structured call, keeping the worker node names so task_router is unchanged
+# speculative=True starts the most likely worker next to the LLM classifier (see speculative_classifier)
+# a checkpointer saves the state after every node; runs then need run_checkpoints.run_config(run_id)
+def build_workflow (fused: bool=False, speculative: bool=False, checkpointer=None):
+
+    graph=StateGraph(intellicode_state)
+
+    # worker implementations per task type, shared by the graph nodes and the speculative classifier
+    if fused:
+        workers={'explain':explain_slm,'debug':debug_fused,'write':write_fused,'docs':docs_fused}
+        aworkers={'explain':aexplain_slm,'debug':adebug_fused,'write':awrite_fused,'docs':adocs_fused}
+    else:
+        workers={'explain':explain_slm,'debug':debug_code,'write':write_code,'docs':docs_worker}
+        aworkers={'explain':aexplain_slm,'debug':adebug_code,'write':awrite_code,'docs':adocs_worker}
 
+    # adding nodes to the graph
+    graph.add_node('memory',node(memory,amemory))
+    if speculative:
+        graph.add_node('task_classifier',node(*speculative_classifier(workers,aworkers),name='task_classifier'))
+    else:
+        graph.add_node('task_classifier',node(task_classifier,atask_classifier))
+    graph.add_node('unknown',node(unknown,aunknown))
+    graph.add_node('explain_slm',node(workers['explain'],aworkers['explain']))
+    graph.add_node('debug_code',node(workers['debug'],aworkers['debug']))
+    graph.add_node('write_code',node(workers['write'],aworkers['write']))
+    graph.add_node('docs_worker',node(workers['docs'],aworkers['docs']))
+    graph.add_node('collator',node(collator,acollator))
+
+    if not fused:
+        graph.add_node('debug_summary',node(debug_summary,adebug_summary))
+        graph.add_node('write_summary',node(write_summary,awrite_summary))
+        graph.add_node('docs_summary',node(docs_summary,adocs_summary))
+
+    # adding edges to the graph
+    graph.add_edge(START,'memory')
+    graph.add_edge('memory','task_classifier')
+
+    if speculative:
+        if fused:
+            successors={'explain':'collator','debug':'collator','write':'collator','docs':'collator'}
+        else:
+            successors={'explain':'collator','debug':'debug_summary','write':'write_summary','docs':'docs_summary'}
+        router=functools.partial(speculative_router,successors=successors)
+    else:
+        router=task_router
+
+    # with the semantic cache enabled, its lookup runs between the classifier and the workers
+    if semantic_index is not None:
+        graph.add_node('semantic_lookup',node(semantic_lookup,asemantic_lookup))
+        graph.add_edge('task_classifier','semantic_lookup')
+        graph.add_conditional_edges('semantic_lookup',functools.partial(semantic_router,route=router))
+    else:
+        graph.add_conditional_edges('task_classifier',router)
 
-# adding nodes to the graph
-graph.add_node('task_classifier',task_classifier)
-graph.add_node('unknown',unknown)
-graph.add_node('explain_slm',explain_slm)
-graph.add_node('debug_code',debug_code)
-graph.add_node('debug_summary',debug_summary)
-graph.add_node('write_code',write_code)
-graph.add_node('write_summary',write_summary)
-graph.add_node('docs_worker',docs_worker)
-graph.add_node('docs_summary',docs_summary)
-graph.add_node('collator',collator)
+    graph.add_edge('unknown','collator')
+
+    graph.add_edge('explain_slm','collator')
+
+    if fused:
+        graph.add_edge('debug_code','collator')
+        graph.add_edge('write_code','collator')
+        graph.add_edge('docs_worker','collator')
+    else:
+        graph.add_edge('debug_code','debug_summary')
+        graph.add_edge('debug_summary','collator')
 
-# adding edges to the graph
-graph.add_edge(START,'task_classifier')
+        graph.add_edge('write_code','write_summary')
+        graph.add_edge('write_summary','collator')
 
-graph.add_conditional_edges('task_classifier',task_router)
+        graph.add_edge('docs_worker','docs_summary')
+        graph.add_edge('docs_summary','collator')
 
-graph.add_edge('unknown','collator')
+    graph.add_edge('collator',END)
 
-graph.add_edge('explain_slm','collator')
+    #compiling the workflow
+    return graph.compile(checkpointer=checkpointer)
 
-graph.add_edge('debug_code','debug_summary')
-graph.add_edge('debug_summary','collator')
+# identical concurrent requests to a workflow share one execution of it (see single_flight.py)
+def coalesce (graph, name:str):
+    return coalesced_workflow(graph,name) if config.single_flight_enabled else graph
 
-graph.add_edge('write_code','write_summary')
-graph.add_edge('write_summary','collator')
+# default workflow (separate worker and summary calls)
+workflow=coalesce(build_workflow(),'default')
 
-graph.add_edge('docs_worker','docs_summary')
-graph.add_edge('docs_summary','collator')
+# opt-in fused workflow (one call per worker + summary pair)
+fused_workflow=coalesce(build_workflow(fused=True),'fused')
 
-graph.add_edge('collator',END)
+# opt-in speculative workflow (worker starts next to the classifier)
+speculative_workflow=coalesce(build_workflow(speculative=True),'speculative')
 
-#compiling the workflow
-workflow=graph.compile()
+# checkpointed default workflow, run with a run id; a failed run is resumed from its last completed node (used by the app);
+# not coalesced, as a follower of a shared run would have no checkpoint of its own to resume
+durable_workflow=build_workflow(checkpointer=checkpoints) if checkpoints is not None else None
@@ -0,0 +1,72 @@
+"""
+Thin client of a workflow server (server.py).
+
+`remote_workflow` stands in for the compiled workflow in the app when
+`workflow_server_url` is set: its stream() sends the request to /v1/stream
+and yields the Server-Sent Events as the (mode, chunk) pairs the local graph
+streams, so job_runner.py renders progress, tokens and the final state the
+same way. Closing the stream (a cancelled job) closes the connection, which
+cancels the run on the server.
+"""
+
+import json
+
+import httpx
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+
+class workflow_server_error(RuntimeError):
+    """The server refused the request or the run failed on it."""
+
+
+def request_body(state: dict) -> dict:
+    return {**state, 'messeges': messages_to_dict(state.get('messeges') or [])}
+
+
+def read_events(lines):
+    """(event, data) of a Server-Sent Events stream; comments (keep-alives) are skipped."""
+    event, data = 'message', []
+    for line in lines:
+        if not line:
+            if data:
+                yield event, json.loads('\n'.join(data))
+            event, data = 'message', []
+        elif line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data.append(line[5:].strip())
+
+
+class remote_workflow:
+    """A workflow run by a workflow server, streamed like the local graph."""
+
+    # no checkpoints on this side; the server runs the request from scratch
+    checkpointer = None
+
+    def __init__(self, base_url: str, timeout: float = 600.0):
+        self.client = httpx.Client(base_url=base_url, timeout=httpx.Timeout(timeout, connect=10.0))
+
+    def stream(self, state: dict, config=None, stream_mode=None):
+        """(mode, chunk) pairs of the 'updates', 'custom' and 'values' modes of a run on the server."""
+        if state is None:
+            raise ValueError('a workflow server run cannot be resumed')
+        with self.client.stream('POST', '/v1/stream', json=request_body(state)) as response:
+            if response.status_code != 200:
+                response.read()
+                raise workflow_server_error(f'workflow server answered {response.status_code}: {response.text}')
+            for event, data in read_events(response.iter_lines()):
+                if event == 'error':
+                    raise workflow_server_error(data['error'])
+                if event == 'node':
+                    yield 'updates', {data['node']: None}
+                elif event == 'token':
+                    yield 'custom', data
+                elif event == 'result':
+                    yield 'values', {**data, 'messeges': messages_from_dict(data.get('messeges') or [])}
+                    return
+        raise workflow_server_error('the workflow server closed the stream before the result')
+
+    def health(self) -> dict:
+        response = self.client.get('/health')
+        response.raise_for_status()
+        return response.json()
@@ -0,0 +1,294 @@
+"""
+Configuration for the IntelliCode-SL workflow.
+
+Every setting is read from the environment (or the .env file in the project
+root), so the workflow can be tuned per deployment without code changes.
+"""
+
+import json
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+project_root = Path(__file__).resolve().parent
+
+
+def env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment."""
+    value = os.getenv(name)
+    return float(value) if value not in (None, '') else default
+
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment."""
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def env_timeouts(name: str, default: dict) -> dict:
+    """Read 'node=seconds,node=seconds' overrides on top of the default per-node timeouts."""
+    timeouts = dict(default)
+    for item in (os.getenv(name) or '').split(','):
+        if '=' in item:
+            node, seconds = item.split('=', 1)
+            timeouts[node.strip()] = float(seconds)
+    return timeouts
+
+
+def env_prices(name: str, default: dict) -> dict:
+    """Read 'model=input:output[:cached input],...' USD per million token prices on top of the defaults."""
+    prices = dict(default)
+    for item in (os.getenv(name) or '').split(','):
+        if '=' in item:
+            model, price = item.split('=', 1)
+            prices[model.strip()] = tuple(float(value) for value in price.split(':'))
+    return prices
+
+
+def env_mapping(name: str, default: dict) -> dict:
+    """Read 'key=value,key=value' pairs on top of the defaults."""
+    mapping = dict(default)
+    for item in (os.getenv(name) or '').split(','):
+        if '=' in item:
+            key, value = item.split('=', 1)
+            mapping[key.strip()] = value.strip()
+    return mapping
+
+
+def env_params(name: str) -> dict:
+    """Read per-node generation parameters 'node=param:value;param:value,...' (values as JSON, else strings)."""
+    params = {}
+    for node, values in env_mapping(name, {}).items():
+        for item in values.split(';'):
+            if ':' in item:
+                key, value = item.split(':', 1)
+                try:
+                    params.setdefault(node, {})[key.strip()] = json.loads(value)
+                except json.JSONDecodeError:
+                    params.setdefault(node, {})[key.strip()] = value.strip()
+    return params
+
+
+def env_list(name: str, default: tuple) -> tuple:
+    """Read a comma-separated list setting from the environment."""
+    value = os.getenv(name)
+    if value in (None, ''):
+        return tuple(default)
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """Read a boolean setting ('1', 'true', 'yes', 'on') from the environment."""
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# OpenRouter endpoint (any OpenAI-compatible server works, e.g. a local mock for benchmarks)
+open_router_base_url = os.getenv('open_router_base_url', 'https://openrouter.ai/api/v1')
+
+# Model registry (model_registry.py)
+# OpenAI-compatible endpoints by name; more can be added, e.g. model_endpoints="local=http://localhost:11434/v1",
+# each with its key in <name>_api_key (local servers need none)
+model_endpoints = env_mapping('model_endpoints', {'openrouter': open_router_base_url})
+# model of the nodes without an override, as 'model' (on OpenRouter) or 'model@endpoint'
+default_model = os.getenv('default_model', 'x-ai/grok-4.1-fast')
+# per-node models by the name the node's calls are made under (task_classifier, debug_summary, collator, memory,
+# debug_fused, ...), e.g. node_models="task_classifier=qwen2.5-coder:1.5b@local,collator=qwen2.5-coder:7b@local"
+node_models = env_mapping('node_models', {})
+# per-node generation parameters passed to the API, e.g. node_params="collator=temperature:0.3;max_tokens:800"
+node_params = env_params('node_params')
+
+# HTTP transport of the LLM clients
+http2 = env_flag('http2', True)
+http_max_connections = env_int('http_max_connections', 200)
+http_max_keepalive_connections = env_int('http_max_keepalive_connections', 50)
+# idle pooled connections are kept this long, so consecutive calls reuse the TLS session
+http_keepalive_expiry = env_float('http_keepalive_expiry', 120.0)
+http_connect_timeout = env_float('http_connect_timeout', 5.0)
+http_pool_timeout = env_float('http_pool_timeout', 10.0)
+http_read_timeout = env_float('http_read_timeout', 120.0)
+# read timeouts per node, overridable with node_read_timeouts="collator=30,debug_code=180"
+node_read_timeouts = env_timeouts('node_read_timeouts', {
+    'task_classifier': 20.0,
+    'explain_slm': 90.0,
+    'debug_summary': 60.0,
+    'write_summary': 60.0,
+    'docs_summary': 60.0,
+    'collator': 60.0,
+    'prewarm': 5.0,
+})
+# connect timeouts per node, overridable with node_connect_timeouts="task_classifier=2,collator=5"
+node_connect_timeouts = env_timeouts('node_connect_timeouts', {
+    'task_classifier': 3.0,
+})
+# retries (exponential backoff with jitter, honouring Retry-After) on connection errors, 408/409/429 and 5xx
+llm_max_retries = env_int('llm_max_retries', 3)
+# open a connection to the API host in the background when the workflow module loads
+transport_prewarm = env_flag('transport_prewarm', True)
+
+# Admission control of the LLM calls (llm_scheduler.py)
+# requests and tokens per minute per model as 'model=rpm:tpm', e.g. model_rate_limits="x-ai/grok-4.1-fast=500:2000000";
+# 0 leaves a bucket unlimited
+model_rate_limits = {
+    model: tuple(float(value) for value in limits.split(':'))
+    for model, limits in env_mapping('model_rate_limits', {}).items()
+}
+# limits of the models not listed above
+default_rpm = env_float('default_rpm', 0)
+default_tpm = env_float('default_tpm', 0)
+# calls in flight per model (0 for no cap); beyond it calls queue by priority
+model_max_concurrency = env_int('model_max_concurrency', 32)
+# seconds a call of each priority may wait for admission before it is shed
+scheduler_max_wait = env_timeouts('scheduler_max_wait', {'interactive': 30.0, 'batch': 600.0})
+# calls waiting per model beyond which new ones are shed at once (0 for no limit)
+scheduler_max_queue = env_int('scheduler_max_queue', 500)
+# completion tokens a call is assumed to use until its real usage is known (unless it sets max_tokens)
+scheduler_completion_tokens = env_int('scheduler_completion_tokens', 800)
+# seconds a model is paused after a 429 without a Retry-After header
+rate_limit_cooldown = env_float('rate_limit_cooldown', 5.0)
+
+# Hedged requests (llm_hedging.py) for the non-streamed node calls
+hedge_enabled = env_flag('hedge_enabled', False)
+# nodes whose calls are hedged, by the name their calls are made under
+hedge_nodes = env_list('hedge_nodes', (
+    'task_classifier', 'explain_slm', 'debug_code', 'write_code', 'docs_worker', 'unknown',
+    'debug_summary', 'write_summary', 'docs_summary', 'debug_fused', 'write_fused', 'docs_fused', 'memory',
+))
+# a call is hedged once it takes longer than this percentile of its node's recent latencies ...
+hedge_percentile = env_float('hedge_percentile', 0.95)
+# ... learned from the last hedge_window calls, once there are hedge_min_samples of them
+hedge_window = env_int('hedge_window', 200)
+hedge_min_samples = env_int('hedge_min_samples', 20)
+# never hedge sooner than this many seconds
+hedge_min_delay = env_float('hedge_min_delay', 1.0)
+# hedges earned per call (0.05 caps the extra traffic at 5%), and how many can be saved up for a burst
+hedge_budget = env_float('hedge_budget', 0.05)
+hedge_budget_burst = env_float('hedge_budget_burst', 5)
+# per-node model of the hedge as 'model' or 'model@endpoint', e.g. hedge_models="debug_code=openai/gpt-4.1-mini";
+# nodes not listed hedge to their own route
+hedge_models = env_mapping('hedge_models', {})
+# threads running the sync hedged calls
+hedge_workers = env_int('hedge_workers', 64)
+
+# Local intent classifier
+# confidence the local classifier needs before the LLM classifier is skipped (above 1 disables the fast path)
+intent_threshold = env_float('intent_threshold', 0.85)
+# labelled JSONL the bag-of-words model is trained from
+intent_training_data = os.getenv('intent_training_data', str(project_root / 'data' / 'intent_samples.jsonl'))
+# when set, requests classified by the LLM are appended here so they can be reviewed and added to the training data
+intent_traffic_log = os.getenv('intent_traffic_log')
+
+# LLM response cache
+cache_enabled = env_flag('cache_enabled', True)
+# SQLite file of the on-disk tier (empty keeps the cache in memory only)
+cache_path = os.getenv('cache_path', str(project_root / '.cache' / 'llm_responses.sqlite3'))
+cache_memory_entries = env_int('cache_memory_entries', 512)
+cache_disk_entries = env_int('cache_disk_entries', 20000)
+cache_ttl_seconds = env_float('cache_ttl_seconds', 7 * 24 * 3600)
+
+# Semantic near-duplicate cache (semantic_cache.py), answering a request with the answer of a similar earlier one;
+# opt-in, as a false hit returns the answer of a different request
+semantic_cache_enabled = env_flag('semantic_cache_enabled', False)
+# task types whose answers are reused; 'write' is left out, its prompt is the whole specification
+semantic_cache_tasks = env_list('semantic_cache_tasks', ('explain', 'docs', 'debug'))
+# cosine similarity of the distinguishing prompt words and of the input code a hit needs
+semantic_prompt_threshold = env_float('semantic_prompt_threshold', 0.85)
+semantic_code_threshold = env_float('semantic_code_threshold', 0.97)
+# answers kept in the in-memory index; the least recently used are evicted
+semantic_cache_entries = env_int('semantic_cache_entries', 2000)
+# JSONL file every hit and audit is appended to, for reviewing false hits
+semantic_cache_audit_log = os.getenv('semantic_cache_audit_log')
+# share of hits recomputed instead of served and compared with the cached answer
+semantic_cache_audit_rate = env_float('semantic_cache_audit_rate', 0.02)
+# similarity of the recomputed and the cached answer below which an audited hit counts as a false hit
+semantic_audit_threshold = env_float('semantic_audit_threshold', 0.5)
+
+# Single-flight coalescing (single_flight.py): identical concurrent requests share one workflow execution
+single_flight_enabled = env_flag('single_flight_enabled', True)
+
+# Speculative execution (build_workflow(speculative=True))
+# minimum local classifier confidence for a worker to be started next to the LLM classifier
+speculation_min_confidence = env_float('speculation_min_confidence', 0.3)
+# threads available to the sync speculative worker calls
+speculation_workers = env_int('speculation_workers', 16)
+
+# Chunked map-reduce path for large input code (explain_slm, debug_code, docs_worker)
+# estimated input code tokens above which a node splits the code instead of sending it in one prompt
+chunk_threshold_tokens = env_int('chunk_threshold_tokens', 6000)
+# token budget of one chunk
+chunk_max_tokens = env_int('chunk_max_tokens', 2500)
+# chunk calls in flight at once
+chunk_concurrency = env_int('chunk_concurrency', 8)
+# the classifier only sees the start of large input code
+classifier_code_tokens = env_int('classifier_code_tokens', 1500)
+
+# Output of debug_code
+# 'full' asks for the whole corrected code, 'patch' for search/replace edits applied locally (regenerating the code when they do not apply)
+debug_output_mode = os.getenv('debug_output_mode', 'full')
+# smaller inputs are always regenerated in full, the edits would not be much shorter
+patch_min_tokens = env_int('patch_min_tokens', 300)
+
+# Summary of debug_code's changes
+# 'auto' describes small or mechanical diffs locally (change_summary.py) and asks the model otherwise, 'local' always
+# describes them locally, 'llm' always asks the model
+debug_summary_mode = os.getenv('debug_summary_mode', 'auto')
+# changed lines (added plus removed) up to which 'auto' summarizes the diff locally
+debug_summary_local_lines = env_int('debug_summary_local_lines', 12)
+
+# Conversation memory (the messeges field of the state)
+# hard token budget of the previous turns sent with a request; beyond it older turns are folded into a rolling summary
+memory_budget_tokens = env_int('memory_budget_tokens', 2400)
+# newest turns kept verbatim by a compaction; the rest of the budget takes the next turns before the next compaction
+memory_recent_tokens = env_int('memory_recent_tokens', 1000)
+# token budget of the rolling summary
+memory_summary_tokens = env_int('memory_summary_tokens', 400)
+# 'llm' writes the summary with a model call, 'truncate' compacts the folded turns locally without one
+memory_summary_mode = os.getenv('memory_summary_mode', 'llm')
+# nodes whose calls carry the conversation; the workers which get the code in the editor do not need it
+memory_nodes = env_list('memory_nodes', ('task_classifier', 'write_code', 'unknown', 'collator'))
+
+# Durable run checkpoints (run_checkpoints.py) of durable_workflow, used by the app
+checkpoint_enabled = env_flag('checkpoint_enabled', True)
+checkpoint_path = os.getenv('checkpoint_path', str(project_root / '.cache' / 'run_checkpoints.sqlite3'))
+# unfinished runs are dropped after this many seconds, and the oldest beyond checkpoint_max_runs
+checkpoint_ttl_seconds = env_float('checkpoint_ttl_seconds', 24 * 3600)
+checkpoint_max_runs = env_int('checkpoint_max_runs', 1000)
+# times a failed app run is resumed from its checkpoint, and the seconds before the first retry (doubling after it)
+run_retries = env_int('run_retries', 2)
+run_retry_backoff = env_float('run_retry_backoff', 1.0)
+
+# Streamlit app
+# workflow runs executing at once across all sessions of the app process; further requests queue
+max_concurrent_runs = env_int('max_concurrent_runs', 8)
+# seconds between progress refreshes of a running request
+job_poll_seconds = env_float('job_poll_seconds', 0.25)
+# base URL of a workflow server (server.py) the app sends its requests to, e.g. http://localhost:8000;
+# empty runs the workflow in the app process
+workflow_server_url = os.getenv('workflow_server_url', '').rstrip('/')
+
+# HTTP server (server.py)
+server_host = os.getenv('server_host', '127.0.0.1')
+server_port = env_int('server_port', 8000)
+# worker processes; each one has its own workflow, caches and LLM call scheduler
+server_workers = env_int('server_workers', 1)
+# workflow variant served: 'default', 'fused' or 'speculative'
+server_workflow = os.getenv('server_workflow', 'default')
+# largest request body accepted, in bytes
+server_max_body_bytes = env_int('server_max_body_bytes', 2_000_000)
+# seconds of silence after which a comment line keeps an event stream (and the proxies on its way) open
+server_keepalive_seconds = env_float('server_keepalive_seconds', 15.0)
+# records of one /v1/batch request, and how many of them run at once
+server_batch_max_records = env_int('server_batch_max_records', 1000)
+server_batch_concurrency = env_int('server_batch_concurrency', 8)
+
+# Metrics
+# USD per million prompt/completion(/cached prompt) tokens, used for the cost estimates in the run metadata,
+# overridable with model_prices="x-ai/grok-4.1-fast=0.2:0.5:0.05,other/model=1:2"
+model_prices = env_prices('model_prices', {
+    'x-ai/grok-4.1-fast': (0.20, 0.50, 0.05),
+})